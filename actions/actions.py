@@ -5,9 +5,8 @@
 # https://rasa.com/docs/rasa/custom-actions
 
 
-import ast
 import re
-from typing import Any, Text, Dict, List
+from typing import Any, Text, Dict, List, Optional
 from rasa_sdk import Action, Tracker  # type: ignore
 from rasa_sdk.executor import CollectingDispatcher  # type: ignore
 from rasa_sdk.events import SlotSet  # type: ignore
@@ -15,58 +14,343 @@ from rasa_sdk.events import FollowupAction  # type: ignore
 from rasa_sdk.forms import FormValidationAction  # type: ignore
 from rasa_sdk.types import DomainDict  # type: ignore
 import pandas as pd  # type: ignore
-from fuzzywuzzy import process, fuzz  # type: ignore
+import numpy as np  # type: ignore
+from .catalog import (
+    EMPTY_POSTING, intersect_postings,
+    bitmap_to_positions, bitmap_count, bitmap_and, bitmap_top_k,
+)
+from .snapshot import PERCORSO_DATASET, PERCORSO_SNAPSHOT
+from .catalog_manager import CatalogManager
+from .worker_pool import PooledAction, QueryPool
+from .query_cache import QueryCache, query_key
+from .cursors import CursorStore, show_more_payload
+from .records import display_number
+from .metrics import REGISTRY, PHASE_SECONDS, FUZZY_CORRECTIONS, ZERO_RESULTS
+
+FUZZY_NAME_THRESHOLD = 60  # punteggio minimo per accettare una correzione del nome
+USE_MACRO_KDTREE = False  # KD-tree sui macro (richiede scipy): utile solo su cataloghi molto grandi
+RELOAD_CHECK_SECONDS = 60  # ogni quanto controllare se il dataset è cambiato (0 = mai)
+QUERY_POOL_WORKERS = 4  # query pesanti eseguite in parallelo
+QUERY_POOL_MAX_QUEUE = 32  # query pesanti in attesa, oltre le quali si risponde "riprova"
+QUERY_TIMEOUT_SECONDS = 10  # tempo massimo di attesa per una query pesante
+QUERY_CACHE_SIZE = 1024  # ricerche memorizzate (LRU)
+QUERY_CACHE_TTL_SECONDS = None  # scadenza delle ricerche memorizzate (None = solo LRU e reload)
+QUERY_CACHE_MAX_IDS = 100  # ID (in ordine di classifica) salvati per ogni ricerca
+PAGE_SIZE = 5  # ricette per pagina nelle risposte a lista
+RENDER_CACHE_SIZE = 4096  # schede ricetta e titoli dei bottoni già formattati (LRU)
+CURSOR_TTL_SECONDS = 900  # validità di un bottone "Show more"
+CURSOR_MAX_BYTES = 16 * 1024 * 1024  # memoria per le ricerche sfogliabili (le più vecchie vengono sovrascritte)
+
+# Il catalogo (dataframe, testi e indici) vive nel manager e può essere
+# sostituito a caldo: ogni action lo legge con current_catalog()
+CATALOG_MANAGER = CatalogManager(PERCORSO_DATASET, PERCORSO_SNAPSHOT, use_kdtree=USE_MACRO_KDTREE)
+
+# Caricamento del dataset: dallo snapshot binario se aggiornato, altrimenti dal CSV
+try:
+    CATALOG_MANAGER.load()
+except Exception as e:
+    print(f"❌ ERRORE CRITICO CARICAMENTO DATASET: {e}")
 
-PERCORSO_DATASET = 'dataset/dataset_svuotafrigo_finale.csv'
-ALL_UNIQUE_TAGS = []
-ALL_UNIQUE_INGREDIENTS = []
-DATASET = None
 
-# Caricamento del dataset
-try:
-    print(f"📂 Caricamento dataset da: {PERCORSO_DATASET}")
-    DATASET = pd.read_csv(PERCORSO_DATASET)
-    DATASET['name'] = DATASET['name'].astype(str)
-    
-    # Pulizia numeri e reset indici per gli ID
-    DATASET['rating_medio'] = pd.to_numeric(DATASET['rating_medio'], errors='coerce').fillna(0)
-    if 'num_voti' in DATASET.columns:
-        DATASET['num_voti'] = pd.to_numeric(DATASET['num_voti'], errors='coerce').fillna(0)
-    else:
-        DATASET['num_voti'] = 0
-    
-    DATASET = DATASET.reset_index(drop=True) # FONDAMENTALE PER GLI ID
+def start_catalog_reloads() -> None:
+    """Controllo periodico del dataset e reload su SIGHUP (con `rasa run actions` li avvia la prima richiesta)."""
+    CATALOG_MANAGER.start(RELOAD_CHECK_SECONDS)
+
+
+def current_catalog():
+    """Catalogo in uso per TUTTA la richiesta: l'action lo legge una volta sola all'inizio, così un reload non lo cambia a metà."""
+    start_catalog_reloads()
+    return CATALOG_MANAGER.current()
+
+
+def _catalog_gauge(fn):
+    """Gauge calcolata sul catalogo in uso al momento della lettura di /metrics (vuota senza catalogo)."""
+    def read():
+        catalog = CATALOG_MANAGER.current()
+        return {} if catalog is None else fn(catalog)
+    return read
+
+
+REGISTRY.gauge('peppebot_catalog_recipes', "Ricette nel catalogo in uso.",
+               fn=_catalog_gauge(lambda c: {(): len(c.records)}))
+REGISTRY.gauge('peppebot_catalog_bytes', "Byte dei dati del catalogo (indici, colonne, testi) per componente.",
+               ['component'], fn=_catalog_gauge(lambda c: {(k,): v for k, v in c.memory_usage().items()}))
+REGISTRY.gauge('peppebot_catalog_info', "Catalogo in uso (sempre 1): versione e sorgente (csv o snapshot).",
+               ['version', 'source'], fn=_catalog_gauge(lambda c: {(c.version, c.source): 1}))
+
+# Pool per le action pesanti (ricerche e fuzzy matching): non bloccano l'event loop
+# del server, così le action leggere (reset dei form, top rated, ...) restano veloci
+QUERY_POOL = QueryPool(max_workers=QUERY_POOL_WORKERS, max_queue=QUERY_POOL_MAX_QUEUE)
+
+
+# Risultati delle ricerche (conteggio + ID ordinati), legati alla versione del catalogo
+QUERY_CACHE = QueryCache(max_entries=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL_SECONDS)
+
+# Ricerche sfogliabili con "Show more": il token nel bottone porta solo l'hash della ricerca
+RESULT_CURSORS = CursorStore(ttl=CURSOR_TTL_SECONDS, max_bytes=CURSOR_MAX_BYTES)
+
+
+def ranked_ids(catalog, positions: np.ndarray) -> np.ndarray:
+    """ID delle prime QUERY_CACHE_MAX_IDS ricette di un risultato (posizioni in ordine di classifica)."""
+    return catalog.records.ids[positions[:QUERY_CACHE_MAX_IDS]]
+
+
+def best_coverage(catalog, action: str, key, ingredients: List[str], candidates: Optional[np.ndarray] = None):
+    """(conteggio, ID) delle ricette che usano più ingredienti dell'utente e ne richiedono meno altri.
+
+    Serve quando nessuna ricetta li contiene TUTTI; il risultato va in cache
+    come quello delle ricerche esatte.
+    """
+    cached = QUERY_CACHE.get(catalog.version, key)
+    if cached is None:
+        with PHASE_SECONDS.time(action, 'coverage'):
+            count, positions = catalog.coverage.rank(ingredients, QUERY_CACHE_MAX_IDS, candidates)
+            cached = (count, catalog.records.ids[positions])
+        QUERY_CACHE.put(catalog.version, key, cached)
+    return cached
+
+
+def tag_positions(catalog, wanted_tags: List[str], memo: Optional[Dict] = None) -> Optional[np.ndarray]:
+    """Posizioni delle ricette con TUTTI i tag (None se un tag non esiste nel catalogo).
+
+    `memo` (un dict) condivide il risultato tra più ricerche con gli stessi tag, es. in un batch.
+    """
+    key = ('tags', tuple(sorted(wanted_tags)))
+    if memo is not None and key in memo:
+        return memo[key]
+    positions = None
+    if all(t in catalog.tag_bitmaps for t in wanted_tags):
+        positions = bitmap_to_positions(bitmap_and([catalog.tag_bitmaps[t] for t in wanted_tags]))
+    if memo is not None:
+        memo[key] = positions
+    return positions
+
+
+def filter_candidates(catalog, wanted_tags: List[str], time_limit, memo: Optional[Dict] = None) -> Optional[np.ndarray]:
+    """Posizioni che rispettano i soli filtri su tag e tempo (None se non ce ne sono)."""
+    key = ('filters', tuple(sorted(wanted_tags)), time_limit or None)
+    if memo is not None and key in memo:
+        return memo[key]
+    candidates = None
+    if wanted_tags:
+        candidates = tag_positions(catalog, wanted_tags, memo)
+        if candidates is None:
+            candidates = EMPTY_POSTING
+    if time_limit:
+        if candidates is None:
+            candidates = np.arange(len(catalog.dataset), dtype=np.int32)
+        minutes = catalog.dataset['minutes'].to_numpy()
+        candidates = candidates[minutes[candidates] <= int(time_limit)]
+    if memo is not None:
+        memo[key] = candidates
+    return candidates
+
+
+def svuota_frigo_search(catalog, action: str, ingredients: List[str], wanted_tags: List[str], time_limit,
+                        memo: Optional[Dict] = None):
+    """(conteggio, ID in ordine di classifica, parziale) della ricerca svuota-frigo.
+
+    Prima le ricette con TUTTI gli ingredienti e i tag entro il tempo; se non ce
+    ne sono e gli ingredienti sono più di uno, quelle che ne usano di più
+    (parziale = True; tag e tempo restano filtri esatti). Risultati in QUERY_CACHE.
+    """
+    # Stessi ingredienti, tag e tempo (in qualsiasi ordine) = stessa ricerca: risultato dalla cache
+    key = query_key('svuota_frigo', ingredients=ingredients, tags=wanted_tags, time_limit=time_limit or None)
+    cached = QUERY_CACHE.get(catalog.version, key)
+    if cached is None:
+        with PHASE_SECONDS.time(action, 'filter'):
+            # Posting list dei filtri esatti (ingredienti e tag): alla fine vengono intersecate
+            postings = []
+            missing_term = False
+
+            # FILTRO INGREDIENTI (Ricerca Esatta tramite indice invertito)
+            for ing in ingredients:
+                ing = ing.lower().strip()
+                if ing not in catalog.ingredient_index:
+                    missing_term = True
+                    break
+                postings.append(catalog.ingredient_index[ing])
+
+            # FILTRO CATEGORIE / TAGS (AND tra le bitmap dei tag)
+            if not missing_term and wanted_tags:
+                tagged = tag_positions(catalog, wanted_tags, memo)
+                if tagged is None:
+                    missing_term = True
+                else:
+                    postings.append(tagged)
 
-    # --- 1. INDICIZZAZIONE TAG ---
-    print("🔄 Indicizzazione dei TAG...")
-    all_tags_set = set()
-    for tag_str in DATASET['tags'].dropna():
-        try:
-            t_list = ast.literal_eval(tag_str)
-            for t in t_list:
-                all_tags_set.add(t.lower())
-        except:
-            pass
-    ALL_UNIQUE_TAGS = list(all_tags_set)
-    print(f"✅ Tag indicizzati: {len(ALL_UNIQUE_TAGS)}")
-
-    # --- 2. INDICIZZAZIONE INGREDIENTI ---
-    print("🔄 Indicizzazione degli INGREDIENTI...")
-    all_ing_set = set()
-    for ing_str in DATASET['ingredients'].dropna():
-        try:
-            # ing_str è "['onion', 'garlic']"
-            i_list = ast.literal_eval(ing_str)
-            for i in i_list:
-                all_ing_set.add(i.lower().strip())
-        except:
-            pass
-    ALL_UNIQUE_INGREDIENTS = list(all_ing_set)
-    print(f"✅ Ingredienti indicizzati: {len(ALL_UNIQUE_INGREDIENTS)}")
+            # Posizioni (in ordine di classifica) delle ricette che soddisfano TUTTI i filtri esatti
+            if missing_term:
+                positions = EMPTY_POSTING
+            elif postings:
+                positions = intersect_postings(postings)
+            else:
+                positions = np.arange(len(catalog.dataset), dtype=np.int32)
+
+            # FILTRO TEMPO (sulle sole ricette rimaste)
+            if positions.size and time_limit:
+                minutes = catalog.dataset['minutes'].to_numpy()
+                positions = positions[minutes[positions] <= int(time_limit)]
+        with PHASE_SECONDS.time(action, 'topk'):
+            cached = (len(positions), ranked_ids(catalog, positions))
+        QUERY_CACHE.put(catalog.version, key, cached)
+    count, top_ids = cached
+
+    # Frigo pieno: nessuna ricetta usa TUTTI gli ingredienti, allora vince chi ne usa di più
+    if count == 0 and len(ingredients) > 1:
+        wanted_ingredients = [i.lower().strip() for i in ingredients]
+        key = query_key('svuota_frigo_coverage', ingredients=wanted_ingredients, tags=wanted_tags,
+                        time_limit=time_limit or None)
+        candidates = filter_candidates(catalog, wanted_tags, time_limit, memo)
+        count, top_ids = best_coverage(catalog, action, key, wanted_ingredients, candidates)
+        return count, top_ids, count > 0
+    return count, top_ids, False
+
+
+def category_search(catalog, action: str, tags: List[str]):
+    """(conteggio, ID in ordine di classifica) delle ricette con TUTTI i tag (risultato in QUERY_CACHE)."""
+    key = query_key('category', tags=tags)
+    cached = QUERY_CACHE.get(catalog.version, key)
+    if cached is None:
+        # AND tra le bitmap, il conteggio è il numero di bit accesi;
+        # i bit più bassi sono le ricette migliori
+        with PHASE_SECONDS.time(action, 'filter'):
+            known = all(t in catalog.tag_bitmaps for t in tags)
+            result_bitmap = bitmap_and([catalog.tag_bitmaps[t] for t in tags]) if known else 0
+            count = bitmap_count(result_bitmap)
+        with PHASE_SECONDS.time(action, 'topk'):
+            cached = (count, ranked_ids(catalog, bitmap_top_k(result_bitmap, QUERY_CACHE_MAX_IDS)))
+        QUERY_CACHE.put(catalog.version, key, cached)
+    return cached
+
+
+def ingredient_search(catalog, action: str, ingredients: List[str]):
+    """(conteggio, ID in ordine di classifica, parziale) delle ricette con TUTTI gli ingredienti.
+
+    Se non ce ne sono e gli ingredienti sono più di uno, quelle che ne usano di
+    più e ne chiedono meno altri (parziale = True). Risultati in QUERY_CACHE.
+    """
+    key = query_key('ingredient', ingredients=ingredients)
+    cached = QUERY_CACHE.get(catalog.version, key)
+    if cached is None:
+        # Intersezione delle posting list (dalla più corta): solo le ricette con TUTTI gli ingredienti
+        # (le posizioni sono già in ordine di classifica)
+        with PHASE_SECONDS.time(action, 'filter'):
+            if ingredients and all(i in catalog.ingredient_index for i in ingredients):
+                positions = intersect_postings([catalog.ingredient_index[i] for i in ingredients])
+            else:
+                positions = EMPTY_POSTING
+        with PHASE_SECONDS.time(action, 'topk'):
+            cached = (len(positions), ranked_ids(catalog, positions))
+        QUERY_CACHE.put(catalog.version, key, cached)
+    count, top_ids = cached
+
+    # Nessuna ricetta con TUTTI gli ingredienti: quelle che ne usano di più (e ne chiedono meno altri)
+    if count == 0 and len(ingredients) > 1:
+        key = query_key('ingredient_coverage', ingredients=ingredients)
+        count, top_ids = best_coverage(catalog, action, key, ingredients)
+        return count, top_ids, count > 0
+    return count, top_ids, False
+
+
+def macro_search(catalog, action: str, targets: List[float], k: int, candidates: Optional[np.ndarray] = None,
+                 weights: Optional[List[float]] = None) -> np.ndarray:
+    """Posizioni delle k ricette più vicine ai macro `targets` (calorie, carboidrati, grassi, proteine)."""
+    with PHASE_SECONDS.time(action, 'topk'):
+        positions, _ = catalog.macro_engine.search(targets, k=k, candidates=candidates, weights=weights)
+    return positions
+
+
+# Testi già pronti (schede ricetta e titoli dei bottoni), legati alla versione del catalogo
+RENDER_CACHE = QueryCache(max_entries=RENDER_CACHE_SIZE)
+
+
+def button_title(catalog, record, icon: str, detail: Optional[str] = 'rating') -> str:
+    """Titolo del bottone di una ricetta: "👨‍🍳 Name (4.5⭐)", "(30m)" con 'minutes', solo il nome con None."""
+    key = ('button', icon, detail, record.pos)
+    title = RENDER_CACHE.get(catalog.version, key)
+    if title is None:
+        if detail == 'minutes':
+            title = f"{icon} {record.title} ({display_number(record['minutes'])}m)"
+        elif detail == 'rating':
+            title = f"{icon} {record.title} ({display_number(record['rating_medio'])}⭐)"
+        else:
+            title = f"{icon} {record.title}"
+        RENDER_CACHE.put(catalog.version, key, title)
+    return title
+
+
+def recipe_card(catalog, pos: int) -> str:
+    """Scheda completa della ricetta in posizione `pos` (dettagli, ingredienti e passaggi)."""
+    key = ('card', pos)
+    card = RENDER_CACHE.get(catalog.version, key)
+    if card is None:
+        record = catalog.records.record(pos)
+        card = (
+            f"🍽️ {record.title}\n"
+            f"⭐ Rating: {display_number(record['rating_medio'])}/5 ({int(record['num_voti'])} votes)\n"
+            f"⏱️ Cooking Time: {display_number(record['minutes'])} min\n"
+            f"🏷️ Tags: {catalog.text('tags', pos)}\n\n"
+            f"🥦 Ingredients:\n{catalog.text('ingredients', pos)}\n\n"
+            f"👨‍🍳 Steps:\n{catalog.text('steps', pos)}"
+        )
+        RENDER_CACHE.put(catalog.version, key, card)
+    return card
 
-except Exception as e:
-    print(f"❌ ERRORE CRITICO CARICAMENTO DATASET: {e}")
-    DATASET = None
+
+# Icona e dettaglio dei bottoni di ogni lista sfogliabile, come nella risposta originale
+CURSOR_STYLES = {
+    'top': ("🏆", 'rating'),
+    'name': ("👨‍🍳", 'rating'),
+    'category': ("👨‍🍳", 'rating'),
+    'ingredient': ("🍳", 'rating'),
+    'svuota_frigo': ("🍽️", 'minutes'),
+}
+
+
+def open_cursor(key, ids: np.ndarray):
+    """Token "show more" sul resto della lista (None se i risultati stanno in una pagina)."""
+    if len(ids) <= PAGE_SIZE:
+        return None
+    return RESULT_CURSORS.create(key, PAGE_SIZE)
+
+
+def cursor_results(catalog, action: str, key):
+    """(conteggio, ID) della lista di un cursore: dalla QUERY_CACHE o rifacendo la ricerca (None se la chiave non è valida)."""
+    kind = key[0]
+    try:
+        if kind == 'top':
+            return len(catalog.records), catalog.records.ids[:QUERY_CACHE_MAX_IDS]
+        if kind == 'name':
+            positions = catalog.name_index.search(key[1])
+            return len(positions), catalog.records.ids[positions]
+        if kind == 'category':
+            return category_search(catalog, action, list(key[2]))
+        if kind == 'ingredient':
+            count, ids, _ = ingredient_search(catalog, action, list(key[1]))
+            return count, ids
+        if kind == 'svuota_frigo':
+            count, ids, _ = svuota_frigo_search(catalog, action, list(key[1]), list(key[2]), key[3])
+            return count, ids
+    except (IndexError, TypeError, ValueError, AttributeError):
+        pass
+    return None
+
+
+def show_more_button(token: str) -> Dict[Text, Any]:
+    return {"title": "➡️ Show more", "payload": show_more_payload(token)}
+
+
+class HeavyAction(PooledAction):
+    """Base delle action costose: la logica sta in run_query e gira sul QUERY_POOL."""
+    pool = QUERY_POOL
+    timeout = QUERY_TIMEOUT_SECONDS
+
+    async def run(self, dispatcher: CollectingDispatcher, tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+        # run_query gira su un thread del pool: i reload si avviano da qui (thread principale)
+        start_catalog_reloads()
+        return await super().run(dispatcher, tracker, domain)
 
 class ActionShowTopRated(Action):
 
@@ -77,22 +361,21 @@ class ActionShowTopRated(Action):
             tracker: Tracker,
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
-        if DATASET is None:
+        catalog = current_catalog()
+
+        if catalog is None:
             dispatcher.utter_message(text="I'm sorry, I can't access the recipe database right now. 😔")
             return []
 
-        # 1. Ordina per rating (alto) e numero voti (alto)
-        top_recipes = DATASET.sort_values(
-            by=['rating_medio', 'num_voti'], 
-            ascending=[False, False]
-        ).head(5)
+        # 1. Il dataset è già ordinato per rating (alto) e numero voti (alto)
+        top_recipes = catalog.records.records(range(min(5, len(catalog.records))))
 
         # 2. Costruisce il messaggio di risposta
         message = "⭐ Here are the Top 5 Recipes from GreenMarket:\n\n"
         
-        for index, row in top_recipes.iterrows():
-            name = row['name'].title() # Mette le maiuscole a tutte le parole
-            rating = row['rating_medio']
+        for row in top_recipes:
+            name = row.title # Nome con le maiuscole a tutte le parole (già pronto)
+            rating = display_number(row['rating_medio'])
             votes = int(row['num_voti'])
             minutes = int(row['minutes'])
             
@@ -100,55 +383,63 @@ class ActionShowTopRated(Action):
             message += f"🏆 {name}\n"
             message += f"   Rating: {rating}/5 ({votes} votes) | ⏱️ {minutes} min\n\n"
 
-        # 3. Invia il messaggio all'utente
-        dispatcher.utter_message(text=message)
+        # 3. Invia il messaggio all'utente (con il bottone per le successive)
+        token = open_cursor(('top',), catalog.records.ids[:QUERY_CACHE_MAX_IDS])
+        if token:
+            dispatcher.utter_message(text=message, buttons=[show_more_button(token)])
+        else:
+            dispatcher.utter_message(text=message)
 
-        return []
+        return [SlotSet("cursor", token)]
 
-class ActionSearchByName(Action):
+class ActionSearchByName(HeavyAction):
     def name(self) -> Text:
         return "action_search_by_name"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    def run_query(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
         recipe_name = tracker.get_slot("recipe_name")
-        fuzzy_threshold = 60
 
         if not recipe_name:
             dispatcher.utter_message(text="❓ I didn't catch the name. What do you want to cook?")
             return [SlotSet('recipe_name', None)]
 
-        if DATASET is None:
+        catalog = current_catalog()
+
+        if catalog is None:
             dispatcher.utter_message(text="⚠️ Database Error.")
             return []
 
-        # 1. Ricerca tutte le ricette che contengono recipe_name
-        matches = DATASET[DATASET['name'].str.contains(recipe_name, case=False, na=False, regex=False)]
+        # 1. Ricerca tutte le ricette che contengono recipe_name (tramite indice dei nomi)
+        searched = recipe_name
+        with PHASE_SECONDS.time(self.name(), 'filter'):
+            positions = catalog.name_index.search(searched)
 
         # 2. Fuzzy se vuoto
-        if matches.empty:
+        if len(positions) == 0:
             try:
-                all_recipes = [str(x) for x in DATASET['name'].tolist()]
-                best_match, score = process.extractOne(recipe_name, all_recipes)
-                if score >= fuzzy_threshold:
-                    matches = DATASET[DATASET['name'].str.contains(best_match, case=False, na=False, regex=False)]
+                with PHASE_SECONDS.time(self.name(), 'fuzzy'):
+                    suggestions = catalog.name_matcher.suggest(recipe_name, threshold=FUZZY_NAME_THRESHOLD)
+                if suggestions:
+                    best_match, score = suggestions[0]
+                    FUZZY_CORRECTIONS.inc('name')
+                    searched = best_match
+                    positions = catalog.name_index.search(searched)
             except Exception:
                 pass
 
         # 3. GESTIONE RISULTATI
-        if not matches.empty:
-            # Ordina per qualità
-            matches = matches.sort_values(by=['rating_medio', 'num_voti'], ascending=[False, False])
-            
-            count = len(matches)
-            top_matches = matches.head(5) # Prendiamo le prime 5
+        if len(positions) > 0:
+            # Le posizioni sono già ordinate per qualità
+            count = len(positions)
+            top_matches = catalog.records.records(positions[:5]) # Prendiamo le prime 5
 
             # Se c'è SOLA 1 ricetta, mostra direttamente i dettagli
             if count == 1:
                 # Chiama l'altra action "manualmente" passandogli l'ID
-                unique_id = top_matches.index[0] # L'indice originale del DataFrame
+                unique_id = top_matches[0].id # L'ID stabile della ricetta
                 return [SlotSet("recipe_id", str(unique_id)), FollowupAction("action_select_recipe_by_id")]
             
             # Se ce n'è più di una (es. Bread, Banana Bread), mostra i bottoni
@@ -156,21 +447,25 @@ class ActionSearchByName(Action):
                 testo_risposta = f"🔍 I found {count} recipes containing '{recipe_name}'. Here are the top {len(top_matches)}:"
                 
                 buttons = []
-                for index, row in top_matches.iterrows():
-                    r_name = row['name'].title()
-                    r_rate = row['rating_medio']
-                    
-                    # Aggiungiamo un'icona per allungare leggermente il testo e forzare Telegram a metterli in colonna
-                    title = f"👨‍🍳 {r_name} ({r_rate}⭐)"
-                    payload = f'/select_recipe{{"recipe_id":"{index}"}}'
-                    
-                    buttons.append({"title": title, "payload": payload})
+                with PHASE_SECONDS.time(self.name(), 'render'):
+                    for row in top_matches:
+                        # Aggiungiamo un'icona per allungare leggermente il testo e forzare Telegram a metterli in colonna
+                        title = button_title(catalog, row, "👨‍🍳")
+                        payload = f'/select_recipe{{"recipe_id":"{row.id}"}}'
+
+                        buttons.append({"title": title, "payload": payload})
+
+                    # Il resto della lista resta sul server, sfogliabile con "show more"
+                    token = open_cursor(('name', searched), positions)
+                    if token:
+                        buttons.append(show_more_button(token))
                 
                 # Usiamo il metodo nativo di Rasa: è l'unico blindato al 100%
                 dispatcher.utter_message(text=testo_risposta, buttons=buttons)
-                return []
+                return [SlotSet("cursor", token)]
         
         else:
+            ZERO_RESULTS.inc(self.name())
             dispatcher.utter_message(text=f"😔 I'm sorry, I couldn't find anything matching {recipe_name}.")
             return [SlotSet('recipe_name', None)]
 
@@ -184,36 +479,23 @@ class ActionSelectRecipeById(Action):
         # Recupera l'ID dal click del bottone
         recipe_id = tracker.get_slot("recipe_id")
         
-        if recipe_id is None or DATASET is None:
+        catalog = current_catalog()
+
+        if recipe_id is None or catalog is None:
             dispatcher.utter_message(text="⚠️ Error: Recipe selection lost.")
             return []
 
         try:
             r_id = int(recipe_id)
-            
-            if r_id in DATASET.index:
-                # Estrae la riga dall'ID
-                row = DATASET.loc[r_id]
-                
-                # Formatta il messaggio
-                r_name = row['name'].title()
-                r_time = row['minutes']
-                r_rate = row['rating_medio']
-                r_votes = int(row['num_voti'])
-                
-                r_tags = str(row['tags']).replace('[','').replace(']','').replace("'", "").replace('"', "")
-                r_ingr = str(row['ingredients']).replace('[','').replace(']','').replace("'", "").replace('"', "")
-                r_steps = str(row['steps']).replace('[','').replace(']','').replace("'", "").replace('"', "")
-
-                message = (
-                    f"🍽️ {r_name}\n"
-                    f"⭐ Rating: {r_rate}/5 ({r_votes} votes)\n"
-                    f"⏱️ Cooking Time: {r_time} min\n"
-                    f"🏷️ Tags: {r_tags}\n\n"
-                    f"🥦 Ingredients:\n{r_ingr}\n\n"
-                    f"👨‍🍳 Steps:\n{r_steps}"
-                )
-                dispatcher.utter_message(text=message)
+
+            # Posizione della ricetta dall'ID (ricerca binaria, niente pandas)
+            with PHASE_SECONDS.time(self.name(), 'filter'):
+                r_pos = catalog.records.position(r_id)
+            if r_pos is not None:
+                # Scheda già formattata (dalla cache, o costruita una volta con i testi già puliti)
+                with PHASE_SECONDS.time(self.name(), 'render'):
+                    card = recipe_card(catalog, r_pos)
+                dispatcher.utter_message(text=card)
             else:
                 dispatcher.utter_message(text="⚠️ Recipe ID not found in database.")
                 
@@ -223,13 +505,13 @@ class ActionSelectRecipeById(Action):
         # Pulisce lo slot ID
         return [SlotSet("recipe_id", None)]
     
-class ActionSearchByCategory(Action):
+class ActionSearchByCategory(HeavyAction):
     def name(self) -> Text:
         return "action_search_by_category"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    def run_query(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
         user_input = tracker.get_slot("category")
         
@@ -237,7 +519,9 @@ class ActionSearchByCategory(Action):
             dispatcher.utter_message(text="❓ What category are you looking for? (e.g., Winter, Spicy, Vegan)")
             return []
 
-        if DATASET is None:
+        catalog = current_catalog()
+
+        if catalog is None:
             dispatcher.utter_message(text="⚠️ Database Error.")
             return []
 
@@ -247,86 +531,83 @@ class ActionSearchByCategory(Action):
 
         print(f"🔍 Categorie cercate dall'utente (raw): {user_input}")
 
-        # Iniziamo col dataset completo
-        matches = DATASET.copy()
-        
         # Lista per tenere traccia dei tag validi trovati (per il messaggio finale)
         found_tags = []
 
-        # --- CICLO DI FILTRAGGIO ---
+        # --- CICLO DI RICONOSCIMENTO ---
         # Per ogni tag chiesto dall'utente, restringe i risultati
         for item in user_input:
             search_tag = item.lower().strip()
             
-            # 1. Fuzzy Check per il singolo tag
-            current_tag_matches = matches[matches['tags'].str.contains(search_tag, case=False, na=False, regex=False)]
-            
-            # Se il tag non è contenuto nel DB, prova a correggerlo usando ALL_UNIQUE_TAGS
-            if current_tag_matches.empty and ALL_UNIQUE_TAGS:
-                try:
-                    best_match, score = process.extractOne(search_tag, ALL_UNIQUE_TAGS)
-                    if score >= 65:
-                        print(f"💡 Fuzzy Correction: '{search_tag}' -> '{best_match}'")
-                        search_tag = best_match
-                except:
-                    pass
+            # Se il tag non è contenuto nel DB, prova a correggerlo usando il vocabolario dei tag
+            if search_tag not in catalog.tag_bitmaps:
+                with PHASE_SECONDS.time(self.name(), 'fuzzy'):
+                    match = catalog.tag_vocabulary.resolve(search_tag)
+                if match:
+                    print(f"💡 Fuzzy Correction: '{search_tag}' -> '{match[0]}'")
+                    if match[1]:
+                        FUZZY_CORRECTIONS.inc('tag')
+                    search_tag = match[0]
             
             # Aggiunge il tag (originale o corretto) alla lista dei confermati
             found_tags.append(search_tag)
 
-            # 2. APPLICAZIONE FILTRO
-            # Restringiamo il dataset `matches` solo alle righe che hanno QUESTO tag
-            matches = matches[matches['tags'].str.contains(search_tag, case=False, na=False, regex=False)]
-            
-            # Se a un certo punto non rimane nulla (es. "Vegan" + "Steak"), stop
-            if matches.empty:
+            # Se il tag non esiste (es. "Vegan" + "Xyz"), stop
+            if search_tag not in catalog.tag_bitmaps:
                 break
 
+        # APPLICAZIONE FILTRO (o risultato già in cache per gli stessi tag)
+        count, top_ids = category_search(catalog, self.name(), found_tags)
+
         # --- RISULTATI ---
         tags_str = " + ".join([f"{t}" for t in found_tags])
         
         # Se trova qualcosa, mostra i top 5 risultati ordinati per rating
-        if not matches.empty:
-            matches = matches.sort_values(by=['rating_medio', 'num_voti'], ascending=[False, False])
-            count = len(matches)
-            top_matches = matches.head(5)
+        if count > 0:
+            top_matches = catalog.records.by_ids(top_ids[:5])
 
             # Salviamo il testo in una variabile invece di inviarlo da solo
             testo_risposta = f"🔍 I found {count} recipes matching {tags_str}! Here are the best ones:"
             
             buttons = []
-            for index, row in top_matches.iterrows():
-                r_name = row['name'].title()
-                r_rate = row['rating_medio']
-                
-                # Aggiungiamo l'icona del cuoco per allungare il testo del bottone (layout verticale Telegram)
-                title = f"👨‍🍳 {r_name} ({r_rate}⭐)"
-                payload = f'/select_recipe{{"recipe_id":"{index}"}}'
-                buttons.append({"title": title, "payload": payload})
+            with PHASE_SECONDS.time(self.name(), 'render'):
+                for row in top_matches:
+                    # Aggiungiamo l'icona del cuoco per allungare il testo del bottone (layout verticale Telegram)
+                    title = button_title(catalog, row, "👨‍🍳")
+                    payload = f'/select_recipe{{"recipe_id":"{row.id}"}}'
+                    buttons.append({"title": title, "payload": payload})
+
+                token = open_cursor(query_key('category', tags=found_tags), top_ids)
+                if token:
+                    buttons.append(show_more_button(token))
             
             # Invia testo e bottoni in un unico pacchetto
             dispatcher.utter_message(text=testo_risposta, buttons=buttons)
         
         else:
+            token = None
+            ZERO_RESULTS.inc(self.name())
             dispatcher.utter_message(text=f"😔 No recipes found matching ALL these criteria: {tags_str}. Try searching for just one of them.")
         
         # Resetta lo slot
-        return [SlotSet("category", None)]
+        return [SlotSet("category", None), SlotSet("cursor", token)]
     
-class ActionAskNutrition(Action):
+class ActionAskNutrition(HeavyAction):
     def name(self) -> Text:
         return "action_ask_nutrition"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    def run_query(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
         # Prende tutti gli slot possibili
         recipe_id = tracker.get_slot("recipe_id")
         recipe_name = tracker.get_slot("recipe_name")
         requested_nutrient = tracker.get_slot("nutrient")
         
-        if DATASET is None:
+        catalog = current_catalog()
+
+        if catalog is None:
             dispatcher.utter_message(text="⚠️ Database Error.")
             return []
 
@@ -336,41 +617,42 @@ class ActionAskNutrition(Action):
         if recipe_id:
             try:
                 r_index = int(recipe_id)
-                # Controlliamo se l'indice è valido
-                if 0 <= r_index < len(DATASET):
-                    # Recupera la riga dall'ID usando .loc (o .iloc se usi indici posizionali, ma .loc è più sicuro per gli ID)
-                    row = DATASET.loc[r_index]
-                    print(f"✅ Trovata ricetta via ID: {r_index} -> {row['name']}")
+                # Controlliamo se l'ID esiste nella versione corrente del catalogo
+                r_pos = catalog.records.position(r_index)
+                if r_pos is not None:
+                    # Recupera la ricetta dall'ID (l'ID è stabile, la posizione no)
+                    row = catalog.records.record(r_pos)
+                    print(f"✅ Trovata ricetta via ID: {r_index} -> {row.name}")
                 else:
                     dispatcher.utter_message(text="⚠️ Invalid Recipe ID.")
                     return [SlotSet("recipe_id", None)]
             except ValueError:
                 pass
-            except KeyError:
-                dispatcher.utter_message(text="⚠️ Invalid Recipe ID.")
-                return [SlotSet("recipe_id", None)]
 
         # --- 2. RICERCA PER NOME ---
         if row is None and recipe_name:
             search_term = recipe_name.lower().strip()
             
             # Ricerca ampia
-            matches = DATASET[DATASET['name'].str.contains(search_term, case=False, na=False, regex=False)]
+            with PHASE_SECONDS.time(self.name(), 'filter'):
+                matches = catalog.records.records(catalog.name_index.search(search_term))
             
             # Fuzzy fallback
-            if matches.empty:
+            if not matches:
                 try:
-                    all_names = DATASET['name'].tolist()
-                    best_match, score = process.extractOne(search_term, all_names)
-                    if score >= 60:
+                    with PHASE_SECONDS.time(self.name(), 'fuzzy'):
+                        suggestions = catalog.name_matcher.suggest(search_term, threshold=FUZZY_NAME_THRESHOLD)
+                    if suggestions:
+                        best_match, score = suggestions[0]
+                        FUZZY_CORRECTIONS.inc('name')
                         dispatcher.utter_message(text=f"Did you mean {best_match}? Checking... 🕵️")
-                        matches = DATASET[DATASET['name'].str.contains(best_match, case=False, na=False, regex=False)]
+                        matches = catalog.records.records(catalog.name_index.search(best_match))
                 except:
                     pass
 
-            if not matches.empty:
-                matches = matches.sort_values(by=['rating_medio', 'num_voti'], ascending=[False, False])
-                unique_names = matches['name'].unique()
+            if matches:
+                # Le ricette sono già in ordine di classifica
+                unique_names = {r.name for r in matches}
                 
                 # Se ci sono ambiguità (es. "Bread" vs "Banana Bread"), mostra i bottoni
                 if len(unique_names) > 1:
@@ -378,13 +660,11 @@ class ActionAskNutrition(Action):
                     
                     buttons = []
                     # Prendiamo i primi 5 risultati diversi
-                    for index, r in matches.head(5).iterrows():
-                        r_name = r['name'].title()
-                        
+                    for r in matches[:5]:
                         # Passiamo SOLO l'ID. Rasa si ricorderà da solo il nutriente dalla memoria!
-                        payload = f'/ask_nutrition{{"recipe_id":"{index}"}}'
+                        payload = f'/ask_nutrition{{"recipe_id":"{r.id}"}}'
                         
-                        buttons.append({"title": f"🥗 {r_name}", "payload": payload})
+                        buttons.append({"title": button_title(catalog, r, "🥗", detail=None), "payload": payload})
                     
                     # Invia il messaggio combinato (Telegram safe)
                     dispatcher.utter_message(text=testo_risposta, buttons=buttons)
@@ -392,14 +672,15 @@ class ActionAskNutrition(Action):
                 
                 else:
                     # Match unico
-                    row = matches.iloc[0]
+                    row = matches[0]
             else:
+                ZERO_RESULTS.inc(self.name())
                 dispatcher.utter_message(text=f"😔 I couldn't find nutritional info for {recipe_name}.")
                 return [SlotSet("recipe_name", None)]
 
         # --- 3. MOSTRA RISULTATI (Se esiste 'row') ---
         if row is not None:
-            r_name = row['name'].title()
+            r_name = row.title
             
             # MAPPING COLONNE
             column_map = {
@@ -416,7 +697,7 @@ class ActionAskNutrition(Action):
 
                 # Se il nutriente esiste...
                 if col_name in row:
-                    value = row[col_name]
+                    value = display_number(row[col_name])
                     unit = "kcal" if col_name == "calories" else "% PDV"
                     dispatcher.utter_message(text=f"📊 {r_name} contains {value} {unit} of {requested_nutrient}.")
                 else:
@@ -425,13 +706,13 @@ class ActionAskNutrition(Action):
             else:
                 msg = (
                     f"📊 Nutritional Info for {r_name}:\n\n"
-                    f"🔥 Calories: {row['calories']} kcal\n"
-                    f"🥓 Total Fat: {row['total_fat']}% PDV\n"
-                    f"🍬 Sugar: {row['sugar']}% PDV\n"
-                    f"🧂 Sodium: {row['sodium']}% PDV\n"
-                    f"🥩 Protein: {row['protein']}% PDV\n"
-                    f"🧈 Saturated Fat: {row['saturated_fat']}% PDV\n"
-                    f"🍞 Carbohydrates: {row['carbohydrates']}% PDV\n\n"
+                    f"🔥 Calories: {display_number(row['calories'])} kcal\n"
+                    f"🥓 Total Fat: {display_number(row['total_fat'])}% PDV\n"
+                    f"🍬 Sugar: {display_number(row['sugar'])}% PDV\n"
+                    f"🧂 Sodium: {display_number(row['sodium'])}% PDV\n"
+                    f"🥩 Protein: {display_number(row['protein'])}% PDV\n"
+                    f"🧈 Saturated Fat: {display_number(row['saturated_fat'])}% PDV\n"
+                    f"🍞 Carbohydrates: {display_number(row['carbohydrates'])}% PDV\n\n"
                     f"(PDV = Percent Daily Value)"
                 )
                 dispatcher.utter_message(text=msg)
@@ -439,19 +720,21 @@ class ActionAskNutrition(Action):
         # Resetta tutti gli slot
         return [SlotSet("recipe_name", None), SlotSet("recipe_id", None), SlotSet("nutrient", None)]
     
-class ActionAskCookingTime(Action):
+class ActionAskCookingTime(HeavyAction):
     def name(self) -> Text:
         return "action_ask_cooking_time"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    def run_query(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
         # Prende tutti gli slot possibili (id se viene da bottone, altrimenti nome per ricerca)
         recipe_id = tracker.get_slot("recipe_id")
         recipe_name = tracker.get_slot("recipe_name")
         
-        if DATASET is None:
+        catalog = current_catalog()
+
+        if catalog is None:
             dispatcher.utter_message(text="⚠️ Database Error.")
             return []
 
@@ -461,39 +744,40 @@ class ActionAskCookingTime(Action):
         if recipe_id:
             try:
                 r_index = int(recipe_id)
-                if 0 <= r_index < len(DATASET):
-                    # Usiamo .loc perché r_index è l'ID reale (l'indice del dataframe)
-                    row = DATASET.loc[r_index]
+                # r_index è l'ID reale: la posizione si trova con una ricerca binaria
+                r_pos = catalog.records.position(r_index)
+                if r_pos is not None:
+                    row = catalog.records.record(r_pos)
                 else:
                     dispatcher.utter_message(text="⚠️ Invalid Recipe ID.")
                     return [SlotSet("recipe_id", None)]
             except ValueError:
                 pass
-            except KeyError:
-                dispatcher.utter_message(text="⚠️ Invalid Recipe ID.")
-                return [SlotSet("recipe_id", None)]
 
         # --- 2. RICERCA PER NOME ---
         if row is None and recipe_name:
             search_term = recipe_name.lower().strip()
             
             # Ricerca ampia
-            matches = DATASET[DATASET['name'].str.contains(search_term, case=False, na=False, regex=False)]
+            with PHASE_SECONDS.time(self.name(), 'filter'):
+                matches = catalog.records.records(catalog.name_index.search(search_term))
             
             # Fuzzy fallback
-            if matches.empty:
+            if not matches:
                 try:
-                    all_names = DATASET['name'].tolist()
-                    best_match, score = process.extractOne(search_term, all_names)
-                    if score >= 60:
+                    with PHASE_SECONDS.time(self.name(), 'fuzzy'):
+                        suggestions = catalog.name_matcher.suggest(search_term, threshold=FUZZY_NAME_THRESHOLD)
+                    if suggestions:
+                        best_match, score = suggestions[0]
+                        FUZZY_CORRECTIONS.inc('name')
                         dispatcher.utter_message(text=f"Did you mean {best_match}? Checking time... ⏱️")
-                        matches = DATASET[DATASET['name'].str.contains(best_match, case=False, na=False, regex=False)]
+                        matches = catalog.records.records(catalog.name_index.search(best_match))
                 except:
                     pass
 
-            if not matches.empty:
-                matches = matches.sort_values(by=['rating_medio', 'num_voti'], ascending=[False, False])
-                unique_names = matches['name'].unique()
+            if matches:
+                # Le ricette sono già in ordine di classifica
+                unique_names = {r.name for r in matches}
                 
                 # AMBIGUITÀ -> BOTTONI CON ID
                 if len(unique_names) > 1:
@@ -501,13 +785,12 @@ class ActionAskCookingTime(Action):
                     testo_risposta = f"⏱️ I found multiple recipes for '{recipe_name}'. Which one?"
                     
                     buttons = []
-                    for index, r in matches.head(5).iterrows():
-                        r_name = r['name'].title()
+                    for r in matches[:5]:
                         # Payload punta a questa azione ma con l'ID
-                        payload = f'/ask_cooking_time{{"recipe_id":"{index}"}}'
+                        payload = f'/ask_cooking_time{{"recipe_id":"{r.id}"}}'
                         
                         # Aggiungiamo un'icona per favorire il layout verticale su Telegram
-                        buttons.append({"title": f"⏳ {r_name}", "payload": payload})
+                        buttons.append({"title": button_title(catalog, r, "⏳", detail=None), "payload": payload})
                     
                     # Inviamo il pacchetto completo testo + bottoni
                     dispatcher.utter_message(text=testo_risposta, buttons=buttons)
@@ -515,14 +798,15 @@ class ActionAskCookingTime(Action):
                 
                 else:
                     # Match unico
-                    row = matches.iloc[0]
+                    row = matches[0]
             else:
+                ZERO_RESULTS.inc(self.name())
                 dispatcher.utter_message(text=f"😔 I couldn't find cooking times for {recipe_name}.")
                 return [SlotSet("recipe_name", None)]
 
         # --- 3. MOSTRA RISULTATO ---
         if row is not None:
-            r_name = row['name'].title()
+            r_name = row.title
             r_minutes = row['minutes']
             
             # Formattazione della risposta
@@ -531,20 +815,20 @@ class ActionAskCookingTime(Action):
                 mins = int(r_minutes % 60)
                 time_str = f"{hours}h {mins}m"
             else:
-                time_str = f"{r_minutes} minutes"
+                time_str = f"{display_number(r_minutes)} minutes"
 
             dispatcher.utter_message(text=f"⏱️ {r_name} takes about {time_str} to make.")
 
         # Reset slot
         return [SlotSet("recipe_name", None), SlotSet("recipe_id", None)]
 
-class ActionSearchByIngredient(Action):
+class ActionSearchByIngredient(HeavyAction):
     def name(self) -> Text:
         return "action_search_by_ingredient"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    def run_query(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
         # 1. Recupera Input Utente (slot 'ingredient')
         user_input = tracker.get_slot("ingredient")
@@ -553,7 +837,9 @@ class ActionSearchByIngredient(Action):
             dispatcher.utter_message(text="❓ What ingredients do you have? (e.g., Chicken, Onion, Eggs)")
             return []
 
-        if DATASET is None:
+        catalog = current_catalog()
+
+        if catalog is None:
             dispatcher.utter_message(text="⚠️ Database Error.")
             return []
 
@@ -563,69 +849,70 @@ class ActionSearchByIngredient(Action):
 
         print(f"🥦 Ingredienti cercati dall'utente (raw): {user_input}")
 
-        matches = DATASET.copy()
-        
         # Lista per tenere traccia degli ingredienti validi trovati
         found_ingredients = []
 
-        # --- CICLO DI FILTRAGGIO ---
+        # --- CICLO DI RICONOSCIMENTO ---
         for item in user_input:
             search_item = item.lower().strip()
-                        
-            # Controllo rapido se c'è già un match esatto nel subset corrente
-            current_matches = matches[matches['ingredients'].str.contains(search_item, case=False, na=False, regex=False)]
-            
-            # Fuzzy fallback
-            if current_matches.empty and ALL_UNIQUE_INGREDIENTS:
-                try:
-                    best_match, score = process.extractOne(search_item, ALL_UNIQUE_INGREDIENTS)
-                    if score >= 70:
-                        print(f"💡 Fuzzy Ingredient Correction: '{search_item}' -> '{best_match}'")
-                        search_item = best_match
-                except:
-                    pass
+
+            # Fuzzy fallback se l'ingrediente non esiste esattamente nell'indice
+            if search_item not in catalog.ingredient_index:
+                with PHASE_SECONDS.time(self.name(), 'fuzzy'):
+                    match = catalog.ingredient_vocabulary.resolve(search_item)
+                if match:
+                    print(f"💡 Fuzzy Ingredient Correction: '{search_item}' -> '{match[0]}'")
+                    if match[1]:
+                        FUZZY_CORRECTIONS.inc('ingredient')
+                    search_item = match[0]
             
             # Aggiunge l'ingrediente (originale o corretto)
             found_ingredients.append(search_item)
 
-            # Restringe il dataset `matches` alle sole righe che contengono questo ingrediente
-            matches = matches[matches['ingredients'].str.contains(search_item, case=False, na=False, regex=False)]
-            
-            # Se a un certo punto non rimane nulla, stop
-            if matches.empty:
+            # Se l'ingrediente non compare in nessuna ricetta, inutile proseguire
+            if search_item not in catalog.ingredient_index:
                 break
 
+        # Ricette con TUTTI gli ingredienti o, se non ce ne sono, quelle che ne usano di più
+        count, top_ids, partial = ingredient_search(catalog, self.name(), found_ingredients)
+
         # --- RISULTATI ---
         ing_str = " + ".join([f"{i}" for i in found_ingredients])
         
         # Se ha trovato qualcosa, mostra i top 5 risultati ordinati per rating
-        if not matches.empty:
-            matches = matches.sort_values(by=['rating_medio', 'num_voti'], ascending=[False, False])
-            count = len(matches)
-            top_matches = matches.head(5)
+        if count > 0:
+            top_matches = catalog.records.by_ids(top_ids[:5])
 
             # Salviamo il testo in una variabile
-            testo_risposta = f"🍳 I found {count} recipes using {ing_str}! Here are the best ones:"
+            if partial:
+                testo_risposta = (f"🧊 No recipe uses ALL of {ing_str}, but {count} recipes use some of them. "
+                                  f"These use the most (and need the fewest extra ingredients):")
+            else:
+                testo_risposta = f"🍳 I found {count} recipes using {ing_str}! Here are the best ones:"
             
             buttons = []
-            for index, row in top_matches.iterrows():
-                r_name = row['name'].title()
-                r_rate = row['rating_medio']
-                
-                # Aggiungiamo l'icona per allungare il testo e forzare il layout verticale su Telegram
-                title = f"🍳 {r_name} ({r_rate}⭐)"
-                payload = f'/select_recipe{{"recipe_id":"{index}"}}'
-                buttons.append({"title": title, "payload": payload})
+            with PHASE_SECONDS.time(self.name(), 'render'):
+                for row in top_matches:
+                    # Aggiungiamo l'icona per allungare il testo e forzare il layout verticale su Telegram
+                    title = button_title(catalog, row, "🍳")
+                    payload = f'/select_recipe{{"recipe_id":"{row.id}"}}'
+                    buttons.append({"title": title, "payload": payload})
+
+                token = open_cursor(query_key('ingredient', ingredients=found_ingredients), top_ids)
+                if token:
+                    buttons.append(show_more_button(token))
             
             # Invia testo e bottoni insieme!
             dispatcher.utter_message(text=testo_risposta, buttons=buttons)
             
         # Altrimenti, se non trova nulla, mostra un messaggio di errore
         else:
+            token = None
+            ZERO_RESULTS.inc(self.name())
             dispatcher.utter_message(text=f"😔 No recipes found containing ALL these ingredients: {ing_str}. Try searching for just one of them.")
         
         # Resetta lo slot
-        return [SlotSet("ingredient", None)]
+        return [SlotSet("ingredient", None), SlotSet("cursor", token)]
     
 class ValidateSvuotaFrigoForm(FormValidationAction):
     def name(self) -> Text:
@@ -644,10 +931,19 @@ class ValidateSvuotaFrigoForm(FormValidationAction):
         if intent == "stop" or text.strip() in ["stop", "exit", "cancel", "close"]:
             return {"ingredient": None}
         
+        catalog = current_catalog()
+
         # Estrae gli ingredienti usando le entità
         extracted = [e["value"] for e in tracker.latest_message.get("entities", []) if e["entity"] == "ingredient"]
-        
-        # Prova a estrarre manualmente dagli slot se le entità non hanno funzionato (es. "I have chicken and onion")
+
+        # Se le entità non hanno funzionato, cerca nel testo gli ingredienti conosciuti (anche di più parole);
+        # i frammenti avanzati (es. un refuso) passano comunque dalla correzione del vocabolario
+        if not extracted and catalog is not None:
+            with PHASE_SECONDS.time(self.name(), 'extract'):
+                found, rest = catalog.ingredient_extractor.parse(tracker.latest_message.get("text", ""))
+            extracted = found + rest
+
+        # Ultima risorsa: parsing manuale (es. "I have chiken and onoin"), poi correzione dei refusi
         if not extracted:
             text = tracker.latest_message.get("text", "").lower()
             for word in ["i have ", "use ", "some ", "only ", "want "]:
@@ -660,17 +956,18 @@ class ValidateSvuotaFrigoForm(FormValidationAction):
             return {"ingredient": None, "time_limit": None, "category": None}
 
         valid_ingredients = []
-        # Controlla ogni ingrediente estratto: se è esatto, ok; altrimenti prova a correggerlo con fuzzy matching
-        for item in extracted:
-            item_clean = item.lower()
-            if item_clean in ALL_UNIQUE_INGREDIENTS:
-                valid_ingredients.append(item_clean)
-            else:
-                if ALL_UNIQUE_INGREDIENTS:
-                    best_match, score = process.extractOne(item_clean, ALL_UNIQUE_INGREDIENTS, scorer=fuzz.ratio)
-                    if score >= 80:
-                        print(f"✅ Validated Ing: '{item_clean}' -> '{best_match}'")
-                        valid_ingredients.append(best_match)
+        # Controlla ogni ingrediente estratto: esatto, forma normalizzata/sinonimo oppure refuso corretto
+        if catalog is not None:
+            with PHASE_SECONDS.time(self.name(), 'fuzzy'):
+                matches = catalog.ingredient_vocabulary.resolve_many(extracted)
+            for item, match in zip(extracted, matches):
+                if match is None:
+                    continue
+                if match[0] != item.lower():
+                    print(f"✅ Validated Ing: '{item}' -> '{match[0]}'")
+                if match[1]:
+                    FUZZY_CORRECTIONS.inc('ingredient')
+                valid_ingredients.append(match[0])
 
         # Se dopo tutto questo non abbiamo ingredienti validi, mostra un messaggio di errore e resetta tutto
         if not valid_ingredients:
@@ -721,10 +1018,20 @@ class ValidateSvuotaFrigoForm(FormValidationAction):
         if text in ["none", "nothing", "no", "skip", "any", "i don't care"]:
             return {"category": ["none"]}
 
+        catalog = current_catalog()
+
         # Prova a estrarre le categorie usando le entità
         extracted = [e["value"] for e in tracker.latest_message.get("entities", []) if e["entity"] == "category"]
         print("Extracted categories:", extracted)
 
+        # Altrimenti cerca nel testo i tag conosciuti (anche di più parole, es. "60 minutes or less");
+        # i frammenti avanzati (es. un refuso) passano comunque dalla correzione del vocabolario
+        if not extracted and catalog is not None:
+            with PHASE_SECONDS.time(self.name(), 'extract'):
+                found, rest = catalog.tag_extractor.parse(tracker.latest_message.get("text", ""))
+            extracted = found + rest
+            print("Tags found in text:", found, "to correct:", rest)
+
         # Se non riesce ad estrarre nulla, prova a fare un parsing manuale
         if not extracted:
             text = tracker.latest_message.get("text", "").lower()
@@ -740,17 +1047,18 @@ class ValidateSvuotaFrigoForm(FormValidationAction):
             return {"category": None}
 
         valid_tags = []
-        # Controlla ogni tag estratto: se è esatto, ok; altrimenti prova a correggerlo con fuzzy matching
-        for item in extracted:
-            item_clean = item.lower()
-            if item_clean in ALL_UNIQUE_TAGS:
-                valid_tags.append(item_clean)
-            else:
-                if ALL_UNIQUE_TAGS:
-                    best_match, score = process.extractOne(item_clean, ALL_UNIQUE_TAGS, scorer=fuzz.ratio)
-                    if score >= 75:
-                        print(f"✅ Validated Tag: '{item_clean}' -> '{best_match}'")
-                        valid_tags.append(best_match)
+        # Controlla ogni tag estratto: esatto, forma normalizzata/sinonimo oppure refuso corretto
+        if catalog is not None:
+            with PHASE_SECONDS.time(self.name(), 'fuzzy'):
+                matches = catalog.tag_vocabulary.resolve_many(extracted)
+            for item, match in zip(extracted, matches):
+                if match is None:
+                    continue
+                if match[0] != item.lower():
+                    print(f"✅ Validated Tag: '{item}' -> '{match[0]}'")
+                if match[1]:
+                    FUZZY_CORRECTIONS.inc('tag')
+                valid_tags.append(match[0])
 
         # Se dopo tutto questo non abbiamo tag validi, mostra un messaggio di errore e resetta la categoria
         if not valid_tags:
@@ -759,93 +1067,68 @@ class ValidateSvuotaFrigoForm(FormValidationAction):
 
         return {"category": valid_tags}
 
-class ActionSubmitSvuotaFrigo(Action):
+class ActionSubmitSvuotaFrigo(HeavyAction):
     def name(self) -> Text:
         return "action_submit_svuota_frigo"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    def run_query(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
         # Recupera i dati (già perfetti e validati dalla Form!)
         ingredients = tracker.get_slot("ingredient")
         time_limit = tracker.get_slot("time_limit")
         categories = tracker.get_slot("category")
 
-        if DATASET is None:
+        catalog = current_catalog()
+
+        if catalog is None:
             dispatcher.utter_message(text="⚠️ Database Error.")
             return []
 
-        matches = DATASET.copy()
-
-        # FILTRO TEMPO (calcolo più veloce)
-        if time_limit:
-            matches = matches[matches['minutes'] <= int(time_limit)]
-
-        # FILTRO INGREDIENTI (Ricerca Esatta nell'Array)
-        if not matches.empty and ingredients:
-            def check_ingredients(row_ing_str):
-                try:
-                    # Converte la stringa "['olive', 'garlic']" in una VERA lista Python
-                    recipe_ings = [x.lower().strip() for x in ast.literal_eval(row_ing_str)]
-                    
-                    # Controlla che TUTTI gli ingredienti cercati siano nella lista
-                    for search_item in ingredients:
-                        if search_item.lower() not in recipe_ings:
-                            return False
-                    return True
-                except:
-                    return False
-
-            # Applica il filtro ingredienti        
-            matches = matches[matches['ingredients'].apply(check_ingredients)]
-
-        # 4. FILTRO CATEGORIE / TAGS (Ricerca Esatta nell'Array)
-        if not matches.empty and categories and categories != ["none"]:
-            def check_tags(row_tag_str):
-                try:
-                    # Stessa logica degli ingredienti
-                    recipe_tags = [x.lower().strip() for x in ast.literal_eval(row_tag_str)]
-                    for cat in categories:
-                        if cat.lower() not in recipe_tags:
-                            return False
-                    return True
-                except:
-                    return False
-
-            # Applica il filtro tags        
-            matches = matches[matches['tags'].apply(check_tags)]
+        # Ricerca esatta e, se il frigo è troppo pieno, per copertura (stessa logica dell'endpoint batch)
+        wanted_tags = [] if not categories or categories == ["none"] else [c.lower().strip() for c in categories]
+        count, top_ids, partial = svuota_frigo_search(catalog, self.name(), ingredients or [], wanted_tags, time_limit)
 
         # --- MOSTRA I RISULTATI ---
         ing_display = ", ".join(ingredients) if ingredients else "any ingredients"
         cat_display = "" if not categories or categories == ["none"] else f" and tags ({', '.join(categories)})"
         
-        if not matches.empty:
-            # Ordina per qualità (rating e numero di voti)
-            matches = matches.sort_values(by=['rating_medio', 'num_voti'], ascending=[False, False])
-            count = len(matches)
-            top_matches = matches.head(5)
+        if count > 0:
+            # Gli ID sono già ordinati per qualità (rating e numero di voti) o per copertura
+            top_matches = catalog.records.by_ids(top_ids[:5])
 
             # Salviamo il testo in una variabile
-            testo_risposta = f"🎉 SUCCESS! I found {count} recipes using {ing_display}, under {time_limit} mins{cat_display}:"
+            if partial:
+                testo_risposta = (f"🧊 No recipe uses ALL of {ing_display} under {time_limit} mins{cat_display}, "
+                                  f"but {count} recipes use some of them. These use the most:")
+            else:
+                testo_risposta = f"🎉 SUCCESS! I found {count} recipes using {ing_display}, under {time_limit} mins{cat_display}:"
             
             buttons = []
-            for index, row in top_matches.iterrows():
-                r_name = row['name'].title()
-                
-                # Aggiungiamo icona per forzare l'incolonnamento su Telegram
-                title = f"🍽️ {r_name} ({row['minutes']}m)"
-                payload = f'/select_recipe{{"recipe_id":"{index}"}}'
-                
-                buttons.append({"title": title, "payload": payload})
+            with PHASE_SECONDS.time(self.name(), 'render'):
+                for row in top_matches:
+                    # Aggiungiamo icona per forzare l'incolonnamento su Telegram
+                    title = button_title(catalog, row, "🍽️", detail='minutes')
+                    payload = f'/select_recipe{{"recipe_id":"{row.id}"}}'
+
+                    buttons.append({"title": title, "payload": payload})
+
+                key = query_key('svuota_frigo', ingredients=ingredients or [], tags=wanted_tags, time_limit=time_limit or None)
+                token = open_cursor(key, top_ids)
+                if token:
+                    buttons.append(show_more_button(token))
             
             # Invio combinato di testo e bottoni!
             dispatcher.utter_message(text=testo_risposta, buttons=buttons)
         else:
+            token = None
+            ZERO_RESULTS.inc(self.name())
             dispatcher.utter_message(text=f"😔 I'm sorry, I couldn't find any recipe combining {ing_display} under {time_limit} minutes{cat_display}. The fridge is too empty!")
 
         # PULIZIA TOTALE (Svuota gli slot per la prossima ricerca)
-        return [SlotSet("ingredient", None), SlotSet("time_limit", None), SlotSet("category", None)]
+        return [SlotSet("ingredient", None), SlotSet("time_limit", None), SlotSet("category", None),
+                SlotSet("cursor", token)]
     
 # =============================================================================
 # VALIDAZIONE FORM NUTRIZIONALE
@@ -930,13 +1213,13 @@ class ValidateNutritionSearchForm(FormValidationAction):
 # =============================================================================
 # SUBMIT FORM NUTRIZIONALE (Ricerca nel DB)
 # =============================================================================
-class ActionSubmitNutritionSearch(Action):
+class ActionSubmitNutritionSearch(HeavyAction):
     def name(self) -> Text:
         return "action_submit_nutrition_search"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    def run_query(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
         # Recupera i target macros (già validati dalla Form!)
         target_cal = tracker.get_slot("max_calories")
@@ -944,47 +1227,40 @@ class ActionSubmitNutritionSearch(Action):
         target_fat = tracker.get_slot("max_fat")
         target_protein = tracker.get_slot("max_protein")
 
-        if DATASET is None:
+        catalog = current_catalog()
+
+        if catalog is None:
             dispatcher.utter_message(text="⚠️ Database Error.")
             return []
 
-        matches = DATASET.copy()
-
         # =========================================================
         # CALCOLO DELLA "DISTANZA" (Errore Relativo)
         # Più il numero è vicino a 0, più la ricetta è perfetta!
-        # Usiamo max(1, target) per evitare divisioni per zero se l'utente digita "0"
+        # Il motore usa max(1, target) per evitare divisioni per zero se l'utente digita "0"
+        # e, a parità di distanza, vince la ricetta con il rating migliore.
         # =========================================================
-        matches['distance'] = (
-            abs(matches['calories'] - target_cal) / max(1, target_cal) +
-            abs(matches['carbohydrates'] - target_carbs) / max(1, target_carbs) +
-            abs(matches['total_fat'] - target_fat) / max(1, target_fat) +
-            abs(matches['protein'] - target_protein) / max(1, target_protein)
-        )
+        targets = [target_cal, target_carbs, target_fat, target_protein]
 
-        # Ordina in modo CRESCENTE per distanza (il più vicino a 0 vince) 
-        # e decrescente per rating (a parità di distanza, vince la più buona)
-        matches = matches.sort_values(by=['distance', 'rating_medio'], ascending=[True, False])
-        
-        # Prende le 5 ricette che si avvicinano di più all'obiettivo
-        top_matches = matches.head(5)
+        # Prende le 5 ricette che si avvicinano di più all'obiettivo (selezione parziale, niente sort completo)
+        positions = macro_search(catalog, self.name(), targets, k=5)
+        top_matches = catalog.records.records(positions)
 
         # Salviamo il testo in una variabile
         testo_risposta = f"🎯 SUCCESS! I found the recipes that best match your target macros:"
         
         buttons = []
         # Crea un bottone per ogni ricetta
-        for index, row in top_matches.iterrows():
-            r_name = row['name'].title()
+        for row in top_matches:
+            r_name = row.title
             
-            c = row['calories']
-            carb = row['carbohydrates']
-            fat = row['total_fat']
-            pro = row['protein']
+            c = display_number(row['calories'])
+            carb = display_number(row['carbohydrates'])
+            fat = display_number(row['total_fat'])
+            pro = display_number(row['protein'])
             
             # Aggiunta icona per layout verticale Telegram
             label = f"🥗 {r_name} ({c}kcal | C:{carb}% | F:{fat}% | P:{pro}%)"
-            buttons.append({"title": label, "payload": f'/select_recipe{{"recipe_id":"{index}"}}'})
+            buttons.append({"title": label, "payload": f'/select_recipe{{"recipe_id":"{row.id}"}}'})
         
         # Invio combinato (Testo + Bottoni) in stile Telegram!
         dispatcher.utter_message(text=testo_risposta, buttons=buttons)
@@ -1034,14 +1310,16 @@ class ValidateFullMealForm(FormValidationAction):
             return {"meal_tag": None}
 
         # --- VALIDAZIONE E FUZZY MATCHING ---
-        if extracted_tag in ALL_UNIQUE_TAGS:
-            return {"meal_tag": extracted_tag}
-        else:
-            if ALL_UNIQUE_TAGS:
-                best_match, score = process.extractOne(extracted_tag, ALL_UNIQUE_TAGS, scorer=fuzz.ratio)
-                if score >= 75:
-                    print(f"✅ Validated Meal Tag: '{extracted_tag}' -> '{best_match}'")
-                    return {"meal_tag": best_match}
+        catalog = current_catalog()
+        if catalog is not None:
+            with PHASE_SECONDS.time(self.name(), 'fuzzy'):
+                match = catalog.tag_vocabulary.resolve(extracted_tag)
+            if match:
+                if match[0] != extracted_tag:
+                    print(f"✅ Validated Meal Tag: '{extracted_tag}' -> '{match[0]}'")
+                if match[1]:
+                    FUZZY_CORRECTIONS.inc('tag')
+                return {"meal_tag": match[0]}
 
         # Se fallisce anche il Fuzzy Match
         dispatcher.utter_message(text=f"🛑 I don't recognize '{extracted_tag}'. Give me a valid category (like 'Healthy', 'Winter').")
@@ -1051,73 +1329,42 @@ class ValidateFullMealForm(FormValidationAction):
 # =============================================================================
 # SUBMIT FORM FULL MEAL (Generazione del Menu)
 # =============================================================================
-class ActionSubmitFullMeal(Action):
+class ActionSubmitFullMeal(HeavyAction):
     def name(self) -> Text:
         return "action_submit_full_meal"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    def run_query(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
         meal_tag = tracker.get_slot("meal_tag")
         
-        if DATASET is None:
+        catalog = current_catalog()
+
+        if catalog is None:
             dispatcher.utter_message(text="⚠️ Database Error.")
             return []
 
-        # 1. Filtra tutto il database affinché contenga il TAG SCELTO
-        matches = DATASET.copy()
-        
-        # Funzione di controllo del tema (tag) per ogni ricetta
-        def check_theme(row_tag_str):
-            try:
-                recipe_tags = [x.lower().strip() for x in ast.literal_eval(row_tag_str)]
-                return meal_tag in recipe_tags
-            except:
-                return False
-                
-        # Applica il filtro del tema (tag) al dataset
-        theme_matches = matches[matches['tags'].apply(check_theme)]
-
-        # 2. Struttura delle 5 Portate
-        # Formato: (Nome Display, [lista_tag_accettati])
-        courses = [
-            ("🥗 Appetizer", ["appetizers"]),
-            ("🍝 First Course", ["pasta", "rice"]),
-            ("🥩 Main Course", ["main-dish"]),
-            ("🍟 Side Dish", ["side-dishes"]),
-            ("🍰 Dessert", ["desserts"])
-        ]
+        # 1. Ricetta migliore per ogni portata (posizione o None): menu già calcolato per il tema
+        with PHASE_SECONDS.time(self.name(), 'filter'):
+            menu = catalog.menus.menu(meal_tag)
 
         # Formatta il messaggio iniziale del menu
         msg = f"🍽️ The Ultimate {meal_tag.title()} Menu 🍽️\n\n"
         buttons = []
 
-        # 3. Cerca la ricetta migliore per ogni portata
-        for course_name, valid_course_tags in courses:
-            
-            # Funzione di controllo per verificare se una ricetta appartiene alla portata (controlla se ha ALMENO UNO dei tag validi)
-            def check_course(row_tag_str):
-                try:
-                    recipe_tags = [x.lower().strip() for x in ast.literal_eval(row_tag_str)]
-                    return any(t in recipe_tags for t in valid_course_tags)
-                except:
-                    return False
-            
-            # Filtra il database già scremato per il tema
-            course_matches = theme_matches[theme_matches['tags'].apply(check_course)]
+        # 2. Mostra la ricetta migliore per ogni portata
+        for course_name, top_pos in menu:
             
             # Se trova qualcosa...
-            if not course_matches.empty:
-                # Ordina per trovare la migliore in assoluto
-                course_matches = course_matches.sort_values(by=['rating_medio', 'num_voti'], ascending=[False, False])
-                top_recipe = course_matches.iloc[0]
+            if top_pos is not None:
+                top_recipe = catalog.records.record(top_pos)
                 
-                r_name = top_recipe['name'].title()
-                r_rate = top_recipe['rating_medio']
+                r_name = top_recipe.title
+                r_rate = display_number(top_recipe['rating_medio'])
                 
-                # Prendo l'ID (l'indice) per creare il bottone
-                r_id = course_matches.index[0]
+                # Prendo l'ID per creare il bottone
+                r_id = top_recipe.id
                 
                 msg += f"{course_name}: {r_name} ({r_rate}⭐)\n"
                 
@@ -1127,7 +1374,7 @@ class ActionSubmitFullMeal(Action):
                 # Se non c'è nessuna ricetta per quella portata con quel tema
                 msg += f"{course_name}: -\n"
 
-        # 4. Invia il menu all'utente
+        # 3. Invia il menu all'utente
         dispatcher.utter_message(text=msg)
         if buttons:
             dispatcher.utter_message(text="Tap a button below to get the full recipe for a specific course:", buttons=buttons)
@@ -1143,16 +1390,18 @@ class ActionRandomRecipe(Action):
             tracker: Tracker,
             domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
-        if DATASET is None:
+        catalog = current_catalog()
+
+        if catalog is None:
             dispatcher.utter_message(text="⚠️ Database Error.")
             return []
 
         # Seleziona una ricetta casuale
-        random_recipe = DATASET.sample(n=1).iloc[0]
+        random_recipe = catalog.records.record(np.random.randint(len(catalog.records)))
 
-        r_name = random_recipe['name'].title()
-        r_rate = random_recipe['rating_medio']
-        r_id = random_recipe.name # L'indice del DataFrame è l'ID della ricetta
+        r_name = random_recipe.title
+        r_rate = display_number(random_recipe['rating_medio'])
+        r_id = random_recipe.id
 
         msg = f"🎲 Random Recipe: {r_name} ({r_rate}⭐)\n\n"
         buttons = [{"title": "See Full Recipe", "payload": f'/select_recipe{{"recipe_id":"{r_id}"}}'}]
@@ -1160,6 +1409,59 @@ class ActionRandomRecipe(Action):
         dispatcher.utter_message(text=msg, buttons=buttons)
         return []
 
+class ActionShowMore(HeavyAction):
+    def name(self) -> Text:
+        return "action_show_more"
+
+    def run_query(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+
+        # Il token arriva dal bottone "Show more" (o è quello dell'ultima lista mostrata)
+        token = tracker.get_slot("cursor")
+
+        catalog = current_catalog()
+
+        if catalog is None:
+            dispatcher.utter_message(text="⚠️ Database Error.")
+            return []
+
+        # Il token indica la ricerca (nella tabella condivisa tra i worker) e il punto a
+        # cui è arrivato l'utente: la lista viene dalla QUERY_CACHE o dalla ricerca rifatta
+        cursor = RESULT_CURSORS.get(token) if token else None
+        results = cursor_results(catalog, self.name(), cursor[0]) if cursor else None
+        if results is None:
+            dispatcher.utter_message(text="⌛ That list has expired. Please run your search again!")
+            return [SlotSet("cursor", None)]
+
+        (key, offset), (count, ids) = cursor, results
+        page_ids = ids[offset:offset + PAGE_SIZE]
+        if len(page_ids) == 0:
+            if count > len(ids):
+                dispatcher.utter_message(text=f"✅ That's all I can show for this search ({len(ids)} of {count}). Try adding more details to narrow it down!")
+            else:
+                dispatcher.utter_message(text="✅ That's all! There are no more recipes for this search.")
+            return [SlotSet("cursor", None)]
+
+        last = offset + len(page_ids)
+        # Le ricette rimosse da un aggiornamento del catalogo vengono saltate
+        testo_risposta = f"📄 Here are results {offset + 1}-{last} of {count}:"
+
+        icon, detail = CURSOR_STYLES[key[0]]
+        buttons = []
+        with PHASE_SECONDS.time(self.name(), 'render'):
+            for row in catalog.records.by_ids(page_ids):
+                title = button_title(catalog, row, icon, detail=detail)
+                payload = f'/select_recipe{{"recipe_id":"{row.id}"}}'
+                buttons.append({"title": title, "payload": payload})
+
+        token = RESULT_CURSORS.create(key, last) if last < len(ids) else None
+        if token:
+            buttons.append(show_more_button(token))
+
+        dispatcher.utter_message(text=testo_risposta, buttons=buttons)
+        return [SlotSet("cursor", token)]
+
 class ActionResetSvuotaFrigoForm(Action):
     def name(self) -> Text:
         return "action_reset_svuota_frigo_form"
@@ -0,0 +1,260 @@
+# Endpoint batch per le ricerche di ricette (es. il carrello di GreenMarket).
+#
+#     POST /recipes/batch   (servito da `python -m actions.server`)
+#
+# Il corpo è un array JSON di query (o {"queries": [...]}, o NDJSON con una
+# query per riga); ogni query può avere:
+#
+#     {"id": "cart-42", "ingredients": ["chicken", "garlic"], "tags": ["easy"],
+#      "time_limit": 30, "macros": {"calories": 500, "protein": 30}, "limit": 10}
+#
+# Senza "macros" è una ricerca svuota-frigo (ActionSubmitSvuotaFrigo: tutti gli
+# ingredienti, altrimenti per copertura); con "macros" è la ricerca per
+# nutrienti (ActionSubmitNutritionSearch) ristretta alle ricette che
+# rispettano gli altri filtri, e i macro non indicati non contano. Ingredienti
+# e tag passano dai vocabolari del catalogo come nei validatori delle form e
+# quelli sconosciuti sono riportati in "unknown". Un termine sconosciuto non
+# diventa mai "nessun filtro": un tag sconosciuto (i tag vanno rispettati
+# tutti) o ingredienti tutti sconosciuti danno 0 risultati; gli ingredienti
+# sconosciuti accanto a ingredienti validi vengono ignorati, come nella chat.
+#
+# La risposta è NDJSON, una riga per query nell'ordine della richiesta:
+#
+#     {"index": 0, "id": "cart-42", "kind": "svuota_frigo", "count": 120, "partial": false,
+#      "recipe_ids": [...], "unknown": []}
+#
+# Le query si eseguono a blocchi di BATCH_CHUNK sul QUERY_POOL (un blocco alla
+# volta per richiesta, così le action della chat non restano senza worker) e
+# ogni blocco parte verso il client appena pronto. Dentro un blocco il lavoro
+# comune si fa una volta: termini risolti, filtri su tag e tempo, query
+# uguali; i risultati svuota-frigo passano dalla QUERY_CACHE delle action.
+
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np  # type: ignore
+
+from .actions import (
+    CATALOG_MANAGER, QUERY_CACHE_MAX_IDS, QUERY_POOL, QUERY_TIMEOUT_SECONDS,
+    filter_candidates, macro_search, svuota_frigo_search,
+)
+from .catalog import EMPTY_POSTING, intersect_postings
+from .macro_search import MACRO_COLUMNS
+from .metrics import ACTION_ERRORS, ACTION_REQUESTS, ACTION_SECONDS, BATCH_QUERIES, ZERO_RESULTS
+from .query_cache import query_key
+from .worker_pool import PoolBusy
+
+BATCH_PATH = '/recipes/batch'
+BATCH_ACTION = 'recipe_batch'  # etichetta nelle metriche
+BATCH_MAX_QUERIES = 10_000  # query per richiesta
+BATCH_CHUNK = 256  # query per blocco (un task sul pool, una scrittura sulla risposta)
+BATCH_DEFAULT_LIMIT = 10  # ID restituiti per query se la query non dice "limit"
+BATCH_BUSY_RETRIES = 20  # tentativi (ogni 50 ms) quando il pool è pieno, prima di rispondere "busy"
+NDJSON = 'application/x-ndjson'
+
+
+# =============================================================================
+# QUERY
+# =============================================================================
+def _terms(raw: Dict[str, Any], field: str) -> List[str]:
+    value = raw.get(field) or []
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise ValueError(f"'{field}' must be a list of strings")
+    return [v for v in value if v.strip()]
+
+
+def _number(value: Any, field: str) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise ValueError(f"'{field}' must be a non-negative number")
+    return float(value)
+
+
+def parse_query(raw: Any) -> Dict[str, Any]:
+    """Query validata: ingredienti, tag, tempo, macro (None = svuota-frigo) e numero di ID (ValueError se non valida)."""
+    if not isinstance(raw, dict):
+        raise ValueError("each query must be a JSON object")
+    time_limit = raw.get('time_limit')
+    if time_limit is not None:
+        time_limit = int(_number(time_limit, 'time_limit')) or None
+    limit = raw.get('limit', BATCH_DEFAULT_LIMIT)
+    if isinstance(limit, bool) or not isinstance(limit, int) or not 1 <= limit <= QUERY_CACHE_MAX_IDS:
+        raise ValueError(f"'limit' must be an integer between 1 and {QUERY_CACHE_MAX_IDS}")
+
+    macros = raw.get('macros')
+    if macros is not None:
+        if not isinstance(macros, dict) or not macros or set(macros) - set(MACRO_COLUMNS):
+            raise ValueError(f"'macros' must map some of {', '.join(MACRO_COLUMNS)} to a number")
+        macros = {m: _number(v, f'macros.{m}') for m, v in macros.items()}
+    return {'ingredients': _terms(raw, 'ingredients'), 'tags': _terms(raw, 'tags'),
+            'time_limit': time_limit, 'macros': macros, 'limit': limit}
+
+
+def parse_body(body: bytes, content_type: str = '') -> List[Any]:
+    """Le query grezze del corpo: array JSON, {"queries": [...]} oppure NDJSON."""
+    try:
+        if content_type.startswith(NDJSON):
+            return [json.loads(line) for line in body.decode('utf-8').splitlines() if line.strip()]
+        data = json.loads(body or b'null')
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"invalid JSON: {e}")
+    if isinstance(data, dict):
+        data = data.get('queries')
+    if not isinstance(data, list):
+        raise ValueError("expected a JSON array of queries (or {\"queries\": [...]})")
+    return data
+
+
+# =============================================================================
+# ESECUZIONE
+# =============================================================================
+def _resolve(vocabulary, terms: List[str], memo: Dict) -> Tuple[List[str], List[str]]:
+    """(termini canonici, termini sconosciuti): ogni termine si risolve una volta per blocco."""
+    found: List[str] = []
+    unknown: List[str] = []
+    for term in terms:
+        key = (id(vocabulary), term)
+        if key not in memo:
+            match = vocabulary.resolve(term)
+            memo[key] = None if match is None else match[0]
+        canonical = memo[key]
+        if canonical is None:
+            unknown.append(term)
+        elif canonical not in found:
+            found.append(canonical)
+    return found, unknown
+
+
+def _nutrition(catalog, query: Dict[str, Any], ingredients: List[str], tags: List[str],
+               memo: Dict) -> Tuple[int, np.ndarray, bool]:
+    """(ricette che rispettano i filtri, posizioni delle più vicine ai macro, parziale).
+
+    Come nello svuota-frigo, se nessuna ricetta ha TUTTI gli ingredienti si
+    cerca tra quelle che ne usano almeno uno (parziale = True).
+    """
+    candidates = filter_candidates(catalog, tags, query['time_limit'], memo)
+    filters = [] if candidates is None else [candidates]
+    partial = False
+    if ingredients:
+        postings = [catalog.ingredient_index[i] for i in ingredients if i in catalog.ingredient_index]
+        exact = intersect_postings(postings + filters) if len(postings) == len(ingredients) else EMPTY_POSTING
+        if not exact.size and len(ingredients) > 1:
+            used, _ = catalog.coverage.matches(ingredients)
+            exact, partial = intersect_postings([used] + filters), True
+        candidates = exact
+    macros = query['macros']
+    targets = [macros.get(m, 0.0) for m in MACRO_COLUMNS]
+    weights = [1.0 if m in macros else 0.0 for m in MACRO_COLUMNS]
+    count = len(catalog.records) if candidates is None else len(candidates)
+    positions = macro_search(catalog, BATCH_ACTION, targets, query['limit'], candidates, weights)
+    return count, positions, partial and count > 0
+
+
+def run_batch(catalog, queries: List[Any], offset: int = 0) -> List[Dict[str, Any]]:
+    """Un risultato per query (con "error" se la query non è valida), nello stesso ordine."""
+    memo: Dict = {}  # termini risolti, filtri su tag e tempo, risultati di query uguali
+    results: List[Dict[str, Any]] = []
+    for index, raw in enumerate(queries, offset):
+        head: Dict[str, Any] = {'index': index}
+        if isinstance(raw, dict) and 'id' in raw:
+            head['id'] = raw['id']
+        try:
+            query = parse_query(raw)
+        except (ValueError, TypeError, OverflowError) as e:
+            BATCH_QUERIES.inc('error')
+            results.append({**head, 'error': str(e)})
+            continue
+
+        ingredients, unknown = _resolve(catalog.ingredient_vocabulary, query['ingredients'], memo)
+        tags, unknown_tags = _resolve(catalog.tag_vocabulary, query['tags'], memo)
+        kind = 'svuota_frigo' if query['macros'] is None else 'nutrition'
+        BATCH_QUERIES.inc(kind)
+
+        if unknown_tags or (query['ingredients'] and not ingredients):
+            # Togliere il filtro allargherebbe la ricerca invece di restringerla
+            ZERO_RESULTS.inc(BATCH_ACTION)
+            results.append({**head, 'kind': kind, 'count': 0, 'partial': False, 'recipe_ids': [],
+                            'unknown': unknown + unknown_tags})
+            continue
+
+        key = (query_key(kind, ingredients=ingredients, tags=tags, time_limit=query['time_limit']),
+               tuple(sorted((query['macros'] or {}).items())), query['limit'])
+        if key not in memo:
+            if query['macros'] is None:
+                count, ids, partial = svuota_frigo_search(catalog, BATCH_ACTION, ingredients, tags,
+                                                          query['time_limit'], memo)
+                ids = ids[:query['limit']]
+            else:
+                count, positions, partial = _nutrition(catalog, query, ingredients, tags, memo)
+                ids = catalog.records.ids[positions]
+            if count == 0:
+                ZERO_RESULTS.inc(BATCH_ACTION)
+            memo[key] = {'kind': kind, 'count': int(count), 'partial': partial,
+                         'recipe_ids': np.asarray(ids).tolist()}
+        results.append({**head, **memo[key], 'unknown': unknown + unknown_tags})
+    return results
+
+
+def encode_lines(results: List[Dict[str, Any]]) -> bytes:
+    return ''.join(json.dumps(r, ensure_ascii=False, separators=(',', ':')) + '\n' for r in results).encode('utf-8')
+
+
+def batch_lines(queries: List[Any], offset: int) -> bytes:
+    """Un blocco di query eseguito sul pool: le righe NDJSON dei risultati.
+
+    Il catalogo si prende qui, quando il blocco parte: un reload avvenuto
+    mentre il blocco era in coda vale già per lui.
+    """
+    catalog = CATALOG_MANAGER.current()
+    if catalog is None:
+        return encode_lines([{'index': i, 'error': 'catalog unavailable'} for i in range(offset, offset + len(queries))])
+    return encode_lines(run_batch(catalog, queries, offset))
+
+
+# =============================================================================
+# ENDPOINT HTTP
+# =============================================================================
+async def _run_chunk(queries: List[Any], offset: int) -> bytes:
+    """Il blocco sul QUERY_POOL; se resta pieno o la query scade, una riga di errore per query."""
+    reason: Optional[str] = None
+    for _ in range(BATCH_BUSY_RETRIES):
+        try:
+            return await QUERY_POOL.run(batch_lines, queries, offset, timeout=QUERY_TIMEOUT_SECONDS)
+        except PoolBusy:
+            reason = 'busy'
+            await asyncio.sleep(0.05)
+        except asyncio.TimeoutError:
+            reason = 'timeout'
+            break
+    ACTION_ERRORS.inc(BATCH_ACTION, reason or 'busy')
+    return encode_lines([{'index': i, 'error': reason} for i in range(offset, offset + len(queries))])
+
+
+def install_batch(app, path: str = BATCH_PATH) -> None:
+    """POST `path` sull'app Sanic del server delle action: query in blocco, risultati in streaming NDJSON."""
+    from sanic import response  # type: ignore
+
+    @app.post(path)
+    async def recipe_batch(request):
+        started = time.perf_counter()
+        ACTION_REQUESTS.inc(BATCH_ACTION)
+        try:
+            queries = parse_body(request.body, request.content_type or '')
+        except ValueError as e:
+            ACTION_ERRORS.inc(BATCH_ACTION, '400')
+            return response.json({'error': str(e)}, status=400)
+        if len(queries) > BATCH_MAX_QUERIES:
+            ACTION_ERRORS.inc(BATCH_ACTION, '413')
+            return response.json({'error': f"at most {BATCH_MAX_QUERIES} queries per request"}, status=413)
+        if CATALOG_MANAGER.current() is None:
+            ACTION_ERRORS.inc(BATCH_ACTION, '503')
+            return response.json({'error': 'catalog unavailable'}, status=503)
+
+        stream = await request.respond(content_type=NDJSON)
+        for offset in range(0, len(queries), BATCH_CHUNK):
+            await stream.send(await _run_chunk(queries[offset:offset + BATCH_CHUNK], offset))
+        await stream.eof()
+        ACTION_SECONDS.observe(time.perf_counter() - started, BATCH_ACTION)
@@ -0,0 +1,379 @@
+# Micro-benchmark delle action su cataloghi sintetici.
+#
+#     python -m actions.benchmark [--sizes 10000 100000 1000000] [--iterations 200]
+#                                 [--out bench.json] [--baseline baseline.json]
+#                                 [--save-baseline baseline.json]
+#
+# I test in tests/test_stories.yml controllano solo il flusso della conversazione.
+# Qui ogni action di actions.py (ricerche, selezione per ID, nutrizione, tempi di
+# cottura, validatori e submit delle form, full meal, random, show more) viene
+# chiamata direttamente con Tracker e CollectingDispatcher sintetici, su cataloghi
+# della dimensione voluta generati da synthetic.py; batch_queries_100 misura un
+# blocco di 100 query dell'endpoint batch (batch.py). Per ogni action: latenza
+# p50/p95/p99, throughput e picco di memoria (RSS). Ogni action gira in un processo
+# figlio (fork dopo la costruzione del catalogo), così il picco di RSS è solo il suo.
+# I risultati si salvano in JSON e si confrontano con una baseline: se una latenza
+# peggiora oltre la tolleranza il comando esce con codice 1.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np  # type: ignore
+import pandas as pd  # type: ignore
+from rasa_sdk import Tracker  # type: ignore
+from rasa_sdk.executor import CollectingDispatcher  # type: ignore
+
+from . import actions as bot
+from .batch import run_batch
+from .loader import Catalog, load_csv_catalog
+from .snapshot import file_sha256
+from .synthetic import write_catalog
+from .worker_pool import PooledAction
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+DEFAULT_ITERATIONS = 200
+BATCH_SIZE = 100  # query per chiamata nello scenario batch_queries
+WARMUP_ITERATIONS = 5
+REGRESSION_TOLERANCE = 0.20  # +20% sul p95 rispetto alla baseline = regressione
+NOISE_FLOOR_MS = 0.05  # differenze sotto questa soglia non contano (rumore di misura)
+
+
+# =============================================================================
+# CATALOGO SINTETICO
+# =============================================================================
+def build_synthetic_catalog(n: int, seed: int = 0) -> Catalog:
+    """Passa dal CSV come in produzione (stesso loader, stessi indici)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'synthetic.csv')
+        write_catalog(path, n, seed=seed, progress=False)
+        catalog = load_csv_catalog(path)
+        catalog.version = file_sha256(path)[:12]
+    return catalog
+
+
+# =============================================================================
+# TRACKER SINTETICI
+# =============================================================================
+def make_tracker(slots: Optional[Dict[str, Any]] = None, text: str = '', intent: str = '',
+                 entities: Sequence[Dict[str, Any]] = ()) -> Tracker:
+    return Tracker.from_dict({
+        'sender_id': 'benchmark',
+        'slots': dict(slots or {}),
+        'latest_message': {'text': text, 'intent': {'name': intent}, 'entities': list(entities)},
+        'events': [],
+        'paused': False,
+        'followup_action': None,
+        'active_loop': {},
+        'latest_action_name': None,
+    })
+
+
+class Scenario:
+    """Una chiamata da misurare: `prepare(i)` (non cronometrato) restituisce il tracker della i-esima."""
+
+    __slots__ = ('name', 'call', 'prepare')
+
+    def __init__(self, name: str, call: Callable[[CollectingDispatcher, Tracker], Any],
+                 prepare: Callable[[int], Tracker]):
+        self.name = name
+        self.call = call
+        self.prepare = prepare
+
+
+def run_action(action) -> Callable[[CollectingDispatcher, Tracker], Any]:
+    # Le action pesanti si misurano senza il pool: conta la logica, non l'attesa in coda
+    if isinstance(action, PooledAction):
+        return lambda dispatcher, tracker: action.run_query(dispatcher, tracker, {})
+    return lambda dispatcher, tracker: action.run(dispatcher, tracker, {})
+
+
+def run_validator(action, slot: str) -> Callable[[CollectingDispatcher, Tracker], Any]:
+    method = getattr(action, f'validate_{slot}')
+    return lambda dispatcher, tracker: method(tracker.get_slot(slot), dispatcher, tracker, {})
+
+
+def build_scenarios(catalog: Catalog, seed: int = 0) -> List[Scenario]:
+    """Input realistici presi dal catalogo stesso (nomi, ingredienti e tag esistenti, con qualche refuso)."""
+    rng = np.random.default_rng(seed)
+    n = len(catalog.records)
+    ids = [int(catalog.records.ids[p]) for p in rng.integers(0, n, 64)]
+    words = [catalog.records.names[p].split()[0] for p in rng.integers(0, n, 64)]
+    ingredients = catalog.all_unique_ingredients[:50]
+    tags = catalog.all_unique_tags[:50]
+
+    def pick(items: Sequence, i: int, k: int = 1) -> List:
+        return [items[(i * 7 + j * 13) % len(items)] for j in range(k)]
+
+    def typo(word: str) -> str:
+        return word[:-2] + word[-1] + word[-2] if len(word) > 3 else word
+
+    def cursor_tracker(i: int) -> Tracker:
+        # Pagine diverse della classifica: ogni "show more" mostra una pagina vera
+        token = bot.RESULT_CURSORS.create(('top',), bot.PAGE_SIZE * (1 + i % 19))
+        return make_tracker({'cursor': token})
+
+    def batch_tracker(i: int) -> Tracker:
+        # Carrelli da 1 a 6 ingredienti, con tag, tempo e macro a rotazione
+        queries = []
+        for j in range(i * BATCH_SIZE, (i + 1) * BATCH_SIZE):
+            query: Dict[str, Any] = {'ingredients': pick(ingredients, j, 1 + j % 6)}
+            if j % 3 == 0:
+                query['tags'] = pick(tags, j)
+            if j % 4 == 0:
+                query['time_limit'] = 30 + j % 90
+            if j % 5 == 0:
+                query['macros'] = {'calories': 200 + j % 600, 'protein': j % 50}
+            queries.append(query)
+        return make_tracker({'queries': queries})
+
+    svuota = bot.ValidateSvuotaFrigoForm()
+    nutrition = bot.ValidateNutritionSearchForm()
+    full_meal = bot.ValidateFullMealForm()
+    return [
+        Scenario('show_top_rated', run_action(bot.ActionShowTopRated()), lambda i: make_tracker()),
+        Scenario('search_by_name', run_action(bot.ActionSearchByName()),
+                 lambda i: make_tracker({'recipe_name': pick(words, i)[0]})),
+        Scenario('search_by_name_typo', run_action(bot.ActionSearchByName()),
+                 lambda i: make_tracker({'recipe_name': typo(pick(words, i)[0])})),
+        Scenario('select_recipe_by_id', run_action(bot.ActionSelectRecipeById()),
+                 lambda i: make_tracker({'recipe_id': str(pick(ids, i)[0])})),
+        Scenario('search_by_category', run_action(bot.ActionSearchByCategory()),
+                 lambda i: make_tracker({'category': pick(tags, i, 2)})),
+        Scenario('search_by_ingredient', run_action(bot.ActionSearchByIngredient()),
+                 lambda i: make_tracker({'ingredient': pick(ingredients, i, 2)})),
+        Scenario('ask_nutrition', run_action(bot.ActionAskNutrition()),
+                 lambda i: make_tracker({'recipe_id': str(pick(ids, i)[0])})),
+        Scenario('ask_nutrition_by_name', run_action(bot.ActionAskNutrition()),
+                 lambda i: make_tracker({'recipe_name': pick(words, i)[0], 'nutrient': 'protein'})),
+        Scenario('ask_cooking_time', run_action(bot.ActionAskCookingTime()),
+                 lambda i: make_tracker({'recipe_name': pick(words, i)[0]})),
+        Scenario('validate_ingredient', run_validator(svuota, 'ingredient'),
+                 lambda i: make_tracker(text=f"i have {typo(pick(ingredients, i)[0])} and {pick(ingredients, i + 1)[0]}")),
+        Scenario('validate_time_limit', run_validator(svuota, 'time_limit'),
+                 lambda i: make_tracker(text=f"{10 + i % 90} minutes")),
+        Scenario('validate_category', run_validator(svuota, 'category'),
+                 lambda i: make_tracker(text=typo(pick(tags, i)[0]))),
+        Scenario('submit_svuota_frigo', run_action(bot.ActionSubmitSvuotaFrigo()),
+                 lambda i: make_tracker({'ingredient': pick(ingredients, i, 2), 'time_limit': 30 + i % 90,
+                                         'category': pick(tags, i) if i % 2 else ['none']})),
+        Scenario('submit_svuota_frigo_full', run_action(bot.ActionSubmitSvuotaFrigo()),
+                 lambda i: make_tracker({'ingredient': pick(ingredients, i, 8), 'time_limit': 30 + i % 90,
+                                         'category': ['none']})),
+        Scenario('validate_max_calories', run_validator(nutrition, 'max_calories'),
+                 lambda i: make_tracker(text=f"{200 + i} kcal")),
+        Scenario('validate_max_carbs', run_validator(nutrition, 'max_carbs'),
+                 lambda i: make_tracker(text=f"{i % 60}")),
+        Scenario('validate_max_fat', run_validator(nutrition, 'max_fat'),
+                 lambda i: make_tracker(text=f"{i % 40}")),
+        Scenario('validate_max_protein', run_validator(nutrition, 'max_protein'),
+                 lambda i: make_tracker(text=f"{i % 50}")),
+        Scenario('submit_nutrition_search', run_action(bot.ActionSubmitNutritionSearch()),
+                 lambda i: make_tracker({'max_calories': 200 + i % 600, 'max_carbs': i % 60,
+                                         'max_fat': i % 40, 'max_protein': i % 50})),
+        Scenario('validate_meal_tag', run_validator(full_meal, 'meal_tag'),
+                 lambda i: make_tracker(text=f"i want {typo(pick(tags, i)[0])} menu")),
+        Scenario('submit_full_meal', run_action(bot.ActionSubmitFullMeal()),
+                 lambda i: make_tracker({'meal_tag': pick(tags, i)[0]})),
+        Scenario('random_recipe', run_action(bot.ActionRandomRecipe()), lambda i: make_tracker()),
+        Scenario('show_more', run_action(bot.ActionShowMore()), cursor_tracker),
+        Scenario(f'batch_queries_{BATCH_SIZE}', lambda dispatcher, tracker: run_batch(catalog, tracker.get_slot('queries')),
+                 batch_tracker),
+    ]
+
+
+# =============================================================================
+# MISURA
+# =============================================================================
+def current_rss_mb() -> float:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10  # byte su macOS, KiB su Linux
+
+
+def measure(scenario: Scenario, iterations: int, warm_cache: bool = False) -> Dict[str, float]:
+    """Latenze e memoria di una action (le stampe delle action vengono scartate)."""
+    start_rss = current_rss_mb()
+    latencies = np.empty(iterations, dtype=np.float64)
+    with contextlib.redirect_stdout(io.StringIO()) as sink:
+        for i in range(-WARMUP_ITERATIONS, iterations):
+            tracker = scenario.prepare(i % 1000)
+            if not warm_cache:
+                # Misuriamo il percorso "a freddo": la ricerca vera, non la cache
+                bot.QUERY_CACHE.clear()
+                bot.RENDER_CACHE.clear()
+            dispatcher = CollectingDispatcher()
+            t0 = time.perf_counter()
+            scenario.call(dispatcher, tracker)
+            elapsed = time.perf_counter() - t0
+            if i >= 0:
+                latencies[i] = elapsed
+            sink.seek(0)
+            sink.truncate()
+
+    latencies_ms = latencies * 1000.0
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        'iterations': iterations,
+        'mean_ms': round(float(latencies_ms.mean()), 4),
+        'p50_ms': round(float(p50), 4),
+        'p95_ms': round(float(p95), 4),
+        'p99_ms': round(float(p99), 4),
+        'throughput_per_s': round(float(iterations / latencies.sum()), 1) if latencies.sum() else 0.0,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'rss_growth_mb': round(max(0.0, peak_rss_mb() - start_rss), 1),
+    }
+
+
+def measure_isolated(scenario: Scenario, iterations: int, warm_cache: bool = False) -> Dict[str, float]:
+    """Come measure(), ma in un processo figlio: il picco di RSS riguarda solo questa action."""
+    if not hasattr(os, 'fork'):
+        return measure(scenario, iterations, warm_cache)
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        code = 0
+        try:
+            result: Dict[str, Any] = measure(scenario, iterations, warm_cache)
+        except BaseException as e:
+            result = {'error': f"{type(e).__name__}: {e}"}
+            code = 1
+        finally:
+            with os.fdopen(write_fd, 'w') as out:
+                json.dump(result, out)
+            os._exit(code)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd) as inp:
+        payload = inp.read()
+    os.waitpid(pid, 0)
+    return json.loads(payload) if payload else {'error': 'processo di misura terminato senza risultati'}
+
+
+def run_benchmark(sizes: Sequence[int], iterations: int, seed: int = 0, warm_cache: bool = False,
+                  only: Optional[Sequence[str]] = None, isolated: bool = True) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for n in sizes:
+        print(f"🏗️ Catalogo sintetico da {n} ricette...")
+        rss_before = current_rss_mb()
+        t0 = time.perf_counter()
+        catalog = build_synthetic_catalog(n, seed)
+        build_seconds = time.perf_counter() - t0
+        bot.CATALOG_MANAGER.auto_start = False  # niente reload dal CSV sopra il catalogo sintetico
+        bot.CATALOG_MANAGER.install(catalog)
+
+        catalog_rss_mb = current_rss_mb() - rss_before
+        components = catalog.memory_usage()
+        size_result: Dict[str, Any] = {
+            'build_seconds': round(build_seconds, 2),
+            'catalog_rss_mb': round(catalog_rss_mb, 1),
+            'bytes_per_recipe': round(catalog_rss_mb * 2 ** 20 / n),
+            'component_bytes_per_recipe': {name: round(size / n, 1) for name, size in components.items()},
+            'actions': {},
+        }
+        print(f"   📦 {catalog_rss_mb:.0f} MB di RSS, {size_result['bytes_per_recipe']} byte/ricetta "
+              f"(" + ", ".join(f"{name} {size / n:.0f}" for name, size in components.items()) + ")")
+        for scenario in build_scenarios(catalog, seed):
+            if only and scenario.name not in only:
+                continue
+            stats = (measure_isolated if isolated else measure)(scenario, iterations, warm_cache)
+            size_result['actions'][scenario.name] = stats
+            if 'error' in stats:
+                print(f"   ❌ {scenario.name:<26} {stats['error']}")
+            else:
+                print(f"   {scenario.name:<28} p50 {stats['p50_ms']:>9.3f} ms  p95 {stats['p95_ms']:>9.3f} ms  "
+                      f"p99 {stats['p99_ms']:>9.3f} ms  {stats['throughput_per_s']:>9.1f}/s  "
+                      f"RSS {stats['peak_rss_mb']:.0f} MB")
+        results[str(n)] = size_result
+
+        bot.CATALOG_MANAGER.install(None)
+        del catalog
+
+    return {
+        'meta': {
+            'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'iterations': iterations,
+            'seed': seed,
+            'warm_cache': warm_cache,
+        },
+        'results': results,
+    }
+
+
+# =============================================================================
+# CONFRONTO CON LA BASELINE
+# =============================================================================
+def compare(current: Dict[str, Any], baseline: Dict[str, Any],
+            tolerance: float = REGRESSION_TOLERANCE) -> List[str]:
+    """Action (per dimensione) il cui p95 è peggiorato oltre la tolleranza rispetto alla baseline."""
+    regressions = []
+    for size, size_result in current['results'].items():
+        base_actions = baseline.get('results', {}).get(size, {}).get('actions', {})
+        for name, stats in size_result['actions'].items():
+            base = base_actions.get(name)
+            if not base or 'error' in base or 'error' in stats:
+                continue
+            old, new = base['p95_ms'], stats['p95_ms']
+            if new > old * (1 + tolerance) and new - old > NOISE_FLOOR_MS:
+                regressions.append(f"{name} @ {size}: p95 {old:.3f} -> {new:.3f} ms (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmark delle action su cataloghi sintetici")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='+', help="misura solo queste action (nomi degli scenari)")
+    parser.add_argument('--warm-cache', action='store_true', help="non svuota le cache tra una chiamata e l'altra")
+    parser.add_argument('--no-fork', action='store_true', help="misura tutto nello stesso processo")
+    parser.add_argument('--out', help="file JSON con i risultati")
+    parser.add_argument('--baseline', help="JSON di una run precedente con cui confrontare i risultati")
+    parser.add_argument('--save-baseline', help="salva questi risultati come nuova baseline")
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.sizes, args.iterations, seed=args.seed, warm_cache=args.warm_cache,
+                           only=args.only, isolated=not args.no_fork)
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            print(f"💾 Risultati salvati in {path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"🐢 {len(regressions)} regressioni rispetto a {args.baseline}:")
+            for line in regressions:
+                print(f"   {line}")
+            return 1
+        print(f"✅ Nessuna regressione rispetto a {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+# Strutture di indicizzazione del catalogo ricette.
+#
+# Le action lavorano su posizioni di riga del DATASET (0..N-1): gli indici
+# qui sotto vengono costruiti una sola volta al caricamento e permettono di
+# rispondere alle query senza scandire tutto il dataframe.
+
+from collections import defaultdict
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np  # type: ignore
+
+EMPTY_POSTING = np.empty(0, dtype=np.int32)
+
+
+def build_posting_index(lists: Iterable[Sequence[str]]) -> Dict[str, np.ndarray]:
+    """Indice invertito termine -> array ordinato delle posizioni delle ricette che lo contengono."""
+    postings: Dict[str, List[int]] = defaultdict(list)
+    for pos, items in enumerate(lists):
+        # set() evita posizioni duplicate se la ricetta ripete un ingrediente
+        for item in set(items):
+            postings[item].append(pos)
+    # Le posizioni vengono aggiunte in ordine crescente, quindi sono già ordinate
+    return {term: np.asarray(pos_list, dtype=np.int32) for term, pos_list in postings.items()}
+
+
+def csr_posting_index(terms: Sequence[str], codes: np.ndarray, offsets: np.ndarray) -> Dict[str, np.ndarray]:
+    """Come build_posting_index, ma dalle liste già codificate in formato CSR (codici e offset per ricetta).
+
+    Ogni coppia (termine, posizione) diventa un intero codice * N + posizione:
+    ordinarle senza doppioni dà tutte le posting list una dopo l'altra, in un
+    unico array di cui ogni termine tiene una vista.
+    """
+    n = max(len(offsets) - 1, 1)
+    pairs = codes.astype(np.int64) * n
+    pairs += np.repeat(np.arange(len(offsets) - 1, dtype=np.int64), np.diff(offsets))
+    pairs = np.unique(pairs)  # ordinate per termine e posizione; via le ripetizioni nella stessa ricetta
+    bounds = np.searchsorted(pairs, np.arange(len(terms) + 1, dtype=np.int64) * n).tolist()
+    positions = (pairs % n).astype(np.int32)
+    del pairs
+    return {term: positions[bounds[i]:bounds[i + 1]] for i, term in enumerate(terms)}
+
+
+def intersect_postings(postings: List[np.ndarray]) -> np.ndarray:
+    """Intersezione di posting list ordinate, partendo dalla più corta.
+
+    Ogni passo cerca i candidati rimasti nella lista successiva con una ricerca
+    binaria, quindi il costo dipende dalla dimensione del risultato e non dal catalogo.
+    """
+    if not postings:
+        return EMPTY_POSTING
+
+    ordered = sorted(postings, key=len)
+    result = ordered[0]
+    for other in ordered[1:]:
+        if result.size == 0:
+            break
+        idx = np.searchsorted(other, result)
+        idx[idx >= other.size] = 0
+        result = result[other[idx] == result] if other.size else EMPTY_POSTING
+    return result
+
+
+# =============================================================================
+# BITMAP DEI TAG
+# I tag sono un vocabolario piccolo e quasi ogni ricetta ne ha molti: per
+# ognuno teniamo una bitmap sulle posizioni delle ricette (un int Python, dove
+# il bit i è acceso se la ricetta i ha quel tag). AND/OR tra tag diventano
+# operazioni bit a bit e il conteggio dei risultati è il numero di bit accesi.
+# =============================================================================
+def positions_to_bitmap(positions: np.ndarray) -> int:
+    """Converte un array di posizioni in una bitmap (int)."""
+    if len(positions) == 0:
+        return 0
+    bits = np.zeros(int(positions.max()) + 1, dtype=bool)
+    bits[positions] = True
+    return int.from_bytes(np.packbits(bits, bitorder='little').tobytes(), 'little')
+
+
+def bitmap_to_positions(bitmap: int) -> np.ndarray:
+    """Converte una bitmap nell'array ordinato delle posizioni dei bit accesi."""
+    if not bitmap:
+        return EMPTY_POSTING
+    raw = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    bits = np.unpackbits(np.frombuffer(raw, dtype=np.uint8), bitorder='little')
+    return np.flatnonzero(bits).astype(np.int32)
+
+
+def bitmap_count(bitmap: int) -> int:
+    """Cardinalità della bitmap (numero di ricette)."""
+    return bin(bitmap).count('1')
+
+
+def bitmap_and(bitmaps: List[int]) -> int:
+    """Ricette che hanno TUTTI i tag (0 se la lista è vuota)."""
+    if not bitmaps:
+        return 0
+    result = bitmaps[0]
+    for other in bitmaps[1:]:
+        result &= other
+        if not result:
+            break
+    return result
+
+
+def bitmap_or(bitmaps: List[int]) -> int:
+    """Ricette che hanno ALMENO UNO dei tag."""
+    result = 0
+    for other in bitmaps:
+        result |= other
+    return result
+
+
+def build_bitmap_index(lists: Iterable[Sequence[str]]) -> Dict[str, int]:
+    """Indice termine -> bitmap delle ricette che lo contengono."""
+    return {term: positions_to_bitmap(pos) for term, pos in build_posting_index(lists).items()}
+
+
+def bitmap_top_k(bitmap: int, k: int) -> np.ndarray:
+    """Prime k posizioni (bit accesi più bassi) della bitmap.
+
+    Le ricette sono memorizzate in ordine di classifica, quindi i bit più bassi
+    sono le ricette migliori: ci si ferma appena trovate k ricette.
+    """
+    top = []
+    while bitmap and len(top) < k:
+        lowest = bitmap & -bitmap
+        top.append(lowest.bit_length() - 1)
+        bitmap ^= lowest
+    return np.asarray(top, dtype=np.int32)
@@ -0,0 +1,139 @@
+# Aggiornamento a caldo del catalogo ricette.
+#
+# Il catalogo non è più un insieme di variabili globali impostate all'import:
+# il CatalogManager tiene un riferimento a un Catalog immutabile e, quando il
+# CSV (o lo snapshot) cambia, ne costruisce uno nuovo in background e lo
+# sostituisce con un'unica assegnazione. Le action leggono il riferimento una
+# volta sola all'inizio di run(), quindi una richiesta in corso termina sempre
+# sulla versione con cui è partita, senza riavviare il server.
+#
+# Trigger disponibili:
+#   - watch(): thread che controlla periodicamente dimensione e data del CSV
+#     e del manifest dello snapshot;
+#   - segnale SIGHUP al processo (`kill -HUP <pid>`): reload immediato;
+#   - start(): i due trigger precedenti insieme, avviati dal server (mai
+#     all'import: chi importa le action per altri scopi non vuole un thread in
+#     più né il proprio SIGHUP);
+#   - reload() / reload_async() chiamabili da codice (es. un endpoint admin);
+#   - install(): sostituzione diretta con un catalogo già costruito.
+
+import os
+import signal
+import threading
+from typing import Optional, Tuple
+
+from .loader import Catalog
+from .snapshot import MANIFEST, load_catalog
+
+
+class CatalogManager:
+    """Possiede la versione corrente del catalogo e la sostituisce in modo atomico."""
+
+    def __init__(self, csv_path: str, snapshot_dir: str, use_kdtree: bool = False):
+        self.csv_path = csv_path
+        self.snapshot_dir = snapshot_dir
+        self.use_kdtree = use_kdtree
+        self._catalog: Optional[Catalog] = None
+        self._stamp: Tuple = ()
+        # Un solo reload alla volta; le letture (current) non prendono mai il lock
+        self._reload_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._started = False
+        # False quando i reload li decide chi usa il manager (server pre-fork, benchmark)
+        self.auto_start = True
+
+    def current(self) -> Optional[Catalog]:
+        """Catalogo da usare per tutta la richiesta (None se il caricamento è fallito)."""
+        return self._catalog
+
+    def _source_stamp(self) -> Tuple:
+        """Dimensione e data di modifica di CSV e manifest: se cambiano, c'è qualcosa da ricaricare."""
+        stamp = []
+        for path in (self.csv_path, os.path.join(self.snapshot_dir, MANIFEST)):
+            try:
+                stat = os.stat(path)
+                stamp.append((stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def load(self) -> Optional[Catalog]:
+        """Primo caricamento (bloccante). Gli errori vengono rilanciati al chiamante."""
+        with self._reload_lock:
+            stamp = self._source_stamp()
+            self._catalog = load_catalog(self.csv_path, self.snapshot_dir, use_kdtree=self.use_kdtree)
+            self._stamp = stamp
+        return self._catalog
+
+    def install(self, catalog: Optional[Catalog]) -> None:
+        """Mette in uso un catalogo già costruito (es. uno sintetico per i benchmark)."""
+        with self._reload_lock:
+            self._catalog = catalog
+
+    def reload(self, force: bool = False) -> bool:
+        """Ricostruisce il catalogo e lo sostituisce; True se la versione è cambiata.
+
+        Se la costruzione fallisce (es. CSV scritto a metà) resta in uso il
+        catalogo precedente.
+        """
+        with self._reload_lock:
+            stamp = self._source_stamp()
+            if not force and stamp == self._stamp:
+                return False
+            try:
+                new_catalog = load_catalog(self.csv_path, self.snapshot_dir, use_kdtree=self.use_kdtree)
+            except Exception as e:
+                print(f"❌ Reload del catalogo fallito, resta in uso la versione precedente: {e}")
+                return False
+
+            old_catalog = self._catalog
+            self._stamp = stamp
+            if old_catalog is not None and old_catalog.version == new_catalog.version:
+                # Stesso contenuto (es. CSV solo "toccato"): nessuno swap
+                return False
+            self._catalog = new_catalog  # swap atomico del riferimento
+            old_version = old_catalog.version if old_catalog is not None else '-'
+            print(f"🔁 Catalogo aggiornato: {old_version} -> {new_catalog.version} "
+                  f"({len(new_catalog.dataset)} ricette)")
+            return True
+
+    def reload_async(self, force: bool = False) -> threading.Thread:
+        """Avvia reload() in un thread separato, senza bloccare il chiamante."""
+        thread = threading.Thread(target=self.reload, kwargs={'force': force},
+                                  name='catalog-reload', daemon=True)
+        thread.start()
+        return thread
+
+    def watch(self, interval: float = 60.0) -> None:
+        """Controlla ogni `interval` secondi se il dataset è cambiato (thread daemon)."""
+        if self._watcher is not None or interval <= 0:
+            return
+
+        def loop():
+            stop = threading.Event()
+            while not stop.wait(interval):
+                self.reload()
+
+        self._watcher = threading.Thread(target=loop, name='catalog-watcher', daemon=True)
+        self._watcher.start()
+
+    def start(self, interval: float = 60.0) -> bool:
+        """watch() e reload su SIGHUP, una volta sola per processo e dal thread principale.
+
+        False se non parte ora: già avviato, auto_start disattivato o chiamata
+        da un altro thread (ci riproverà la prossima chiamata).
+        """
+        if self._started or not self.auto_start or threading.current_thread() is not threading.main_thread():
+            return False
+        self._started = True
+        self.watch(interval)
+        self.install_signal_handler()
+        return True
+
+    def install_signal_handler(self) -> bool:
+        """SIGHUP -> reload forzato in background. False se non disponibile (es. Windows, thread non principale)."""
+        try:
+            signal.signal(signal.SIGHUP, lambda signum, frame: self.reload_async(force=True))
+        except (AttributeError, ValueError):
+            return False
+        return True
@@ -0,0 +1,87 @@
+# Classifica "svuota frigo" per copertura degli ingredienti.
+#
+# La ricerca esatta restituisce solo le ricette che contengono TUTTI gli
+# ingredienti dell'utente: con un frigo pieno il risultato è quasi sempre
+# vuoto. Qui ogni ricetta riceve invece un punteggio:
+#
+#     ingredienti dell'utente usati - MISSING_PENALTY * ingredienti che mancano
+#     + RATING_WEIGHT * rating / 5
+#
+# Il numero di ingredienti usati è il prodotto matrice-vettore A·q, dove A è la
+# matrice sparsa ricette x ingredienti (le liste CSR del catalogo) e q il
+# vettore 0/1 degli ingredienti dell'utente. Il prodotto si calcola per colonne:
+# le colonne di A con q != 0 sono proprio le posting list di quegli ingredienti,
+# quindi basta un np.bincount sulle loro posizioni, senza cicli per ricetta e
+# senza toccare le ricette che non usano nessuno degli ingredienti. Quando le
+# posting list sono poche posizioni rispetto al catalogo, ordinarle (np.unique)
+# costa meno del bincount, che scorre comunque un contatore per ricetta.
+
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np  # type: ignore
+
+from .catalog import EMPTY_POSTING
+
+MISSING_PENALTY = 0.1  # peso di ogni ingrediente della ricetta che l'utente non ha
+RATING_WEIGHT = 0.5  # peso del rating (0..5 riportato a 0..1) a parità di copertura
+SPARSE_FRACTION = 0.25  # sotto questa frazione del catalogo le posizioni si contano ordinandole
+
+
+class CoverageRanker:
+    """Ricette ordinate per quanti ingredienti dell'utente usano e quanti altri ne servono.
+
+    Lavora su POSIZIONI (ordine di classifica): a parità di punteggio vince la
+    posizione più bassa, cioè la ricetta con rating e voti migliori.
+    """
+
+    def __init__(self, ingredient_index: Dict[str, np.ndarray], ingredient_lists: Tuple[np.ndarray, np.ndarray],
+                 ratings: np.ndarray):
+        self.postings = ingredient_index
+        offsets = ingredient_lists[1]
+        # Numero di ingredienti di ogni ricetta = lunghezza della riga nella matrice CSR
+        self.row_lengths = np.diff(offsets).astype(np.int16)
+        self.rating_bonus = (np.nan_to_num(np.asarray(ratings, dtype=np.float32)) / np.float32(5)
+                             * np.float32(RATING_WEIGHT))
+
+    def __len__(self) -> int:
+        return len(self.row_lengths)
+
+    def matches(self, ingredients: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(posizioni ordinate, ingredienti usati) delle ricette che usano almeno un ingrediente."""
+        lists = [self.postings[i] for i in dict.fromkeys(ingredients) if i in self.postings]
+        if not lists:
+            return EMPTY_POSTING, np.empty(0, dtype=np.int16)
+        postings = np.concatenate(lists)
+        if len(postings) < SPARSE_FRACTION * len(self):
+            positions, counts = np.unique(postings, return_counts=True)
+            return positions.astype(np.int32), counts.astype(np.int16)
+        counts = np.bincount(postings, minlength=len(self))
+        positions = np.flatnonzero(counts).astype(np.int32)
+        return positions, counts[positions].astype(np.int16)
+
+    def rank(self, ingredients: Sequence[str], k: int, candidates: Optional[np.ndarray] = None
+             ) -> Tuple[int, np.ndarray]:
+        """(quante ricette usano almeno un ingrediente, prime k posizioni per punteggio).
+
+        `candidates` (posizioni ordinate, es. dopo i filtri su tag e tempo) limita
+        la classifica a quelle ricette.
+        """
+        positions, used = self.matches(ingredients)
+        if candidates is not None and positions.size:
+            # Entrambe ordinate: ricerca binaria delle posizioni tra i candidati
+            idx = np.searchsorted(candidates, positions)
+            idx[idx >= candidates.size] = 0
+            keep = candidates[idx] == positions if candidates.size else np.zeros(positions.size, dtype=bool)
+            positions, used = positions[keep], used[keep]
+        if not positions.size:
+            return 0, EMPTY_POSTING
+
+        missing = self.row_lengths[positions] - used
+        scores = used - np.float32(MISSING_PENALTY) * missing + self.rating_bonus[positions]
+
+        # Top-k senza ordinare tutto, poi ordine per punteggio (e posizione a parità)
+        if k < positions.size:
+            best = np.argpartition(-scores, k - 1)[:k]
+            positions, scores = positions[best], scores[best]
+        order = np.lexsort((positions, -scores))
+        return int(len(used)), positions[order]
@@ -0,0 +1,132 @@
+# Cursori lato server per la paginazione dei risultati ("show more").
+#
+# Le action a lista mostrano solo le prime 5 ricette. Il bottone "Show more"
+# porta nel payload (come oggi recipe_id) un token breve e opaco:
+# "<hash della ricerca>.<offset>", es. "Xk3v9QaB.5". L'hash (48 bit) è quello
+# della chiave canonica della ricerca (query_key, o una chiave equivalente per
+# le liste che non passano dalla QUERY_CACHE) e il CursorStore sa ritrovare la
+# chiave dall'hash: la pagina successiva arriva dalla QUERY_CACHE o dalla
+# ricerca rifatta, a partire da `offset`. Il payload resta sotto i 64 byte
+# della callback_data di Telegram qualunque sia la ricerca.
+#
+# Le chiavi stanno in una tabella a dimensione fissa (il budget di memoria) in
+# memory-map anonima: il server pre-fork la condivide con tutti i worker prima
+# del fork (share), ognuno scrive solo nella propria regione (attach) e tutti
+# leggono tutto, quindi un token creato da un worker vale su qualunque altro.
+# Ogni regione è un buffer circolare (si sovrascrivono le chiavi più vecchie) e
+# una chiave più vecchia di `ttl` secondi è scaduta. Le letture non prendono
+# lock: come in SharedSnapshots, chi scrive rende `seq` dispari durante la
+# scrittura e chi legge scarta le voci a metà o cambiate nel frattempo.
+
+import base64
+import binascii
+import hashlib
+import json
+import mmap
+import threading
+import time
+from typing import Any, Optional, Sequence, Tuple
+
+import numpy as np  # type: ignore
+
+KEY_BYTES = 488  # JSON della chiave più lungo memorizzabile (ricerche più lunghe: niente "show more")
+_ENTRY = np.dtype([('seq', '<u4'), ('length', '<u4'), ('hash', '<u8'), ('created', '<f8'),
+                   ('key', f'S{KEY_BYTES}')])  # 512 byte per voce
+
+
+def _freeze(value: Any) -> Any:
+    """Liste JSON di nuovo tuple (le chiavi della QUERY_CACHE devono essere hashable)."""
+    return tuple(_freeze(v) for v in value) if isinstance(value, list) else value
+
+
+def show_more_payload(token: str) -> str:
+    return f'/show_more{{"cursor":"{token}"}}'
+
+
+class CursorStore:
+    """Chiavi delle ricerche sfogliabili, ritrovabili dall'hash nel token (scadenza per età e budget di memoria)."""
+
+    def __init__(self, ttl: float = 900.0, max_bytes: int = 16 * 1024 * 1024, regions: int = 1):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()  # thread dello stesso processo che scrivono nella stessa regione
+        self.region = 0
+        self._allocate(regions)
+
+    def _allocate(self, regions: int) -> None:
+        self.regions = regions
+        self.per_region = max(self.max_bytes // _ENTRY.itemsize // regions, 1)
+        self._map = mmap.mmap(-1, regions * self.per_region * _ENTRY.itemsize)
+        self._positions_map = mmap.mmap(-1, 8 * regions)
+        self._entries = np.frombuffer(self._map, dtype=_ENTRY)
+        self._positions = np.frombuffer(self._positions_map, dtype=np.int64)  # prossima voce di ogni regione
+
+    def share(self, regions: int) -> None:
+        """Una regione per worker, nella memoria che i fork erediteranno (da chiamare prima del fork)."""
+        self._allocate(regions)
+
+    def attach(self, region: int) -> None:
+        """Nel worker: le chiavi nuove vanno nella sua regione."""
+        self.region = region
+
+    @staticmethod
+    def _encode(key: Sequence) -> Tuple[bytes, int]:
+        data = json.dumps(list(key), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return data, int.from_bytes(hashlib.blake2b(data, digest_size=6).digest(), 'little')
+
+    def _lookup(self, key_hash: int) -> Optional[bytes]:
+        """JSON della chiave con questo hash (None se non c'è o è scaduta)."""
+        entries = self._entries
+        now = time.monotonic()
+        for i in np.flatnonzero((entries['hash'] == key_hash) & (entries['length'] > 0))[::-1].tolist():
+            seq = int(entries['seq'][i])
+            if seq % 2:
+                continue  # scrittura in corso
+            created, data = float(entries['created'][i]), bytes(entries['key'][i])
+            if int(entries['seq'][i]) != seq or int(entries['hash'][i]) != key_hash:
+                continue  # sovrascritta mentre la leggevamo
+            if now - created <= self.ttl:
+                return data
+        return None
+
+    def create(self, key: Sequence, offset: int) -> Optional[str]:
+        """Token per la lista `key` a partire da `offset` (None se la chiave è troppo lunga da memorizzare)."""
+        data, key_hash = self._encode(key)
+        if len(data) > KEY_BYTES:
+            return None
+        with self._lock:
+            if self._lookup(key_hash) is None:
+                base = self.region * self.per_region
+                i = base + int(self._positions[self.region]) % self.per_region
+                seq = int(self._entries['seq'][i])
+                self._entries['seq'][i] = seq + 1
+                self._entries['hash'][i] = key_hash
+                self._entries['created'][i] = time.monotonic()
+                self._entries['length'][i] = len(data)
+                self._entries['key'][i] = data
+                self._entries['seq'][i] = seq + 2
+                self._positions[self.region] += 1
+        digest = base64.urlsafe_b64encode(key_hash.to_bytes(6, 'little')).decode('ascii')
+        return f"{digest}.{offset}"
+
+    def get(self, token: str) -> Optional[Tuple[Tuple, int]]:
+        """(chiave, offset) del token; None se il token non è valido, la chiave è scaduta o è stata sovrascritta."""
+        digest, _, offset = token.partition('.')
+        if len(digest) != 8 or not (offset.isascii() and offset.isdigit()):
+            return None
+        try:
+            key_hash = int.from_bytes(base64.urlsafe_b64decode(digest), 'little')
+        except (binascii.Error, ValueError):
+            return None
+        data = self._lookup(key_hash)
+        if data is None:
+            return None
+        try:
+            key = json.loads(data.decode('utf-8'))
+        except ValueError:
+            return None
+        return _freeze(key), int(offset)
+
+    def __len__(self) -> int:
+        now = time.monotonic()
+        return int(np.count_nonzero((self._entries['length'] > 0) & (now - self._entries['created'] <= self.ttl)))
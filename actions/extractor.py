@@ -0,0 +1,167 @@
+# Estrazione di ingredienti e tag (anche di più parole) dal testo libero.
+#
+# Quando l'NLU non riconosce le entità, i validatori delle form ripulivano il
+# testo con qualche str.replace e lo spezzavano su virgole e "and": "olive oil"
+# o "sour cream" finivano divisi e il fuzzy matching lavorava su frammenti.
+# Qui il vocabolario (file lookup/ più i termini del catalogo) diventa un
+# automa di Aho-Corasick sulle PAROLE: il testo si scorre una volta sola e
+# ogni posizione riporta tutti i termini che finiscono lì; tra termini
+# sovrapposti vince il più a sinistra e, a parità, il più lungo
+# ("sour cream cheese" -> "sour cream", "cheese").
+#
+# Parole di testo e vocabolario passano dalla stessa normalizzazione dei
+# Vocabulary (minuscole e singolare), così "Tomatoes" trova "tomato" e
+# "60 minutes or less" trova il tag "60-minutes-or-less".
+#
+# Virgole, punti e virgola e a capo sono i separatori con cui l'utente elenca
+# gli ingredienti: nel testo diventano il token SEPARATOR, che nessun termine
+# contiene, quindi un match non li attraversa mai ("garlic, salt" dà "garlic"
+# e "salt", non "garlic salt"). "and" invece resta una parola: i termini che
+# la contengono ("salt and pepper") si trovano, tutti gli altri si fermano lì.
+
+import re
+from collections import deque
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .vocabulary import Vocabulary, normalize_term, read_lookup, singular
+
+_PAROLE = re.compile(r'[^\W_]+')
+_PAROLE_E_SEPARATORI = re.compile(r'[^\W_]+|[,;\n]')
+SEPARATOR = ','  # token dei separatori nel testo: mai dentro un termine (le parole non hanno punteggiatura)
+MIN_TERM_LENGTH = 3  # termini più corti (una sola parola: "of", "a") non vengono cercati
+# Parole (già al singolare) che non sono mai un ingrediente o un tag nel testo avanzato
+FILLER_WORDS = frozenset({
+    'i', 'have', 'ha', 'got', 'use', 'using', 'some', 'only', 'want', 'and', 'or', 'with', 'the',
+    'a', 'an', 'please', 'of', 'my', 'me', 'give', 'just', 'also', 'plus', 'in', 'to', 'for',
+    'like', 'would', 'recipe', 'food', 'tag', 'make', 'it', 'something', 'any',
+})
+
+
+def words(text: str) -> List[str]:
+    """Parole normalizzate del testo (minuscole, al singolare), senza punteggiatura."""
+    return [singular(w) for w in _PAROLE.findall(str(text).lower())]
+
+
+def text_words(text: str) -> List[str]:
+    """Come words(), ma ogni separatore di elenco (virgola, punto e virgola, a capo) resta come SEPARATOR."""
+    return [SEPARATOR if w in ',;\n' else singular(w) for w in _PAROLE_E_SEPARATORI.findall(str(text).lower())]
+
+
+class PhraseExtractor:
+    """Automa di Aho-Corasick su sequenze di parole: termine (più parole) -> forma canonica.
+
+    Le transizioni del trie stanno in un unico dict (nodo, parola) -> nodo
+    figlio (un dict per nodo costerebbe molta più memoria); `_fail` è il link
+    al suffisso più lungo che è anche un prefisso nel trie e `_outputs`
+    raccoglie (lunghezza in parole, termine) di tutti i termini che finiscono
+    nel nodo, compresi quelli raggiungibili dai link di fallimento.
+    """
+
+    def __init__(self, terms: Dict[str, str], tokenize: Callable[[str], List[str]] = words,
+                 min_length: int = MIN_TERM_LENGTH):
+        # `tokenize` spezza i termini in parole: il testo da analizzare va spezzato allo stesso modo
+        self._goto: Dict[Tuple[int, str], int] = {}
+        children: List[List[Tuple[str, int]]] = [[]]  # solo per la costruzione
+        own: List[Optional[str]] = [None]
+        depth = [0]
+        for phrase, canonical in terms.items():
+            tokens = tokenize(phrase)
+            if not tokens or (len(tokens) == 1 and len(tokens[0]) < min_length):
+                continue
+            node = 0
+            for token in tokens:
+                child = self._goto.get((node, token))
+                if child is None:
+                    child = len(own)
+                    self._goto[node, token] = child
+                    children[node].append((token, child))
+                    children.append([])
+                    own.append(None)
+                    depth.append(depth[node] + 1)
+                node = child
+            if own[node] is None:
+                own[node] = canonical
+
+        # Link di fallimento e output, in ampiezza (ogni nodo dopo il suo suffisso)
+        self._fail = [0] * len(own)
+        self._outputs: List[Tuple[Tuple[int, str], ...]] = [()] * len(own)
+        queue = deque([0])
+        while queue:
+            node = queue.popleft()
+            for token, child in children[node]:
+                fail = self._fail[node]
+                while fail and (fail, token) not in self._goto:
+                    fail = self._fail[fail]
+                if node:
+                    self._fail[child] = self._goto.get((fail, token), 0)
+                term = own[child]
+                self._outputs[child] = (((depth[child], term),) if term is not None else ()) \
+                    + self._outputs[self._fail[child]]
+                queue.append(child)
+
+    @classmethod
+    def from_vocabulary(cls, vocabulary: Vocabulary, lookup_paths: Sequence[str] = ()) -> "PhraseExtractor":
+        """Termini del catalogo più le voci dei file lookup (ricondotte al termine del catalogo se esiste)."""
+        terms: Dict[str, str] = {}
+        for path in lookup_paths:
+            for entry in read_lookup(path):
+                terms[entry] = vocabulary.normalized.get(normalize_term(entry), entry)
+        for variant, canonical in vocabulary.normalized.items():
+            terms.setdefault(variant, canonical)
+        for term in vocabulary.terms:
+            terms[term] = term
+        return cls(terms)
+
+    def __len__(self) -> int:
+        return len(self._fail)
+
+    def matches(self, tokens: Sequence[str]) -> List[Tuple[int, int, str]]:
+        """Tutti i match (prima parola, parola dopo l'ultima, termine), anche sovrapposti, in un solo passaggio."""
+        found: List[Tuple[int, int, str]] = []
+        node = 0
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        for end, token in enumerate(tokens, 1):
+            while node and (node, token) not in goto:
+                node = fail[node]
+            node = goto.get((node, token), 0)
+            for length, term in outputs[node]:
+                found.append((end - length, end, term))
+        return found
+
+    def find(self, tokens: Sequence[str]) -> List[Tuple[int, int, str]]:
+        """I match non sovrapposti: il più a sinistra e, a parità di inizio, il più lungo."""
+        found = self.matches(tokens)
+        found.sort(key=lambda m: (m[0], m[0] - m[1]))
+        result: List[Tuple[int, int, str]] = []
+        last_end = 0
+        for match in found:
+            if match[0] >= last_end:
+                result.append(match)
+                last_end = match[1]
+        return result
+
+    def extract(self, text: str) -> List[str]:
+        """Termini trovati nel testo, senza ripetizioni, nell'ordine in cui compaiono."""
+        return list(dict.fromkeys(term for _, _, term in self.find(text_words(text))))
+
+    def parse(self, text: str) -> Tuple[List[str], List[str]]:
+        """(termini trovati, frammenti avanzati): i frammenti sono le sequenze di parole
+        fuori dai match, senza parole di riempimento, da passare alla correzione dei refusi."""
+        tokens = text_words(text)
+        matches = self.find(tokens)
+        rest: List[str] = []
+        run: List[str] = []
+        covered = iter(matches)
+        current = next(covered, None)
+        for i, token in enumerate(tokens):
+            while current is not None and i >= current[1]:
+                current = next(covered, None)
+            if (current is not None and current[0] <= i) or token in FILLER_WORDS or token == SEPARATOR:
+                if run:
+                    rest.append(' '.join(run))
+                run = []
+            else:
+                run.append(token)
+        if run:
+            rest.append(' '.join(run))
+        return list(dict.fromkeys(term for _, _, term in matches)), rest
@@ -0,0 +1,401 @@
+# Costruzione del catalogo ricette a partire dal CSV.
+#
+# Il Catalog raccoglie il dataframe (solo colonne "calde": i numeri, nei tipi
+# più piccoli che li contengono), il testo lungo delle ricette (tags/ingredients/
+# steps, in un file in memory-map letto solo per le schede ricetta) e tutti gli
+# indici usati dalle action. Può essere costruito dal CSV oppure caricato già
+# pronto da uno snapshot binario (vedi snapshot.py).
+#
+# Il CSV si legge a blocchi (ingest_csv): ogni blocco finisce subito negli
+# array compatti, nei codici delle liste e nei file del testo, così il
+# caricamento non tiene mai in memoria il dataframe intero con le sue stringhe.
+
+import ast
+import ctypes
+import ctypes.util
+import gc
+import hashlib
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np  # type: ignore
+import pandas as pd  # type: ignore
+
+from .catalog import csr_posting_index, positions_to_bitmap
+from .coverage import CoverageRanker
+from .name_search import NameIndex, TrigramNameMatcher, normalize_name
+from .macro_search import MacroSearchEngine
+from .menus import MenuTable
+from .records import LIST_TEXT_COLUMNS, PackedStrings, RecipeStore, StringSpill, display_list_text
+from .vocabulary import LOOKUP_INGREDIENTS, LOOKUP_TAGS, Vocabulary, load_synonyms
+from .extractor import PhraseExtractor
+
+CHUNK_ROWS = 20_000  # righe del CSV lette per volta: con la tabella finale fissano il picco di memoria
+# Colonne sempre numeriche, qualunque cosa contenga il primo blocco: i valori non
+# numerici diventano 0 (l'ID invece resta NaN e fa passare agli ID calcolati)
+NUMERIC_COLUMNS = ('id', 'minutes', 'calories', 'total_fat', 'sugar', 'sodium', 'protein',
+                   'saturated_fat', 'carbohydrates', 'rating_medio', 'num_voti')
+
+
+def parse_list_column(raw: Any) -> List[str]:
+    """Converte una cella "['Onion', ' garlic']" in ['onion', 'garlic'] (lista vuota se non valida)."""
+    try:
+        return [str(x).lower().strip() for x in ast.literal_eval(raw)]
+    except Exception:
+        return []
+
+
+class RecipeIdHasher:
+    """ID delle ricette che non cambiano tra un export del CSV e il successivo.
+
+    L'ID non può essere la posizione della riga: dopo un aggiornamento del dataset
+    i bottoni già mostrati in chat punterebbero a un'altra ricetta. Se il CSV ha
+    una colonna 'id' la usiamo; altrimenti l'ID è un hash (53 bit, così resta un
+    intero esatto anche in JSON) di nome, tempo e ingredienti. Le ricette identiche
+    vengono distinte con un contatore di occorrenza.
+
+    Le righe arrivano a blocchi, nell'ordine del CSV: le occorrenze si contano
+    su un hash di 8 byte della chiave invece che sulla chiave intera.
+    """
+
+    def __init__(self):
+        self._seen: Dict[bytes, int] = {}
+        self._used = set()
+
+    def add(self, names: Sequence[str], minutes: Sequence[Any], ingredients: Sequence[Any]) -> np.ndarray:
+        ids = np.empty(len(names), dtype=np.int64)
+        seen, used = self._seen, self._used
+        for pos, (name, minute, ingredient) in enumerate(zip(names, minutes, ingredients)):
+            key = f"{normalize_name(name)}|{minute}|{normalize_name(ingredient)}"
+            seen_key = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+            occurrence = seen.get(seen_key, 0)
+            seen[seen_key] = occurrence + 1
+            key = f"{key}#{occurrence}"
+            while True:
+                digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+                recipe_id = int.from_bytes(digest, 'little') & ((1 << 53) - 1)
+                if recipe_id not in used:
+                    break
+                key += '#'  # collisione (rarissima): si riprova in modo deterministico
+            used.add(recipe_id)
+            ids[pos] = recipe_id
+        return ids
+
+
+class ListColumn:
+    """Una colonna di liste ("['onion', 'garlic']") letta a blocchi: termini internati e codici CSR."""
+
+    def __init__(self):
+        self.vocab: Dict[str, int] = {}  # termine -> codice provvisorio (ordine di comparsa nel CSV)
+        self._codes: List[np.ndarray] = []
+        self._lengths: List[np.ndarray] = []
+
+    def add(self, cells: Sequence[Any]) -> None:
+        vocab = self.vocab
+        codes: List[int] = []
+        lengths: List[int] = []
+        for raw in cells:
+            items = parse_list_column(raw)
+            codes.extend(vocab.setdefault(item, len(vocab)) for item in items)
+            lengths.append(len(items))
+        self._codes.append(np.asarray(codes, dtype=np.int32))
+        self._lengths.append(np.asarray(lengths, dtype=np.int64))
+
+    def finish(self, order: np.ndarray) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """(termini, codici, offset) con le ricette nell'ordine `order`.
+
+        I termini sono rinumerati nell'ordine in cui compaiono scorrendo la
+        classifica (lo stesso di build_posting_index) e i codici sono int16 se
+        il vocabolario ci sta (tag e ingredienti sono poche migliaia), altrimenti int32.
+        """
+        codes = np.concatenate(self._codes) if self._codes else np.empty(0, dtype=np.int32)
+        lengths = np.concatenate(self._lengths) if self._lengths else np.empty(0, dtype=np.int64)
+        self._codes, self._lengths = [], []
+        starts = np.zeros(len(lengths), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=starts[1:])
+        lengths = lengths[order]
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        # Ogni ricetta copia il suo tratto di codici nella nuova posizione
+        gather = np.repeat(starts[order] - offsets[:-1], lengths)
+        gather += np.arange(offsets[-1], dtype=np.int64)
+        codes = codes[gather]
+        del gather
+
+        present, first = np.unique(codes, return_index=True)
+        by_rank = present[np.argsort(first, kind='stable')]
+        remap = np.empty(len(self.vocab), dtype=np.int32)
+        remap[by_rank] = np.arange(len(by_rank), dtype=np.int32)
+        names = list(self.vocab)
+        terms = [names[c] for c in by_rank.tolist()]
+        dtype = np.int16 if len(terms) <= np.iinfo(np.int16).max else np.int32
+        return terms, remap[codes].astype(dtype), offsets
+
+
+def compact_numeric_columns(dataset: pd.DataFrame) -> pd.DataFrame:
+    """Interi nel tipo più piccolo che li contiene (almeno int16), decimali in float32.
+
+    Va fatto dopo l'ordinamento per classifica: il rating in float32 non deve
+    cambiare l'ordine tra ricette quasi a pari merito. Nei messaggi i numeri
+    passano da display_number, che arrotonda via gli artefatti del float32.
+    """
+    compact = {}
+    for c in dataset.columns:
+        column = dataset[c]
+        if pd.api.types.is_integer_dtype(column):
+            # niente int8: somme e confronti piccoli traboccherebbero troppo facilmente
+            values = pd.to_numeric(column, downcast='integer').to_numpy()
+            compact[c] = values.astype(np.promote_types(values.dtype, np.int16), copy=False)
+        elif pd.api.types.is_float_dtype(column):
+            compact[c] = column.to_numpy(dtype=np.float32)
+    return dataset.assign(**compact) if compact else dataset
+
+
+class Catalog:
+    """Tutto ciò che serve alle action per rispondere, costruito una volta sola.
+
+    Le posizioni delle righe di `dataset` sono l'ordine di classifica (rating e
+    voti decrescenti) e sono le stesse usate da tutti gli indici; l'indice del
+    dataframe è l'ID stabile della ricetta usato nei bottoni.
+
+    Un Catalog non viene mai modificato dopo la costruzione: un aggiornamento del
+    dataset produce un nuovo Catalog (vedi catalog_manager.py).
+    """
+
+    def __init__(self, dataset: pd.DataFrame, texts: Dict[str, Sequence[str]],
+                 tag_bitmaps: Dict[str, int], ingredient_index: Dict[str, np.ndarray],
+                 tag_lists: Tuple[np.ndarray, np.ndarray], ingredient_lists: Tuple[np.ndarray, np.ndarray],
+                 name_index: NameIndex, name_matcher: TrigramNameMatcher,
+                 macro_engine: MacroSearchEngine, menus: MenuTable, records: RecipeStore,
+                 source: str = 'csv', version: str = ''):
+        self.dataset = dataset
+        self.texts = texts
+        self.tag_bitmaps = tag_bitmaps
+        self.ingredient_index = ingredient_index
+        self.tag_lists = tag_lists
+        self.ingredient_lists = ingredient_lists
+        self.name_index = name_index
+        self.name_matcher = name_matcher
+        self.macro_engine = macro_engine
+        self.menus = menus
+        self.records = records  # campi da mostrare, senza passare da pandas
+        self.source = source
+        self.version = version  # impronta del CSV da cui è stato costruito
+
+        self.all_unique_tags: List[str] = list(tag_bitmaps)
+        self.all_unique_ingredients: List[str] = list(ingredient_index)
+        # Classifica per copertura degli ingredienti (derivata dagli indici, costa pochi array)
+        self.coverage = CoverageRanker(ingredient_index, ingredient_lists, dataset['rating_medio'].to_numpy())
+        # Vocabolari per validare e correggere i termini dell'utente (a parità di refuso vince il più usato)
+        synonyms = load_synonyms()
+        self.tag_vocabulary = Vocabulary(
+            self.all_unique_tags, np.bincount(tag_lists[0], minlength=len(tag_bitmaps)), synonyms)
+        self.ingredient_vocabulary = Vocabulary(
+            self.all_unique_ingredients, np.bincount(ingredient_lists[0], minlength=len(ingredient_index)), synonyms)
+        # Termini (anche di più parole) da cercare nel testo libero quando l'NLU non trova entità
+        self.tag_extractor = PhraseExtractor.from_vocabulary(self.tag_vocabulary, [LOOKUP_TAGS])
+        self.ingredient_extractor = PhraseExtractor.from_vocabulary(self.ingredient_vocabulary, [LOOKUP_INGREDIENTS])
+        self._memory: Optional[Dict[str, int]] = None
+
+    def text(self, column: str, pos: int) -> str:
+        """Testo da mostrare (es. 'steps', già ripulito da parentesi e apici) della ricetta in posizione `pos`."""
+        return self.texts[column][pos]
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Byte dei dati di ogni componente (array, bitmap e testi; esclusi gli oggetti Python).
+
+        Il catalogo non cambia, quindi il conto si fa una volta sola.
+        """
+        if self._memory is None:
+            def arrays(items) -> int:
+                return int(sum(a.nbytes for a in items))
+
+            def strings(items) -> int:
+                if isinstance(items, PackedStrings):
+                    return items.nbytes
+                return int(sum(len(s) for s in items))
+
+            self._memory = {
+                'records': arrays(self.records.columns.values()) + self.records.ids.nbytes
+                           + strings(self.records.names) + strings(self.records.titles),
+                'texts': int(sum(strings(column) for column in self.texts.values())),
+                'tag_bitmaps': int(sum((b.bit_length() + 7) // 8 for b in self.tag_bitmaps.values())),
+                'ingredient_index': arrays(self.ingredient_index.values()),
+                'list_columns': arrays(self.tag_lists) + arrays(self.ingredient_lists),
+                'name_index': arrays(self.name_index.postings.values()) + strings(self.name_index.names),
+                'name_matcher': arrays(self.name_matcher.index.values()) + strings(self.name_matcher.names),
+                'macro_matrix': self.macro_engine.matrix.nbytes,
+                'coverage': self.coverage.row_lengths.nbytes + self.coverage.rating_bonus.nbytes,
+                'vocabularies': self.tag_vocabulary.nbytes + self.ingredient_vocabulary.nbytes,
+                'menus': arrays(self.menus.table.values()),
+            }
+        return self._memory
+
+
+def _rank_order(rating: np.ndarray, votes: np.ndarray) -> np.ndarray:
+    """Ordine di classifica globale: rating e numero voti decrescenti, a parità l'ordine del CSV.
+
+    L'indice del dataframe resta l'ID stabile (quello usato nei bottoni), mentre
+    la POSIZIONE della riga è il rank: tutti gli indici lavorano su posizioni,
+    quindi i risultati filtrati escono già ordinati e la top 5 sono
+    semplicemente le prime 5 posizioni.
+    """
+    return np.lexsort((-votes, -rating))  # lexsort è stabile e ordina prima per l'ultima chiave
+
+
+def _hash_ids_from_csv(path: str, chunk_rows: int) -> np.ndarray:
+    """ID calcolati con RecipeIdHasher rileggendo (a blocchi) solo nome, tempo e ingredienti."""
+    hasher = RecipeIdHasher()
+    parts = []
+    for chunk in pd.read_csv(path, usecols=['name', 'minutes', 'ingredients'], chunksize=chunk_rows):
+        parts.append(hasher.add(chunk['name'].astype(str).tolist(), chunk['minutes'].tolist(),
+                                chunk['ingredients'].tolist()))
+    return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+
+def ingest_csv(path: str, use_kdtree: bool = False, chunk_rows: int = CHUNK_ROWS) -> Catalog:
+    """Costruisce il catalogo leggendo il CSV a blocchi di `chunk_rows` righe.
+
+    Il CSV intero non sta mai in memoria come dataframe: di ogni blocco restano
+    solo i numeri (array), le liste di tag e ingredienti (codici interi) e il
+    testo da mostrare (scritto subito nei file temporanei in memory-map). Alla
+    fine si calcola l'ordine di classifica e si riordina tutto una volta sola;
+    il picco di memoria resta vicino alla dimensione del catalogo finale.
+    """
+    # --- 1. LETTURA A BLOCCHI ---
+    # Le colonne 'tags' e 'ingredients' sono stringhe tipo "['onion', 'garlic']":
+    # le convertiamo subito in codici, così le action non devono più chiamare
+    # literal_eval su ogni riga a ogni richiesta. Le colonne numeriche sono
+    # NUMERIC_COLUMNS più quelle che pandas riconosce come tali nel primo
+    # blocco; tutte le altre (tranne il nome) sono testo da mostrare.
+    print(f"🔄 Lettura a blocchi di {chunk_rows} righe (TAG e INGREDIENTI codificati al volo)...")
+    size = max(os.path.getsize(path), 1)
+    started = time.perf_counter()
+    numeric: Dict[str, List[np.ndarray]] = {}
+    texts: Dict[str, StringSpill] = {}
+    names = StringSpill()
+    tags, ingredients = ListColumn(), ListColumn()
+    hasher: Optional[RecipeIdHasher] = None
+    hashed: List[np.ndarray] = []
+    rows = 0
+    with open(path, 'rb') as f:
+        for chunk in pd.read_csv(f, chunksize=chunk_rows):
+            if not rows:
+                numeric = {c: [] for c in chunk.columns if c in NUMERIC_COLUMNS
+                           or (c != 'name' and pd.api.types.is_numeric_dtype(chunk[c]))}
+                texts = {c: StringSpill() for c in chunk.columns if c != 'name' and c not in numeric}
+                hasher = None if 'id' in numeric else RecipeIdHasher()
+            chunk_names = chunk['name'].astype(str).tolist()
+            names.append(chunk_names)
+            for c, parts in numeric.items():
+                values = pd.to_numeric(chunk[c], errors='coerce')
+                if c in NUMERIC_COLUMNS and c != 'id':
+                    values = values.fillna(0)
+                parts.append(values.to_numpy())
+            tags.add(chunk['tags'].tolist())
+            ingredients.add(chunk['ingredients'].tolist())
+            for c, spill in texts.items():
+                values = ('' if pd.isna(v) else str(v) for v in chunk[c])
+                if c in LIST_TEXT_COLUMNS:
+                    values = (display_list_text(v) for v in values)
+                spill.append(values)
+            if hasher is not None:
+                hashed.append(hasher.add(chunk_names, chunk['minutes'].tolist(), chunk['ingredients'].tolist()))
+            rows += len(chunk)
+            print(f"   📥 {rows} ricette ({100 * f.tell() / size:.0f}% del file, "
+                  f"{time.perf_counter() - started:.1f}s)")
+            del chunk, chunk_names
+
+    # --- 2. NUMERI, ID STABILI E ORDINE DI CLASSIFICA ---
+    columns = {c: np.concatenate(parts) for c, parts in numeric.items()}
+    del numeric
+    if 'num_voti' not in columns:
+        columns['num_voti'] = np.zeros(rows, dtype=np.int64)
+
+    ids = None
+    if 'id' in columns:
+        candidate = columns['id']
+        if not np.isnan(candidate).any() and len(np.unique(candidate)) == rows:
+            ids = candidate.astype(np.int64)
+        else:
+            ids = _hash_ids_from_csv(path, chunk_rows)  # colonna 'id' inutilizzabile: serve una seconda lettura
+    if ids is None:
+        ids = np.concatenate(hashed) if hashed else np.empty(0, dtype=np.int64)
+    del hashed
+
+    order = _rank_order(columns['rating_medio'], columns['num_voti'])
+    dataset = pd.DataFrame({c: values[order] for c, values in columns.items()},
+                           index=pd.Index(ids[order]))  # FONDAMENTALE PER GLI ID
+    del columns, ids
+    dataset = compact_numeric_columns(dataset)
+
+    # --- 3. INDICIZZAZIONE TAG (una bitmap per tag) ---
+    tag_terms, tag_codes, tag_offsets = tags.finish(order)
+    tag_bitmaps = {term: positions_to_bitmap(pos)
+                   for term, pos in csr_posting_index(tag_terms, tag_codes, tag_offsets).items()}
+    print(f"✅ Tag indicizzati: {len(tag_bitmaps)}")
+
+    # --- 4. INDICIZZAZIONE INGREDIENTI (indice invertito) ---
+    ingredient_terms, ingredient_codes, ingredient_offsets = ingredients.finish(order)
+    ingredient_index = csr_posting_index(ingredient_terms, ingredient_codes, ingredient_offsets)
+    print(f"✅ Ingredienti indicizzati: {len(ingredient_index)}")
+
+    # --- 5. SEPARAZIONE DEL TESTO LUNGO ---
+    # Le colonne testuali (tags, ingredients, steps, ...) servono solo per mostrare
+    # la ricetta: sono già in file temporanei in memory-map, nel formato della
+    # scheda ricetta (le liste senza parentesi e apici), e vanno solo riscritte
+    # in ordine di classifica. Anche il nome resta fuori dal dataframe: lo tiene
+    # (impacchettato) il RecipeStore.
+    texts = {c: spill.finish().take(order) for c, spill in texts.items()}
+    csv_names = names.finish()
+    names = [csv_names[pos] for pos in order.tolist()]
+    del csv_names
+
+    # --- 6. INDICIZZAZIONE NOMI (parole/prefissi e trigrammi per il fuzzy matching) ---
+    name_index = NameIndex(names)
+    name_matcher = TrigramNameMatcher(name_index.names)
+    print(f"✅ Nomi indicizzati: {len(name_matcher.names)}")
+
+    # --- 7. MATRICE DEI MACRONUTRIENTI ---
+    macro_engine = MacroSearchEngine.from_frame(dataset, use_kdtree=use_kdtree)
+
+    # --- 8. MENU COMPLETI PER OGNI TEMA (tag) ---
+    menus = MenuTable.build(tag_bitmaps)
+    print(f"✅ Menu calcolati: {len(menus.table)}")
+
+    return Catalog(
+        dataset=dataset,
+        texts=texts,
+        tag_bitmaps=tag_bitmaps,
+        ingredient_index=ingredient_index,
+        tag_lists=(tag_codes, tag_offsets),
+        ingredient_lists=(ingredient_codes, ingredient_offsets),
+        name_index=name_index,
+        name_matcher=name_matcher,
+        macro_engine=macro_engine,
+        menus=menus,
+        records=RecipeStore.from_frame(dataset, names),
+    )
+
+
+def release_free_memory() -> None:
+    """Restituisce al sistema la memoria liberata dopo la costruzione del catalogo.
+
+    Il parsing lascia milioni di piccoli oggetti temporanei: anche dopo il gc
+    l'allocatore di glibc tiene le pagine libere, che i worker creati con fork
+    erediterebbero. Su sistemi senza glibc non fa nulla.
+    """
+    gc.collect()
+    try:
+        ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def load_csv_catalog(path: str, use_kdtree: bool = False) -> Catalog:
+    """Caricamento completo dal CSV (lento: parsing di ogni riga e costruzione degli indici)."""
+    print(f"📂 Caricamento dataset da: {path}")
+    catalog = ingest_csv(path, use_kdtree=use_kdtree)
+    release_free_memory()
+    return catalog
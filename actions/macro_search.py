@@ -0,0 +1,111 @@
+# Ricerca delle ricette più vicine a un target di macronutrienti.
+#
+# La distanza è la stessa della versione originale dell'action: somma degli
+# errori relativi |valore - target| / max(1, target) su calorie, carboidrati,
+# grassi e proteine (eventualmente pesati). Tutto è calcolato su una matrice
+# float32 contigua, senza copiare il dataframe.
+
+from typing import Optional, Sequence, Tuple
+
+import numpy as np  # type: ignore
+
+try:
+    from scipy.spatial import cKDTree  # type: ignore
+except ImportError:  # scipy è opzionale: senza KD-tree si usa solo la ricerca vettoriale
+    cKDTree = None
+
+MACRO_COLUMNS = ['calories', 'carbohydrates', 'total_fat', 'protein']
+
+
+class MacroSearchEngine:
+    """Nearest neighbour sui macronutrienti delle ricette.
+
+    `matrix` ha una riga per POSIZIONE della ricetta (ordine di classifica), quindi
+    a parità di distanza vince la posizione più bassa, cioè la ricetta col rating
+    migliore, come nell'ordinamento originale (distance, rating_medio).
+    """
+
+    def __init__(self, matrix: np.ndarray, use_kdtree: bool = False):
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        # Valori mancanti: la ricetta finisce in fondo a qualsiasi classifica
+        # (nessuna copia se la matrice è già pulita, es. letta da uno snapshot)
+        if np.isnan(matrix).any():
+            matrix = np.where(np.isnan(matrix), np.float32(np.inf), matrix)
+        self.matrix = matrix
+
+        # KD-tree opzionale sui macro normalizzati (ogni colonna divisa per la sua deviazione standard)
+        self.tree = None
+        if use_kdtree and cKDTree is not None:
+            # Solo le ricette con tutti i macro presenti entrano nell'albero
+            self.tree_positions = np.flatnonzero(np.isfinite(self.matrix).all(axis=1)).astype(np.int32)
+            if len(self.tree_positions):
+                valid = self.matrix[self.tree_positions].astype(np.float64)
+                self.scale = valid.std(axis=0)
+                self.scale[self.scale == 0] = 1.0
+                self.tree = cKDTree(valid / self.scale)
+
+    @classmethod
+    def from_frame(cls, frame, use_kdtree: bool = False) -> "MacroSearchEngine":
+        return cls(frame[MACRO_COLUMNS].to_numpy(dtype=np.float32), use_kdtree=use_kdtree)
+
+    @staticmethod
+    def coefficients(targets: Sequence[float], weights: Optional[Sequence[float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Target e coefficienti della distanza: peso / max(1, target) per ogni macro."""
+        t = np.asarray(targets, dtype=np.float32)
+        w = np.ones(len(t), dtype=np.float32) if weights is None else np.asarray(weights, dtype=np.float32)
+        return t, w / np.maximum(np.float32(1), t)
+
+    def distances(self, targets: Sequence[float], candidates: Optional[np.ndarray] = None,
+                  weights: Optional[Sequence[float]] = None) -> np.ndarray:
+        """Distanza di ogni ricetta (o dei soli candidati) dal target, in un unico passaggio."""
+        t, coef = self.coefficients(targets, weights)
+        values = self.matrix if candidates is None else self.matrix[candidates]
+        return np.abs(values - t) @ coef
+
+    def search(self, targets: Sequence[float], k: int = 5, candidates: Optional[np.ndarray] = None,
+               weights: Optional[Sequence[float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Le k ricette più vicine al target: (posizioni, distanze), dalla più vicina.
+
+        `candidates` (posizioni ordinate, es. dopo un filtro per tag o tempo) limita
+        la ricerca a quelle ricette.
+        """
+        if candidates is None and self.tree is not None:
+            return self._search_kdtree(targets, k, weights)
+
+        positions = np.arange(len(self.matrix), dtype=np.int32) if candidates is None else candidates
+        return self._top_k(positions, self.distances(targets, candidates, weights), k)
+
+    @staticmethod
+    def _top_k(positions: np.ndarray, dist: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Selezione parziale dei k minimi (np.partition) invece di un ordinamento completo."""
+        if len(dist) == 0 or k <= 0:
+            return positions[:0], dist[:0]
+        if len(dist) > k:
+            kth = np.partition(dist, k - 1)[k - 1]
+            # Teniamo anche i pari merito sul bordo, così vince sempre la ricetta col rank migliore
+            keep = np.flatnonzero(dist <= kth)
+            positions, dist = positions[keep], dist[keep]
+        order = np.lexsort((positions, dist))[:k]
+        return positions[order], dist[order]
+
+    def _search_kdtree(self, targets: Sequence[float], k: int,
+                       weights: Optional[Sequence[float]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Ricerca esatta usando il KD-tree (metrica L1) come filtro.
+
+        Nello spazio normalizzato la distanza vera è una L1 pesata con coefficienti
+        c_j = coef_j * scale_j, quindi c_min * L1 <= distanza. Prendiamo i k vicini in
+        L1, calcoliamo la loro distanza vera D (la k-esima) e poi tutte le ricette con
+        L1 <= D / c_min: tra queste ci sono sicuramente le k migliori.
+        """
+        t, coef = self.coefficients(targets, weights)
+        c_min = float((coef * self.scale).min())
+        if c_min <= 0 or len(self.tree_positions) <= k:
+            return self._top_k(np.arange(len(self.matrix), dtype=np.int32), self.distances(targets, None, weights), k)
+
+        query = t / self.scale
+        _, near = self.tree.query(query, k=k, p=1)
+        bound = float(self.distances(targets, self.tree_positions[np.atleast_1d(near)], weights).max())
+        # Piccolo margine per gli arrotondamenti float32
+        ball = self.tree.query_ball_point(query, r=bound / c_min * (1 + 1e-4), p=1)
+        ball = np.sort(self.tree_positions[np.asarray(ball, dtype=np.int64)])
+        return self._top_k(ball, self.distances(targets, ball, weights), k)
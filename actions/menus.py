@@ -0,0 +1,83 @@
+# Menu completi (Full Course Meal) già calcolati per ogni tema.
+#
+# Il menu di un tema è, per ogni portata, la ricetta migliore che ha il tag del
+# tema e almeno uno dei tag della portata. I temi possibili sono i tag del
+# catalogo (vocabolario finito), quindi la tabella tema -> portate viene
+# calcolata una volta alla costruzione del catalogo e salvata nello snapshot:
+# l'action fa solo una ricerca nel dizionario. Le portate sono configurabili
+# in courses.json.
+
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np  # type: ignore
+
+from .catalog import bitmap_or
+
+COURSES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'courses.json')
+
+Course = Tuple[str, List[str]]  # (Nome Display, [lista_tag_accettati])
+
+
+def load_courses(path: str = COURSES_PATH) -> List[Course]:
+    """Portate del menu nel formato [(nome, [tag accettati]), ...]."""
+    with open(path, encoding='utf-8') as f:
+        return [(c['name'], [t.lower().strip() for t in c['tags']]) for c in json.load(f)]
+
+
+COURSES = load_courses()
+
+
+def lowest_position(bitmap: int) -> int:
+    """Posizione del bit acceso più basso (-1 se la bitmap è vuota)."""
+    return (bitmap & -bitmap).bit_length() - 1
+
+
+class MenuTable:
+    """Tabella tema -> posizione della ricetta migliore per ogni portata (-1 se manca).
+
+    I temi che non sono nella tabella (es. tag aggiunti dopo la costruzione, o
+    portate cambiate) vengono calcolati alla prima richiesta e memorizzati.
+    """
+
+    def __init__(self, tag_bitmaps: Dict[str, int], courses: Sequence[Course],
+                 table: Optional[Dict[str, np.ndarray]] = None):
+        self.tag_bitmaps = tag_bitmaps
+        self.courses = list(courses)
+        # Bitmap di ogni portata: ricette con ALMENO UNO dei tag validi (tag1 OR tag2 ...)
+        self._course_bitmaps = [bitmap_or([tag_bitmaps.get(t, 0) for t in tags]) for _, tags in self.courses]
+        self._lock = threading.Lock()
+        self.table: Dict[str, np.ndarray] = {} if table is None else dict(table)
+
+    @classmethod
+    def build(cls, tag_bitmaps: Dict[str, int], courses: Sequence[Course] = COURSES) -> "MenuTable":
+        """Calcola il menu di ogni tag del catalogo."""
+        menus = cls(tag_bitmaps, courses)
+        menus.table = {tag: menus.compute(tag) for tag in tag_bitmaps}
+        return menus
+
+    def compute(self, theme: str) -> np.ndarray:
+        # tema AND portata: la migliore è il bit acceso più basso (ordine di classifica)
+        theme_bitmap = self.tag_bitmaps.get(theme, 0)
+        return np.asarray([lowest_position(theme_bitmap & course) for course in self._course_bitmaps],
+                          dtype=np.int32)
+
+    def menu(self, theme: str) -> List[Tuple[str, Optional[int]]]:
+        """[(nome portata, posizione della ricetta migliore o None), ...] per il tema."""
+        positions = self.table.get(theme)
+        if positions is None:
+            positions = self.compute(theme)
+            # Si memorizzano solo i tag veri: un testo qualsiasi non deve far crescere la tabella
+            if theme in self.tag_bitmaps:
+                with self._lock:
+                    self.table[theme] = positions
+        return [(name, int(pos) if pos >= 0 else None)
+                for (name, _), pos in zip(self.courses, positions.tolist())]
+
+    def as_matrix(self, themes: Sequence[str]) -> np.ndarray:
+        """Tabella come matrice int32 (una riga per tema), per lo snapshot."""
+        if not themes:
+            return np.empty((0, len(self.courses)), dtype=np.int32)
+        return np.vstack([self.table[t] if t in self.table else self.compute(t) for t in themes]).astype(np.int32)
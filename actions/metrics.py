@@ -0,0 +1,296 @@
+# Metriche del server delle action in formato Prometheus (testo 0.0.4).
+#
+# Contatori, gauge e istogrammi minimi, senza dipendenze esterne, pensati per
+# restare attivi in produzione: ogni aggiornamento è un'operazione su un dict
+# sotto un lock (pochi microsecondi). Le metriche standard sono definite qui
+# sotto; il server (server.py) le espone su /metrics accanto al webhook di
+# rasa_sdk.
+#
+# Con più worker (pre-fork) ogni processo ha i propri valori: ogni worker copia
+# periodicamente una fotografia dei suoi contatori e istogrammi in uno slot di
+# memoria condivisa (SharedSnapshots) e chi risponde a /metrics somma gli slot
+# degli altri ai propri valori. Le gauge sono calcolate al momento della lettura
+# (es. dimensione del catalogo) e non passano dagli slot.
+
+import json
+import mmap
+import struct
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, Any] = {}
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Valore che può solo crescere (richieste, errori, correzioni, ...)."""
+
+    kind = 'counter'
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def snapshot(self) -> Dict[Labels, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def absorb(self, values: Dict[Labels, float]) -> None:
+        with self._lock:
+            for labels, value in values.items():
+                self._values[labels] = self._values.get(labels, 0.0) + value
+
+    def samples(self, others: Iterable[Dict[Labels, float]] = ()) -> List[str]:
+        merged = self.snapshot()
+        for values in others:
+            for labels, value in values.items():
+                merged[labels] = merged.get(labels, 0.0) + value
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in sorted(merged.items())]
+
+
+class Gauge(_Metric):
+    """Valore istantaneo calcolato da `fn` a ogni lettura: {labels: valore}."""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 fn: Optional[Callable[[], Dict[Labels, float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def samples(self, others: Iterable[Any] = ()) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        if self.fn is not None:
+            try:
+                values.update(self.fn())
+            except Exception:
+                pass  # una gauge che fallisce non deve rompere l'intera risposta
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in sorted(values.items())]
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram: "Histogram", labels: Labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Histogram(_Metric):
+    """Distribuzione di latenze: conteggi per bucket (non cumulativi in memoria), somma e numero."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # un contatore per bucket + quello oltre l'ultimo, poi somma
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def time(self, *labels: str) -> _Timer:
+        """`with HISTOGRAM.time('action', 'phase'):` misura il blocco."""
+        return _Timer(self, labels)
+
+    def snapshot(self) -> Dict[Labels, List[float]]:
+        with self._lock:
+            return {labels: list(series) for labels, series in self._values.items()}
+
+    def absorb(self, values: Dict[Labels, List[float]]) -> None:
+        with self._lock:
+            for labels, series in values.items():
+                own = self._values.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0])
+                for i, v in enumerate(series):
+                    own[i] += v
+
+    def samples(self, others: Iterable[Dict[Labels, List[float]]] = ()) -> List[str]:
+        merged = self.snapshot()
+        for values in others:
+            for labels, series in values.items():
+                own = merged.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0])
+                for i, v in enumerate(series):
+                    own[i] += v
+
+        lines = []
+        for labels, series in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {int(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {int(cumulative)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Insieme delle metriche del processo, con esportazione in formato Prometheus."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> Any:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metrica già registrata: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              fn: Optional[Callable[[], Dict[Labels, float]]] = None) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, fn))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Contatori e istogrammi in forma serializzabile (JSON), per gli altri processi."""
+        return {name: [[list(labels), value] for labels, value in metric.snapshot().items()]
+                for name, metric in self._metrics.items() if isinstance(metric, (Counter, Histogram))}
+
+    @staticmethod
+    def _decode(entries: List) -> Dict[Labels, Any]:
+        return {tuple(labels): value for labels, value in entries}
+
+    def absorb(self, snapshot: Dict[str, Any]) -> None:
+        """Somma ai valori correnti quelli di una fotografia (es. del worker che c'era prima nello slot)."""
+        for name, entries in snapshot.items():
+            metric = self._metrics.get(name)
+            if isinstance(metric, (Counter, Histogram)):
+                metric.absorb(self._decode(entries))
+
+    def render(self, others: Sequence[Dict[str, Any]] = ()) -> str:
+        """Testo per /metrics: i valori di questo processo più le fotografie `others`."""
+        lines: List[str] = []
+        for name, metric in self._metrics.items():
+            lines.extend(metric.header())
+            lines.extend(metric.samples([self._decode(o[name]) for o in others if name in o]))
+        return '\n'.join(lines) + '\n'
+
+
+class SharedSnapshots:
+    """Uno slot di memoria condivisa per worker, creato prima del fork.
+
+    Ogni slot contiene (seq, lunghezza, JSON): chi scrive rende `seq` dispari
+    durante la scrittura, chi legge riprova se lo trova dispari o cambiato.
+    """
+
+    _HEADER = struct.Struct('<II')
+
+    def __init__(self, slots: int, slot_bytes: int = 1 << 20):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self._map = mmap.mmap(-1, slots * slot_bytes)
+
+    def write(self, slot: int, snapshot: Dict[str, Any]) -> bool:
+        data = json.dumps(snapshot, separators=(',', ':')).encode('utf-8')
+        if len(data) > self.slot_bytes - self._HEADER.size:
+            return False
+        base = slot * self.slot_bytes
+        seq, _ = self._HEADER.unpack_from(self._map, base)
+        self._HEADER.pack_into(self._map, base, seq + 1, 0)
+        self._map[base + self._HEADER.size:base + self._HEADER.size + len(data)] = data
+        self._HEADER.pack_into(self._map, base, seq + 2, len(data))
+        return True
+
+    def read(self, slot: int, retries: int = 3) -> Optional[Dict[str, Any]]:
+        base = slot * self.slot_bytes
+        for _ in range(retries):
+            seq, length = self._HEADER.unpack_from(self._map, base)
+            if seq % 2:  # scrittura in corso
+                time.sleep(0.001)
+                continue
+            if not length:
+                return None  # slot mai scritto
+            data = self._map[base + self._HEADER.size:base + self._HEADER.size + length]
+            if self._HEADER.unpack_from(self._map, base)[0] == seq:
+                return json.loads(data)
+        return None
+
+    def others(self, slot: int) -> List[Dict[str, Any]]:
+        """Fotografie di tutti gli slot tranne `slot` (quello del processo che risponde)."""
+        snapshots = (self.read(s) for s in range(self.slots) if s != slot)
+        return [s for s in snapshots if s]
+
+
+# =============================================================================
+# METRICHE STANDARD
+# =============================================================================
+REGISTRY = MetricsRegistry()
+
+ACTION_REQUESTS = REGISTRY.counter(
+    'peppebot_action_requests_total', "Richieste ricevute per action.", ['action'])
+ACTION_ERRORS = REGISTRY.counter(
+    'peppebot_action_errors_total', "Richieste fallite per action e motivo (status HTTP, busy, timeout).",
+    ['action', 'reason'])
+ACTION_SECONDS = REGISTRY.histogram(
+    'peppebot_action_seconds', "Durata totale della richiesta per action.", ['action'])
+PHASE_SECONDS = REGISTRY.histogram(
+    'peppebot_action_phase_seconds', "Durata delle fasi delle action (filter, extract, fuzzy, topk, coverage, render).",
+    ['action', 'phase'])
+FUZZY_CORRECTIONS = REGISTRY.counter(
+    'peppebot_fuzzy_corrections_total', "Termini corretti dal fuzzy matching.", ['kind'])
+ZERO_RESULTS = REGISTRY.counter(
+    'peppebot_zero_result_queries_total', "Ricerche senza risultati.", ['action'])
+BATCH_QUERIES = REGISTRY.counter(
+    'peppebot_batch_queries_total', "Query ricevute dall'endpoint batch per tipo (svuota_frigo, nutrition, error).",
+    ['kind'])
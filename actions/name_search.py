@@ -0,0 +1,147 @@
+# Ricerca per nome delle ricette.
+#
+# Il fuzzy matching classico (process.extractOne su tutti i nomi) costa secondi
+# su cataloghi grandi: qui i nomi vengono indicizzati per trigrammi di caratteri,
+# così il punteggio esatto viene calcolato solo su un piccolo insieme di candidati.
+
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np  # type: ignore
+from fuzzywuzzy import process, fuzz  # type: ignore
+
+from .catalog import EMPTY_POSTING, build_posting_index, intersect_postings
+from .records import PackedStrings
+
+_SPAZI = re.compile(r'\s+')
+_PAROLE = re.compile(r'\w+')
+
+
+def normalize_name(name: str) -> str:
+    """Nome in minuscolo con spazi singoli (forma usata da tutti gli indici sui nomi)."""
+    return _SPAZI.sub(' ', str(name).lower()).strip()
+
+
+def tokenize(name: str) -> List[str]:
+    """Parole di un nome già normalizzato."""
+    return _PAROLE.findall(name)
+
+
+def trigrams(text: str) -> List[str]:
+    """Trigrammi di caratteri del testo, con padding per dare peso a inizio e fine parola."""
+    padded = f"  {text} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+class TrigramNameMatcher:
+    """Indice trigramma -> nomi, per correggere i refusi sui nomi delle ricette.
+
+    I nomi vengono normalizzati e deduplicati (restano nell'ordine in cui arrivano,
+    quindi in ordine di classifica). Una query conta i trigrammi in comune con ogni
+    nome, tiene i `max_candidates` migliori e solo su questi calcola il punteggio
+    fuzzy vero e proprio (lo stesso WRatio usato da process.extractOne).
+    """
+
+    def __init__(self, names: Iterable[str], max_candidates: int = 50):
+        unique = list(dict.fromkeys(normalize_name(n) for n in names))
+        self.max_candidates = max_candidates
+
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for name_id, name in enumerate(unique):
+            for gram in set(trigrams(name)):
+                postings[gram].append(name_id)
+        self.index: Dict[str, np.ndarray] = {
+            gram: np.asarray(ids, dtype=np.int32) for gram, ids in postings.items()
+        }
+        self.names: Sequence[str] = PackedStrings.from_strings(unique)
+
+    @classmethod
+    def from_parts(cls, names: Sequence[str], index: Dict[str, np.ndarray],
+                   max_candidates: int = 50) -> "TrigramNameMatcher":
+        """Ricostruisce il matcher da nomi e indice già pronti (es. letti da uno snapshot)."""
+        matcher = cls.__new__(cls)
+        matcher.names = names
+        matcher.index = index
+        matcher.max_candidates = max_candidates
+        return matcher
+
+    def candidates(self, query: str) -> List[str]:
+        """Nomi che condividono più trigrammi con la query (al massimo max_candidates)."""
+        lists = [self.index[g] for g in set(trigrams(normalize_name(query))) if g in self.index]
+        if not lists:
+            return []
+
+        counts = np.bincount(np.concatenate(lists), minlength=len(self.names))
+        n_found = int(np.count_nonzero(counts))
+        n_keep = min(self.max_candidates, n_found)
+        if n_keep < n_found:
+            best_ids = np.argpartition(-counts, n_keep - 1)[:n_keep]
+        else:
+            best_ids = np.flatnonzero(counts)
+        return [self.names[i] for i in best_ids]
+
+    def suggest(self, query: str, limit: int = 5, threshold: int = 60) -> List[Tuple[str, int]]:
+        """Fino a `limit` nomi (normalizzati) con punteggio >= threshold, dal più simile."""
+        choices = self.candidates(query)
+        if not choices:
+            return []
+        return process.extractBests(query, choices, scorer=fuzz.WRatio,
+                                    score_cutoff=threshold, limit=limit)
+
+
+class NameIndex:
+    """Indice per parole e prefissi sui nomi delle ricette (sostituisce str.contains).
+
+    Ogni parola dei nomi punta alle posizioni delle ricette che la contengono; il
+    vocabolario ordinato permette di trovare con una ricerca binaria tutte le parole
+    che iniziano con un prefisso. Una query restituisce le ricette che hanno, per ogni
+    parola cercata, una parola che inizia così, e infine controlla che il testo cercato
+    compaia davvero nel nome: "bread" trova sia "Bread" che "Banana Bread", come prima.
+    Unica differenza rispetto alla scansione completa: i match a metà parola
+    ("cornbread" cercando "bread") non vengono più trovati.
+    """
+
+    def __init__(self, names: Sequence[str]):
+        # Nome normalizzato per POSIZIONE della ricetta nel dataset
+        normalized = [normalize_name(n) for n in names]
+        self.postings: Dict[str, np.ndarray] = build_posting_index(tokenize(n) for n in normalized)
+        self.vocab: List[str] = sorted(self.postings)
+        self.names: Sequence[str] = PackedStrings.from_strings(normalized)
+
+    @classmethod
+    def from_parts(cls, names: Sequence[str], postings: Dict[str, np.ndarray], vocab: List[str]) -> "NameIndex":
+        """Ricostruisce l'indice da parti già pronte (es. lette da uno snapshot); `vocab` è ordinato."""
+        index = cls.__new__(cls)
+        index.names = names
+        index.postings = postings
+        index.vocab = vocab
+        return index
+
+    def prefix_postings(self, prefix: str) -> np.ndarray:
+        """Posizioni (ordinate) delle ricette con almeno una parola che inizia con `prefix`."""
+        lo = bisect_left(self.vocab, prefix)
+        hi = bisect_left(self.vocab, prefix + '\uffff', lo)
+        lists = [self.postings[token] for token in self.vocab[lo:hi]]
+        if not lists:
+            return EMPTY_POSTING
+        if len(lists) == 1:
+            return lists[0]
+        # Unione tramite maschera booleana: lineare, senza ordinare la concatenazione
+        mask = np.zeros(len(self.names), dtype=bool)
+        for positions in lists:
+            mask[positions] = True
+        return np.flatnonzero(mask).astype(np.int32)
+
+    def search(self, query: str) -> np.ndarray:
+        """Posizioni (in ordine di classifica) delle ricette il cui nome contiene `query`."""
+        text = normalize_name(query)
+        tokens = tokenize(text)
+        if not tokens:
+            return EMPTY_POSTING
+
+        candidates = intersect_postings([self.prefix_postings(t) for t in tokens])
+        names = self.names
+        keep = [text in names[p] for p in candidates.tolist()]
+        return candidates[np.asarray(keep, dtype=bool)] if keep else EMPTY_POSTING
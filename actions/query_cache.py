@@ -0,0 +1,76 @@
+# Cache condivisa dei risultati delle ricerche.
+#
+# Molti utenti fanno le stesse domande ("vegan", "chicken + garlic sotto i 30
+# minuti", ...). Il risultato di una ricerca dipende solo dalla forma canonica
+# della query (insiemi ordinati di ingredienti e tag, limite di tempo, action)
+# e dalla versione del catalogo: lo memorizziamo come lista ordinata di ID
+# ricetta (non come testo già formattato), in una LRU di dimensione limitata
+# con scadenza opzionale.
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+
+def query_key(action: str, ingredients: Iterable[str] = (), tags: Iterable[str] = (),
+              time_limit: Optional[int] = None) -> Tuple:
+    """Forma canonica di una query: l'ordine e i duplicati dei termini non contano."""
+    return (action,
+            tuple(sorted({i.lower().strip() for i in ingredients})),
+            tuple(sorted({t.lower().strip() for t in tags})),
+            None if time_limit is None else int(time_limit))
+
+
+class QueryCache:
+    """LRU thread-safe (le action girano sul pool di worker) legata a una versione del catalogo.
+
+    Le voci appartengono alla versione con cui sono state calcolate: alla prima
+    richiesta con una versione diversa (dopo un reload) la cache viene svuotata.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl  # secondi; None = le voci scadono solo per LRU o reload
+        self.version: Optional[str] = None
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _check_version(self, version: str) -> None:
+        if version != self.version:
+            self._entries.clear()
+            self.version = version
+
+    def get(self, version: str, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, version: str, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / total if total else 0.0, 'version': self.version}
@@ -0,0 +1,231 @@
+# Accesso compatto alle ricette per costruire le risposte.
+#
+# Le action mostravano i risultati con DATASET.loc[...] e iterrows(), che creano
+# una Series pandas per ogni riga. Il RecipeStore tiene invece le colonne come
+# array numpy (le stesse del dataframe o dello snapshot in memory-map, senza
+# copie) più le stringhe già pronte per la visualizzazione (nome con le
+# maiuscole), e restituisce RecipeRecord: viste leggere con __slots__ che si
+# leggono come una riga (`row['minutes']`) senza passare da pandas.
+#
+# Le stringhe (nomi, titoli, testo delle schede) non sono tenute come oggetti
+# str, che costano ~50 byte di intestazione l'uno più il puntatore nella lista:
+# PackedStrings le concatena in un unico buffer UTF-8 con gli offset di ogni
+# riga e decodifica solo quella richiesta. Il buffer può stare in RAM oppure in
+# un file in memory-map (snapshot o file temporaneo per il testo "freddo").
+
+import mmap
+import os
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+import numpy as np  # type: ignore
+import pandas as pd  # type: ignore
+
+LIST_TEXT_COLUMNS = ('tags', 'ingredients', 'steps')  # colonne "['a', 'b']" mostrate come "a, b"
+
+
+def display_number(value) -> str:
+    """Numero da mostrare: gli interi così come sono, i decimali arrotondati a 2 cifre ("30", "4.96", "5.0").
+
+    Le colonne decimali sono float32: in un f-string passerebbero da float e
+    mostrerebbero artefatti come 4.960000038146973.
+    """
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))
+    return str(round(float(value), 2))
+
+
+def display_list_text(raw: str) -> str:
+    """Da "['onion', 'garlic']" a "onion, garlic" (testo pronto per la scheda ricetta)."""
+    return raw.replace('[', '').replace(']', '').replace("'", "").replace('"', "")
+
+
+class PackedStrings:
+    """Sequenza immutabile di stringhe: un buffer UTF-8 più gli offset in byte di ogni riga."""
+
+    __slots__ = ('blob', 'offsets')
+
+    def __init__(self, blob: Union[bytes, mmap.mmap], offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, values: Iterable[str]) -> "PackedStrings":
+        encoded = [v.encode('utf-8') for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        return cls(b''.join(encoded), offsets)
+
+    @classmethod
+    def open(cls, blob_path: str, offsets_path: str) -> "PackedStrings":
+        """Colonna scritta da save(), aperta in memory-map (nessun testo in RAM)."""
+        offsets = np.load(offsets_path, mmap_mode='r')
+        with open(blob_path, 'rb') as f:
+            blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(blob_path) else b''
+        return cls(blob, offsets)
+
+    @classmethod
+    def spill(cls, values: Iterable[str], directory: Optional[str] = None) -> "PackedStrings":
+        """Scrive le stringhe in un file temporaneo (già cancellato) e lo apre in memory-map.
+
+        Le pagine vengono lette solo quando servono e il kernel può scartarle
+        sotto pressione di memoria; i worker creati con fork le condividono.
+        Il file sta in TMPDIR (o in `directory`): meglio un disco che un tmpfs.
+        """
+        writer = StringSpill(directory)
+        writer.append(values)
+        return writer.finish()
+
+    def take(self, order: np.ndarray, directory: Optional[str] = None, block: int = 65536) -> "PackedStrings":
+        """Le stesse stringhe nell'ordine `order`, copiate byte per byte in un nuovo file temporaneo.
+
+        Niente decodifica e niente oggetti str: si copiano i tratti del buffer a
+        blocchi di righe. Le pagine del buffer di partenza lette a ogni blocco
+        vengono rilasciate subito (madvise), così non restano nella RSS.
+        """
+        writer = StringSpill(directory)
+        starts, ends = self.offsets[:-1], self.offsets[1:]
+        release = getattr(self.blob, 'madvise', None) if hasattr(mmap, 'MADV_DONTNEED') else None
+        for i in range(0, len(order), block):
+            rows = order[i:i + block]
+            row_starts, row_ends = starts[rows], ends[rows]
+            blob = self.blob
+            writer.append_encoded(b''.join(blob[a:b] for a, b in zip(row_starts.tolist(), row_ends.tolist())),
+                                  row_ends - row_starts)
+            if release is not None and len(self.blob):
+                release(mmap.MADV_DONTNEED)
+        return writer.finish()
+
+    def save(self, blob_path: str, offsets_path: str) -> None:
+        with open(blob_path, 'wb') as f:
+            f.write(self.blob)
+        np.save(offsets_path, np.asarray(self.offsets, dtype=np.int64))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.blob) + self.offsets.nbytes
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, pos: int) -> str:
+        start, end = int(self.offsets[pos]), int(self.offsets[pos + 1])
+        return self.blob[start:end].decode('utf-8')
+
+    def __iter__(self) -> Iterator[str]:
+        blob = self.blob
+        offsets = self.offsets.tolist()
+        for start, end in zip(offsets, offsets[1:]):
+            yield blob[start:end].decode('utf-8')
+
+
+class StringSpill:
+    """PackedStrings scritte un blocco alla volta in un file temporaneo (vedi PackedStrings.spill)."""
+
+    __slots__ = ('_file', '_lengths')
+
+    def __init__(self, directory: Optional[str] = None):
+        self._file = tempfile.TemporaryFile(dir=directory)
+        self._lengths: List[np.ndarray] = []
+
+    def append(self, values: Iterable[str]) -> None:
+        lengths: List[int] = []
+        for value in values:
+            data = value.encode('utf-8')
+            self._file.write(data)
+            lengths.append(len(data))
+        self._lengths.append(np.asarray(lengths, dtype=np.int64))
+
+    def append_encoded(self, data: bytes, lengths: np.ndarray) -> None:
+        """Righe già codificate e concatenate, con la lunghezza in byte di ognuna."""
+        self._file.write(data)
+        self._lengths.append(np.asarray(lengths, dtype=np.int64))
+
+    def finish(self) -> PackedStrings:
+        """Chiude il file (già cancellato dal disco) e lo apre in memory-map."""
+        with self._file as f:
+            f.flush()
+            blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if f.tell() else b''
+        lengths = np.concatenate(self._lengths) if self._lengths else np.empty(0, dtype=np.int64)
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        self._lengths = []
+        return PackedStrings(blob, offsets)
+
+
+class RecipeRecord:
+    """Vista su una ricetta (nessun dato copiato): `record['calories']`, `record.title`, ..."""
+
+    __slots__ = ('_store', 'pos')
+
+    def __init__(self, store: "RecipeStore", pos: int):
+        self._store = store
+        self.pos = pos
+
+    @property
+    def id(self) -> int:
+        return int(self._store.ids[self.pos])
+
+    @property
+    def name(self) -> str:
+        return self._store.names[self.pos]
+
+    @property
+    def title(self) -> str:
+        return self._store.titles[self.pos]
+
+    def __getitem__(self, column: str):
+        if column == 'name':
+            return self.name
+        return self._store.columns[column][self.pos]
+
+    def __contains__(self, column: str) -> bool:
+        return column == 'name' or column in self._store.columns
+
+
+class RecipeStore:
+    """Colonne delle ricette per POSIZIONE (ordine di classifica) e ricerca ID -> posizione."""
+
+    def __init__(self, ids: np.ndarray, names: Sequence[str], titles: Sequence[str],
+                 columns: Dict[str, np.ndarray]):
+        # `names` e `titles` sono di solito PackedStrings, ma basta una sequenza
+        self.ids = ids
+        self.names = names
+        self.titles = titles
+        self.columns = columns
+        # ID ordinati (con la posizione di ognuno) per cercare un ID con una ricerca binaria
+        self._id_order = np.argsort(ids, kind='stable')
+        self._sorted_ids = ids[self._id_order]
+
+    @classmethod
+    def from_frame(cls, dataset: pd.DataFrame, names: Sequence[str]) -> "RecipeStore":
+        """Colonne numeriche dal dataframe (senza copie); nomi e titoli impacchettati."""
+        columns = {c: dataset[c].to_numpy() for c in dataset.columns if c != 'name'}
+        return cls(dataset.index.to_numpy(dtype=np.int64), PackedStrings.from_strings(names),
+                   PackedStrings.from_strings(n.title() for n in names), columns)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def position(self, recipe_id: int) -> Optional[int]:
+        """Posizione della ricetta con questo ID (None se non esiste)."""
+        i = int(np.searchsorted(self._sorted_ids, recipe_id))
+        if i < len(self._sorted_ids) and self._sorted_ids[i] == recipe_id:
+            return int(self._id_order[i])
+        return None
+
+    def positions(self, recipe_ids: Iterable[int]) -> np.ndarray:
+        """Posizioni degli ID (nello stesso ordine), saltando quelli che non esistono più."""
+        recipe_ids = np.asarray(list(recipe_ids), dtype=np.int64)
+        i = np.minimum(np.searchsorted(self._sorted_ids, recipe_ids), max(len(self._sorted_ids) - 1, 0))
+        found = self._sorted_ids[i] == recipe_ids if len(self._sorted_ids) else np.zeros(len(recipe_ids), bool)
+        return self._id_order[i[found]].astype(np.int32)
+
+    def record(self, pos: int) -> RecipeRecord:
+        return RecipeRecord(self, int(pos))
+
+    def records(self, positions: Iterable[int]) -> List[RecipeRecord]:
+        return [RecipeRecord(self, int(p)) for p in positions]
+
+    def by_ids(self, recipe_ids: Iterable[int]) -> List[RecipeRecord]:
+        return self.records(self.positions(recipe_ids))
@@ -0,0 +1,314 @@
+# Server delle action multi-processo (pre-fork) con un solo catalogo condiviso.
+#
+#     python -m actions.server [--workers 4] [--port 5055]
+#
+# Con `rasa run actions` ogni processo carica il proprio catalogo, quindi la
+# memoria cresce con il numero di worker. Qui il catalogo e tutti gli indici
+# vengono caricati UNA volta nel processo supervisore, che poi fa fork() dei
+# worker: le pagine (array numpy, snapshot in memory-map, bitmap) restano
+# condivise in copy-on-write e nessun worker le modifica. Il supervisore:
+#   - riavvia i worker che terminano (con attesa crescente se continuano a cadere);
+#   - uccide e riavvia i worker bloccati (heartbeat fermo da troppo tempo);
+#   - quando il catalogo cambia (controllo periodico o `kill -HUP <pid>`) lo
+#     ricarica una volta e riavvia i worker uno alla volta (rolling restart).
+# Controllo e SIGHUP li gestisce il ciclo principale del supervisore, senza il
+# thread di CatalogManager.watch(): un fork con altri thread vivi potrebbe
+# ereditare un lock preso e bloccarsi.
+#
+# Accanto al webhook ogni worker espone /metrics (formato Prometheus): i valori
+# sono quelli di tutti i worker, che li copiano in memoria condivisa a ogni
+# heartbeat (vedi metrics.py), e POST /recipes/batch per le ricerche in blocco
+# (vedi batch.py).
+#
+# Funziona solo su sistemi con fork() (Linux, macOS).
+
+import argparse
+import asyncio
+import gc
+import inspect
+import mmap
+import os
+import signal
+import socket
+import time
+from typing import Callable, Dict
+
+import numpy as np  # type: ignore
+
+from .actions import CATALOG_MANAGER, RELOAD_CHECK_SECONDS, RESULT_CURSORS
+from .batch import install_batch
+from .metrics import ACTION_ERRORS, ACTION_REQUESTS, ACTION_SECONDS, REGISTRY, SharedSnapshots
+
+DEFAULT_HOST = '0.0.0.0'
+DEFAULT_PORT = 5055
+DEFAULT_WORKERS = 4
+HEARTBEAT_SECONDS = 2.0  # ogni quanto un worker segnala di essere vivo
+HEALTH_TIMEOUT_SECONDS = 30.0  # heartbeat più vecchio di così = worker bloccato
+SHUTDOWN_GRACE_SECONDS = 15.0  # tempo concesso alle richieste in corso quando un worker si ferma
+MAX_RESTART_BACKOFF_SECONDS = 30.0
+
+
+# =============================================================================
+# WORKER
+# =============================================================================
+def create_action_app(package: str):
+    """App Sanic di rasa_sdk con le action del package (compatibile con le varie versioni di rasa_sdk)."""
+    from rasa_sdk.endpoint import create_app  # type: ignore
+    from rasa_sdk.executor import ActionExecutor  # type: ignore
+
+    if 'action_executor' in inspect.signature(create_app).parameters:
+        executor = ActionExecutor()
+        executor.register_package(package)
+        return create_app(executor)
+    return create_app(package)
+
+
+def install_metrics(app, render: Callable[[], str]) -> None:
+    """Richieste, errori e durata di ogni action (middleware sul webhook) ed endpoint /metrics."""
+    from sanic import response  # type: ignore
+
+    @app.middleware('request')
+    async def start_timer(request):
+        if request.path == '/webhook':
+            request.ctx.started = time.perf_counter()
+
+    @app.middleware('response')
+    async def observe(request, resp):
+        started = getattr(request.ctx, 'started', None)
+        if started is None:
+            return
+        try:
+            action = (request.json or {}).get('next_action') or 'unknown'
+        except Exception:  # corpo compresso o non JSON
+            action = 'unknown'
+        ACTION_REQUESTS.inc(action)
+        ACTION_SECONDS.observe(time.perf_counter() - started, action)
+        if resp is not None and resp.status >= 400:
+            ACTION_ERRORS.inc(action, str(resp.status))
+
+    @app.get('/metrics')
+    async def metrics(_):
+        return response.text(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+async def _serve(app, sock: socket.socket, slot: int, heartbeats: np.ndarray,
+                 snapshots: SharedSnapshots) -> None:
+    server = await app.create_server(sock=sock, return_asyncio_server=True, access_log=False)
+    await server.startup()
+    await server.before_start()
+    await server.after_start()
+
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+
+    # Heartbeat nella memoria condivisa: se l'event loop si blocca, smette di aggiornarsi.
+    # Insieme all'heartbeat si pubblicano le metriche di questo worker.
+    while not stop.is_set():
+        heartbeats[slot] = time.monotonic()
+        snapshots.write(slot, REGISTRY.snapshot())
+        try:
+            await asyncio.wait_for(stop.wait(), HEARTBEAT_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+    # Arresto graduale: niente nuove connessioni, si aspettano quelle in corso
+    await server.before_stop()
+    server.close()
+    deadline = time.monotonic() + SHUTDOWN_GRACE_SECONDS
+    while server.connections and time.monotonic() < deadline:
+        for conn in list(server.connections):
+            conn.close_if_idle()
+        await asyncio.sleep(0.1)
+    await server.after_stop()
+    snapshots.write(slot, REGISTRY.snapshot())
+
+
+def _worker_main(package: str, sock: socket.socket, slot: int, heartbeats: np.ndarray,
+                 snapshots: SharedSnapshots) -> None:
+    # Ctrl+C e SIGHUP li gestisce il supervisore; SIGTERM ferma il worker
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    # I contatori del worker precedente nello stesso slot (riavvio) non si perdono:
+    # per Prometheus un contatore che torna indietro sarebbe un reset
+    previous = snapshots.read(slot)
+    if previous:
+        REGISTRY.absorb(previous)
+    # I token "show more" creati qui vanno nella regione di questo slot della tabella condivisa
+    RESULT_CURSORS.attach(slot)
+
+    app = create_action_app(package)
+    install_metrics(app, lambda: REGISTRY.render(snapshots.others(slot)))
+    install_batch(app)
+    asyncio.run(_serve(app, sock, slot, heartbeats, snapshots))
+
+
+# =============================================================================
+# SUPERVISORE
+# =============================================================================
+class Supervisor:
+    """Processo padre: possiede il catalogo e la socket, avvia e controlla i worker."""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, host: str = DEFAULT_HOST,
+                 port: int = DEFAULT_PORT, package: str = 'actions'):
+        self.n_workers = workers
+        self.host = host
+        self.port = port
+        self.package = package
+        self.pids: Dict[int, int] = {}  # pid -> slot
+        self.failures = [0] * workers  # crash consecutivi per slot
+        self.restart_at: Dict[int, float] = {}  # slot -> quando riavviarlo (dopo l'attesa)
+        self.running = False
+        self.reload_requested = False
+        # Un float64 per worker in memoria condivisa anonima (ereditata dai fork)
+        self._heartbeat_map = mmap.mmap(-1, 8 * workers)
+        self.heartbeats = np.frombuffer(self._heartbeat_map, dtype=np.float64)
+        # Metriche di ogni worker, lette da chi risponde a /metrics
+        self.metrics = SharedSnapshots(workers)
+        # Ricerche sfogliabili ("show more"): ogni worker risolve i token creati dagli altri
+        RESULT_CURSORS.share(workers)
+
+    def _bind(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(1024)
+        sock.set_inheritable(True)
+        return sock
+
+    def _spawn(self, slot: int) -> None:
+        self.heartbeats[slot] = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _worker_main(self.package, self.sock, slot, self.heartbeats, self.metrics)
+            except BaseException as e:
+                print(f"❌ Worker {slot} terminato con errore: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        self.pids[pid] = slot
+        print(f"👷 Worker {slot} avviato (pid {pid})")
+
+    def _stop_worker(self, pid: int) -> None:
+        """SIGTERM e attesa dell'arresto graduale (SIGKILL se non basta)."""
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        deadline = time.monotonic() + SHUTDOWN_GRACE_SECONDS + 5
+        while time.monotonic() < deadline:
+            done, _ = os.waitpid(pid, os.WNOHANG)
+            if done:
+                break
+            time.sleep(0.1)
+        else:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.pids.pop(pid, None)
+
+    def _reap(self) -> None:
+        """Programma il riavvio dei worker terminati, più in là se lo stesso slot continua a cadere.
+
+        L'attesa non blocca il ciclo principale: il riavvio lo fa _restart_due
+        quando è il momento.
+        """
+        while self.pids:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if not pid:
+                return
+            slot = self.pids.pop(pid, None)
+            if slot is None or not self.running:
+                continue
+            self.failures[slot] += 1
+            backoff = min(MAX_RESTART_BACKOFF_SECONDS, 0.5 * 2 ** (self.failures[slot] - 1))
+            print(f"⚠️ Worker {slot} (pid {pid}) terminato (stato {status}): riavvio tra {backoff:.1f}s")
+            self.restart_at[slot] = time.monotonic() + backoff
+
+    def _restart_due(self) -> None:
+        """Riavvia gli slot la cui attesa è finita (nessuno se il supervisore si sta fermando)."""
+        now = time.monotonic()
+        for slot, when in list(self.restart_at.items()):
+            if not self.running:
+                return
+            if when <= now:
+                del self.restart_at[slot]
+                self._spawn(slot)
+
+    def _check_health(self) -> None:
+        now = time.monotonic()
+        for pid, slot in list(self.pids.items()):
+            age = now - self.heartbeats[slot]
+            if age > HEALTH_TIMEOUT_SECONDS:
+                print(f"🩺 Worker {slot} (pid {pid}) non risponde da {age:.0f}s: riavvio")
+                os.kill(pid, signal.SIGKILL)
+            elif age < 2 * HEARTBEAT_SECONDS:
+                self.failures[slot] = 0  # di nuovo in salute
+
+    def _rolling_restart(self) -> None:
+        """Un worker alla volta: gli altri continuano a servire le richieste."""
+        gc.freeze()
+        for pid, slot in list(self.pids.items()):
+            self._stop_worker(pid)
+            self._spawn(slot)
+
+    def run(self) -> None:
+        if CATALOG_MANAGER.current() is None:
+            raise SystemExit("❌ Catalogo non disponibile: impossibile avviare i worker")
+
+        # I reload li decide il supervisore: nei worker le action non li avviano
+        CATALOG_MANAGER.auto_start = False
+        self.sock = self._bind()
+        self.running = True
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, 'running', False))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, 'running', False))
+        signal.signal(signal.SIGHUP, lambda *_: setattr(self, 'reload_requested', True))
+
+        # Gli oggetti già creati (catalogo compreso) escono dal garbage collector:
+        # così i worker non ne toccano le pagine e restano condivise
+        gc.freeze()
+        for slot in range(self.n_workers):
+            self._spawn(slot)
+        print(f"🚀 Server delle action su http://{self.host}:{self.port} con {self.n_workers} worker "
+              f"(catalogo {CATALOG_MANAGER.current().version})")
+
+        catalog = CATALOG_MANAGER.current()
+        next_check = time.monotonic() + RELOAD_CHECK_SECONDS
+        try:
+            while self.running:
+                time.sleep(0.5)
+                self._reap()
+                self._restart_due()
+                self._check_health()
+
+                if self.reload_requested:
+                    self.reload_requested = False
+                    CATALOG_MANAGER.reload(force=True)
+                elif RELOAD_CHECK_SECONDS > 0 and time.monotonic() >= next_check:
+                    next_check = time.monotonic() + RELOAD_CHECK_SECONDS
+                    CATALOG_MANAGER.reload()
+                # Nuova versione (da SIGHUP o dal controllo periodico): nuovi worker
+                if CATALOG_MANAGER.current() is not catalog:
+                    catalog = CATALOG_MANAGER.current()
+                    self._rolling_restart()
+        finally:
+            self.running = False
+            print("🛑 Arresto dei worker...")
+            for pid in list(self.pids):
+                self._stop_worker(pid)
+            self.sock.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Server delle action con più worker e catalogo condiviso")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    Supervisor(workers=args.workers, host=args.host, port=args.port).run()
+
+
+if __name__ == '__main__':
+    main()
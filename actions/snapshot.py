@@ -0,0 +1,280 @@
+# Snapshot binario del catalogo ricette.
+#
+# Leggere il CSV e costruire gli indici costa secondi a ogni avvio del server
+# delle action. Con questo modulo il lavoro si fa una volta sola, offline:
+#
+#     python -m actions.snapshot [percorso_csv] [cartella_snapshot]
+#
+# scrive una cartella con array numerici .npy, vocabolari, liste in formato CSR
+# (codici + offset) e indici già pronti. All'avvio la cartella viene aperta in
+# memory-map: niente parsing, e più worker sulla stessa macchina condividono le
+# stesse pagine tramite la page cache. Se lo snapshot manca o non corrisponde
+# più al CSV (controllo tramite hash del file) si torna al caricamento dal CSV.
+
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np  # type: ignore
+import pandas as pd  # type: ignore
+
+from .loader import Catalog, load_csv_catalog
+from .name_search import NameIndex, TrigramNameMatcher
+from .macro_search import MacroSearchEngine
+from .menus import COURSES, MenuTable
+from .records import PackedStrings, RecipeStore
+
+PERCORSO_DATASET = 'dataset/dataset_svuotafrigo_finale.csv'
+PERCORSO_SNAPSHOT = 'dataset/catalog.snapshot'
+SNAPSHOT_VERSION = 5
+MANIFEST = 'manifest.json'
+_SEP = '\x00'  # separatore per le liste di stringhe lette per intero (vocabolari)
+
+
+# =============================================================================
+# FIRMA DEL CSV SORGENTE
+# =============================================================================
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_signature(path: str) -> Dict[str, object]:
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns, 'sha256': file_sha256(path)}
+
+
+def read_manifest(snapshot_dir: str) -> Optional[Dict[str, object]]:
+    try:
+        with open(os.path.join(snapshot_dir, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_fresh(snapshot_dir: str, csv_path: str) -> bool:
+    """True se lo snapshot esiste, ha la versione giusta e corrisponde al CSV.
+
+    Se dimensione e data di modifica coincidono non serve ricalcolare l'hash;
+    altrimenti lo snapshot è valido solo se l'hash del contenuto è lo stesso.
+    Senza CSV lo snapshot (se della versione giusta) è l'unica fonte e viene usato.
+    """
+    manifest = read_manifest(snapshot_dir)
+    if not manifest or manifest.get('version') != SNAPSHOT_VERSION:
+        return False
+    if not os.path.exists(csv_path):
+        return True
+
+    source = manifest.get('source', {})
+    stat = os.stat(csv_path)
+    if source.get('size') == stat.st_size and source.get('mtime_ns') == stat.st_mtime_ns:
+        return True
+    return source.get('sha256') == file_sha256(csv_path)
+
+
+# =============================================================================
+# SCRITTURA
+# =============================================================================
+def _save_joined(path: str, strings: Sequence[str]) -> None:
+    with open(path, 'wb') as f:
+        f.write(_SEP.join(strings).encode('utf-8'))
+
+
+def _save_strings(snapshot_dir: str, name: str, values: Sequence[str]) -> None:
+    """Stringhe ad accesso casuale: un unico blob utf-8 più gli offset in byte di ogni riga."""
+    packed = values if isinstance(values, PackedStrings) else PackedStrings.from_strings(values)
+    packed.save(os.path.join(snapshot_dir, f'{name}.bin'), os.path.join(snapshot_dir, f'{name}.off.npy'))
+
+
+def _save_postings(snapshot_dir: str, name: str, postings: Dict[str, np.ndarray],
+                   vocab: Optional[List[str]] = None) -> None:
+    """Indice termine -> posizioni: vocabolario + posizioni concatenate + offset."""
+    vocab = list(postings) if vocab is None else vocab
+    offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum([len(postings[t]) for t in vocab], out=offsets[1:])
+    flat = np.concatenate([postings[t] for t in vocab]) if vocab else np.empty(0, dtype=np.int32)
+    _save_joined(os.path.join(snapshot_dir, f'{name}.vocab'), vocab)
+    np.save(os.path.join(snapshot_dir, f'{name}.postings.npy'), flat.astype(np.int32))
+    np.save(os.path.join(snapshot_dir, f'{name}.offsets.npy'), offsets)
+
+
+def save_snapshot(catalog: Catalog, snapshot_dir: str, csv_path: str) -> None:
+    """Scrive il catalogo (con tutti gli indici) nella cartella `snapshot_dir`.
+
+    Il manifest viene scritto per ultimo: uno snapshot interrotto a metà non
+    risulta mai valido.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    manifest_path = os.path.join(snapshot_dir, MANIFEST)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    def out(filename: str) -> str:
+        return os.path.join(snapshot_dir, filename)
+
+    dataset = catalog.dataset
+    numeric_columns = list(dataset.columns)
+
+    # Colonne del dataframe (ID e numeri, già nei tipi compatti), nomi e titoli
+    np.save(out('recipe_id.npy'), dataset.index.to_numpy(dtype=np.int64))
+    _save_strings(snapshot_dir, 'name', catalog.records.names)
+    _save_strings(snapshot_dir, 'title', catalog.records.titles)
+    for col in numeric_columns:
+        np.save(out(f'col_{col}.npy'), dataset[col].to_numpy())
+
+    # Testo lungo ad accesso casuale
+    for col, values in catalog.texts.items():
+        _save_strings(snapshot_dir, f'text_{col}', values)
+
+    # Liste di tag e ingredienti (CSR) e relativi indici
+    for name, (codes, offsets) in (('tags', catalog.tag_lists), ('ingredients', catalog.ingredient_lists)):
+        np.save(out(f'{name}.codes.npy'), codes)
+        np.save(out(f'{name}.row_offsets.npy'), offsets)
+    _save_postings(snapshot_dir, 'ingredients', catalog.ingredient_index)
+
+    tag_vocab = list(catalog.tag_bitmaps)
+    raw_bitmaps = [b.to_bytes((b.bit_length() + 7) // 8, 'little') for b in catalog.tag_bitmaps.values()]
+    bitmap_offsets = np.zeros(len(raw_bitmaps) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in raw_bitmaps], out=bitmap_offsets[1:])
+    _save_joined(out('tags.vocab'), tag_vocab)
+    with open(out('tags.bitmaps.bin'), 'wb') as f:
+        f.write(b''.join(raw_bitmaps))
+    np.save(out('tags.bitmaps.off.npy'), bitmap_offsets)
+
+    # Indici sui nomi
+    _save_strings(snapshot_dir, 'names.normalized', catalog.name_index.names)
+    _save_postings(snapshot_dir, 'names.tokens', catalog.name_index.postings, vocab=catalog.name_index.vocab)
+    _save_strings(snapshot_dir, 'trigram.names', catalog.name_matcher.names)
+    _save_postings(snapshot_dir, 'trigram', catalog.name_matcher.index)
+
+    # Matrice dei macronutrienti (già pulita dai NaN)
+    np.save(out('macros.npy'), catalog.macro_engine.matrix)
+
+    # Menu completi: una riga per tag (stesso ordine di tags.vocab), una colonna per portata
+    np.save(out('menus.npy'), catalog.menus.as_matrix(tag_vocab))
+
+    manifest = {
+        'version': SNAPSHOT_VERSION,
+        'created': datetime.now(timezone.utc).isoformat(),
+        'n_recipes': len(dataset),
+        'numeric_columns': numeric_columns,
+        'text_columns': list(catalog.texts),
+        'courses': [[name, tags] for name, tags in catalog.menus.courses],
+        'source': source_signature(csv_path),
+    }
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+
+# =============================================================================
+# LETTURA (memory-map)
+# =============================================================================
+def _load_joined(path: str) -> List[str]:
+    with open(path, 'rb') as f:
+        data = f.read().decode('utf-8')
+    return data.split(_SEP) if data else []
+
+
+def _load_postings(snapshot_dir: str, name: str) -> Tuple[List[str], Dict[str, np.ndarray]]:
+    vocab = _load_joined(os.path.join(snapshot_dir, f'{name}.vocab'))
+    flat = np.load(os.path.join(snapshot_dir, f'{name}.postings.npy'), mmap_mode='r')
+    offsets = np.load(os.path.join(snapshot_dir, f'{name}.offsets.npy')).tolist()
+    # Ogni posting list è una vista sull'array in memory-map (zero copie)
+    return vocab, {term: flat[offsets[i]:offsets[i + 1]] for i, term in enumerate(vocab)}
+
+
+def load_snapshot(snapshot_dir: str, use_kdtree: bool = False) -> Catalog:
+    """Apre uno snapshot scritto da save_snapshot."""
+    manifest = read_manifest(snapshot_dir)
+    if not manifest or manifest.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f"Snapshot non valido o di versione diversa: {snapshot_dir}")
+
+    def path(filename: str) -> str:
+        return os.path.join(snapshot_dir, filename)
+
+    def strings(name: str) -> PackedStrings:
+        return PackedStrings.open(path(f'{name}.bin'), path(f'{name}.off.npy'))
+
+    columns = {col: np.load(path(f'col_{col}.npy'), mmap_mode='r') for col in manifest['numeric_columns']}
+    recipe_ids = np.load(path('recipe_id.npy'))
+    dataset = pd.DataFrame(columns, index=recipe_ids, copy=False)
+    records = RecipeStore(recipe_ids, strings('name'), strings('title'), columns)
+
+    texts = {col: strings(f'text_{col}') for col in manifest['text_columns']}
+
+    lists = {name: (np.load(path(f'{name}.codes.npy'), mmap_mode='r'),
+                    np.load(path(f'{name}.row_offsets.npy'), mmap_mode='r'))
+             for name in ('tags', 'ingredients')}
+    _, ingredient_index = _load_postings(snapshot_dir, 'ingredients')
+
+    tag_vocab = _load_joined(path('tags.vocab'))
+    bitmap_offsets = np.load(path('tags.bitmaps.off.npy')).tolist()
+    with open(path('tags.bitmaps.bin'), 'rb') as f:
+        raw = f.read()
+    tag_bitmaps = {tag: int.from_bytes(raw[bitmap_offsets[i]:bitmap_offsets[i + 1]], 'little')
+                   for i, tag in enumerate(tag_vocab)}
+
+    token_vocab, token_postings = _load_postings(snapshot_dir, 'names.tokens')
+    name_index = NameIndex.from_parts(strings('names.normalized'), token_postings, token_vocab)
+    _, trigram_index = _load_postings(snapshot_dir, 'trigram')
+    name_matcher = TrigramNameMatcher.from_parts(strings('trigram.names'), trigram_index)
+
+    macro_engine = MacroSearchEngine(np.load(path('macros.npy'), mmap_mode='r'), use_kdtree=use_kdtree)
+
+    # Se le portate sono cambiate dopo la scrittura dello snapshot, i menu si ricalcolano
+    if manifest.get('courses') == [[name, tags] for name, tags in COURSES]:
+        menus = MenuTable(tag_bitmaps, COURSES, table=dict(zip(tag_vocab, np.load(path('menus.npy')))))
+    else:
+        menus = MenuTable.build(tag_bitmaps)
+
+    print(f"⚡ Catalogo caricato dallo snapshot {snapshot_dir}: {len(dataset)} ricette, "
+          f"{len(tag_bitmaps)} tag, {len(ingredient_index)} ingredienti")
+    return Catalog(
+        dataset=dataset,
+        texts=texts,
+        tag_bitmaps=tag_bitmaps,
+        ingredient_index=ingredient_index,
+        tag_lists=lists['tags'],
+        ingredient_lists=lists['ingredients'],
+        name_index=name_index,
+        name_matcher=name_matcher,
+        macro_engine=macro_engine,
+        menus=menus,
+        records=records,
+        source='snapshot',
+        version=str(manifest.get('source', {}).get('sha256', ''))[:12],
+    )
+
+
+def load_catalog(csv_path: str, snapshot_dir: str, use_kdtree: bool = False) -> Catalog:
+    """Usa lo snapshot se è aggiornato, altrimenti ricostruisce tutto dal CSV."""
+    if is_fresh(snapshot_dir, csv_path):
+        return load_snapshot(snapshot_dir, use_kdtree=use_kdtree)
+
+    if read_manifest(snapshot_dir) is not None:
+        print(f"⚠️ Snapshot {snapshot_dir} non aggiornato rispetto a {csv_path}: caricamento dal CSV")
+    print("💡 Per avvii più rapidi: python -m actions.snapshot")
+    catalog = load_csv_catalog(csv_path, use_kdtree=use_kdtree)
+    catalog.version = file_sha256(csv_path)[:12]
+    return catalog
+
+
+def compile_snapshot(csv_path: str, snapshot_dir: str) -> Catalog:
+    """Passo offline: legge il CSV, costruisce gli indici e scrive lo snapshot."""
+    catalog = load_csv_catalog(csv_path)
+    save_snapshot(catalog, snapshot_dir, csv_path)
+    print(f"💾 Snapshot scritto in {snapshot_dir} ({len(catalog.dataset)} ricette)")
+    return catalog
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    compile_snapshot(args[0] if args else PERCORSO_DATASET,
+                     args[1] if len(args) > 1 else PERCORSO_SNAPSHOT)
@@ -0,0 +1,168 @@
+# Generatore di cataloghi ricette sintetici (stesso schema del CSV reale).
+#
+#     python -m actions.synthetic [--rows 1000000] [--seed 0] [--chunk 50000] [percorso_csv]
+#
+# Il dataset vero (PERCORSO_DATASET) non è nel repository: per misurare le
+# prestazioni su qualsiasi macchina serve un catalogo riproducibile. Le righe
+# hanno le colonne che le action si aspettano (name, liste "['a', 'b']" di tags,
+# ingredients e steps, minutes, rating_medio, num_voti e i valori nutrizionali),
+# mentre ingredienti e tag vengono dai file lookup/, che sono ordinati dal più al
+# meno frequente: la probabilità di ogni voce segue una legge di Zipf sul suo
+# rango, così poche voci (salt, butter, ...) compaiono ovunque e la coda è lunga.
+#
+# Il CSV viene scritto a blocchi di `chunk` righe, ciascuno con il proprio
+# generatore derivato dal seed: la memoria non cresce con il numero di righe e,
+# a parità di seed e di chunk, il file è identico byte per byte.
+
+import argparse
+import csv
+import os
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np  # type: ignore
+
+from .vocabulary import LOOKUP_INGREDIENTS, LOOKUP_TAGS, read_lookup
+
+DEFAULT_ROWS = 100_000
+DEFAULT_CHUNK = 50_000
+DEFAULT_SKEW = 1.0  # esponente di Zipf: più alto = vocabolario più concentrato sulle prime voci
+
+COLUMNS = ['name', 'id', 'minutes', 'tags', 'n_steps', 'steps', 'ingredients', 'n_ingredients',
+           'calories', 'total_fat', 'sugar', 'sodium', 'protein', 'saturated_fat', 'carbohydrates',
+           'rating_medio', 'num_voti']
+
+_DISHES = ['salad', 'soup', 'pie', 'bread', 'stew', 'cake', 'pasta', 'curry', 'casserole',
+           'muffins', 'cookies', 'chili', 'sandwich', 'dip', 'sauce', 'tart', 'risotto', 'tacos']
+_STYLES = ['easy', 'quick', 'grandma s', 'spicy', 'creamy', 'homemade', 'crock pot', 'baked',
+           'healthy', 'low fat', 'best ever', 'italian', 'mexican', 'summer', 'holiday']
+_VERBS = ['mix', 'stir in', 'add', 'combine', 'whisk', 'pour over', 'season with', 'top with',
+          'fold in', 'saute', 'bake with', 'serve with']
+
+
+def zipf_weights(n: int, skew: float = DEFAULT_SKEW) -> np.ndarray:
+    weights = 1.0 / np.arange(1, n + 1) ** skew
+    return weights / weights.sum()
+
+
+def _as_list_text(items: Sequence[str]) -> str:
+    """Stesso formato delle colonne del CSV reale: "['onion', 'garlic']"."""
+    return str(list(items))
+
+
+class CatalogGenerator:
+    """Genera righe del catalogo a blocchi; il blocco k dipende solo da (seed, k)."""
+
+    def __init__(self, ingredients: Sequence[str], tags: Sequence[str], seed: int = 0,
+                 skew: float = DEFAULT_SKEW, chunk: int = DEFAULT_CHUNK):
+        self.ingredients = np.asarray(ingredients, dtype=object)
+        self.tags = np.asarray(tags, dtype=object)
+        self.p_ingredients = zipf_weights(len(ingredients), skew)
+        self.p_tags = zipf_weights(len(tags), skew)
+        self.seed = seed
+        self.chunk = chunk
+
+    @classmethod
+    def from_lookups(cls, seed: int = 0, skew: float = DEFAULT_SKEW, chunk: int = DEFAULT_CHUNK,
+                     ingredients_path: str = LOOKUP_INGREDIENTS, tags_path: str = LOOKUP_TAGS) -> "CatalogGenerator":
+        return cls(read_lookup(ingredients_path), read_lookup(tags_path), seed=seed, skew=skew, chunk=chunk)
+
+    def _sample_lists(self, rng: np.random.Generator, vocab: np.ndarray, p: np.ndarray,
+                      sizes: np.ndarray) -> List[List[str]]:
+        """Una lista per riga, di lunghezza `sizes[i]`, senza duplicati (l'ordine di estrazione resta)."""
+        pool = rng.choice(len(vocab), int(sizes.sum()), p=p)
+        ends = np.cumsum(sizes)
+        return [list(dict.fromkeys(vocab[pool[end - size:end]])) for size, end in zip(sizes, ends)]
+
+    def chunk_rows(self, k: int, n: int, first_id: int) -> Dict[str, list]:
+        """Colonne del blocco k (n righe, ID da first_id in poi)."""
+        rng = np.random.default_rng([self.seed, k])
+
+        ingredient_lists = self._sample_lists(rng, self.ingredients, self.p_ingredients, rng.integers(3, 16, n))
+        tag_lists = self._sample_lists(rng, self.tags, self.p_tags, rng.integers(4, 20, n))
+
+        # Nome: stile opzionale + un ingrediente della ricetta + piatto (+ "with" un secondo ingrediente)
+        styles = rng.choice(len(_STYLES), n)
+        dishes = rng.choice(len(_DISHES), n)
+        has_style = rng.random(n) < 0.4
+        has_with = rng.random(n) < 0.25
+        names = []
+        for i, items in enumerate(ingredient_lists):
+            name = f"{items[0]} {_DISHES[dishes[i]]}"
+            if has_style[i]:
+                name = f"{_STYLES[styles[i]]} {name}"
+            if has_with[i] and len(items) > 1:
+                name = f"{name} with {items[1]}"
+            names.append(name)
+
+        n_steps = rng.integers(2, 16, n)
+        verbs = rng.choice(len(_VERBS), int(n_steps.sum()))
+        ends = np.cumsum(n_steps)
+        steps = [_as_list_text([f"{_VERBS[v]} {items[j % len(items)]}"
+                                for j, v in enumerate(verbs[end - size:end])])
+                 for size, end, items in zip(n_steps, ends, ingredient_lists)]
+
+        # Numeri con distribuzioni plausibili: tempi e voti a coda lunga, rating sbilanciato verso l'alto
+        calories = np.round(rng.gamma(2.0, 180.0, n), 1)
+        return {
+            'name': names,
+            'id': list(range(first_id, first_id + n)),
+            'minutes': np.clip(np.round(rng.lognormal(3.6, 0.8, n)), 1, 1440).astype(int).tolist(),
+            'tags': [_as_list_text(t) for t in tag_lists],
+            'n_steps': n_steps.tolist(),
+            'steps': steps,
+            'ingredients': [_as_list_text(i) for i in ingredient_lists],
+            'n_ingredients': [len(i) for i in ingredient_lists],
+            'calories': calories.tolist(),
+            'total_fat': np.round(calories / 25 * rng.uniform(0.3, 1.7, n)).astype(int).tolist(),
+            'sugar': np.round(rng.gamma(1.2, 30.0, n)).astype(int).tolist(),
+            'sodium': np.round(rng.gamma(1.5, 18.0, n)).astype(int).tolist(),
+            'protein': np.round(rng.gamma(1.6, 20.0, n)).astype(int).tolist(),
+            'saturated_fat': np.round(rng.gamma(1.3, 30.0, n)).astype(int).tolist(),
+            'carbohydrates': np.round(calories / 80 * rng.uniform(0.3, 1.7, n)).astype(int).tolist(),
+            'rating_medio': np.round(5 - 4 * rng.beta(1.2, 6.0, n), 2).tolist(),
+            'num_voti': (rng.zipf(1.8, n) - 1).clip(0, 5000).tolist(),
+        }
+
+    def iter_chunks(self, rows: int) -> Iterator[Dict[str, list]]:
+        for k, start in enumerate(range(0, rows, self.chunk)):
+            yield self.chunk_rows(k, min(self.chunk, rows - start), first_id=start + 1)
+
+
+def write_catalog(path: str, rows: int, seed: int = 0, skew: float = DEFAULT_SKEW,
+                  chunk: int = DEFAULT_CHUNK, progress: bool = True) -> str:
+    """Scrive un CSV di `rows` ricette un blocco alla volta (memoria costante)."""
+    generator = CatalogGenerator.from_lookups(seed=seed, skew=skew, chunk=chunk)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    t0 = time.perf_counter()
+    written = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for columns in generator.iter_chunks(rows):
+            writer.writerows(zip(*(columns[c] for c in COLUMNS)))
+            written += len(columns['name'])
+            if progress:
+                print(f"   {written}/{rows} ricette ({time.perf_counter() - t0:.1f}s)")
+    if progress:
+        print(f"✅ {path}: {written} ricette sintetiche in {time.perf_counter() - t0:.1f}s")
+    return path
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Genera un catalogo ricette sintetico con lo schema del CSV reale")
+    parser.add_argument('path', nargs='?', default='dataset/dataset_synthetic.csv')
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skew', type=float, default=DEFAULT_SKEW)
+    parser.add_argument('--chunk', type=int, default=DEFAULT_CHUNK)
+    args = parser.parse_args(argv)
+    write_catalog(args.path, args.rows, seed=args.seed, skew=args.skew, chunk=args.chunk)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,217 @@
+# Vocabolari canonici (ingredienti e tag) con correzione dei refusi.
+#
+# I validatori delle form controllavano `item in ALL_UNIQUE_INGREDIENTS` (una
+# scansione lineare della lista) e, se mancava, lanciavano process.extractOne
+# su tutto il vocabolario per ogni termine. Un Vocabulary risolve invece ogni
+# termine in tre passi, tutti a tempo quasi costante:
+#
+#   1. termine esatto (set);
+#   2. forma normalizzata: minuscole, spazi, trattini e apostrofi, plurali
+#      inglesi ("Tomatoes" -> "tomato") e sinonimi dei file di training
+#      ("- synonym: X" in data/*.yml);
+#   3. refusi con l'algoritmo di SymSpell: per ogni termine si precalcolano le
+#      stringhe ottenute cancellando fino a `max_distance` caratteri dal suo
+#      prefisso; una query genera le proprie cancellazioni e i termini che ne
+#      condividono almeno una sono gli unici candidati di cui calcolare la
+#      distanza di edit vera.
+#
+# L'indice delle cancellazioni non tiene le stringhe: solo il loro hash (int64,
+# ordinato) e l'id del termine, due array numpy da pochi MB anche con decine
+# di migliaia di ingredienti.
+
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np  # type: ignore
+
+SYNONYM_FILES = ('data/lookups.yml', 'data/nlu.yml')
+LOOKUP_INGREDIENTS = 'lookup/lista_ingredienti.txt'
+LOOKUP_TAGS = 'lookup/lista_tags.txt'
+MAX_EDIT_DISTANCE = 2
+PREFIX_LENGTH = 7  # SymSpell: le cancellazioni si calcolano solo sui primi caratteri
+
+_SEPARATORI = re.compile(r"[\s\-_'’.,/]+")
+_BLOCCO = re.compile(r'^\s*-\s*(\w+):\s*(.*?)\s*$')  # "- synonym: X", "- lookup: Y", "- intent: Z", ...
+_ESEMPIO = re.compile(r'^\s*-\s+(.+?)\s*$')
+
+Match = Tuple[str, int]  # (termine canonico, distanza di edit: 0 se non è un refuso)
+
+
+def singular(word: str) -> str:
+    """Singolare approssimato di una parola inglese (basta che sia coerente tra query e vocabolario)."""
+    if len(word) <= 3 or not word.endswith('s'):
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith(('oes', 'ches', 'shes', 'sses', 'xes', 'zes')):
+        return word[:-2]
+    if word.endswith(('ss', 'us', 'is')):
+        return word
+    return word[:-1]
+
+
+def normalize_term(term: str) -> str:
+    """Chiave di confronto: minuscole, separatori ridotti a uno spazio, parole al singolare."""
+    return ' '.join(singular(w) for w in _SEPARATORI.split(str(term).lower()) if w)
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Distanza di Damerau-Levenshtein (OSA) tra a e b; limit + 1 appena la supera."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cost = 0 if ca == cb else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def deletes(word: str, distance: int) -> Set[str]:
+    """La parola e tutte le stringhe ottenute cancellando da 1 a `distance` caratteri."""
+    result = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - result
+        result |= frontier
+    return result
+
+
+def allowed_distance(key: str, max_distance: int = MAX_EDIT_DISTANCE) -> int:
+    """Refusi tollerati in base alla lunghezza: nessuno fino a 3 caratteri, 1 fino a 6, poi max_distance."""
+    return min(max_distance, max(0, (len(key) - 1) // 3))
+
+
+def read_lookup(path: str) -> List[str]:
+    """Voci di un file lookup ("- salt" -> "salt"), nell'ordine del file (lista vuota se manca)."""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [line.strip()[2:].strip() for line in f if line.strip().startswith('- ')]
+
+
+def load_synonyms(paths: Sequence[str] = SYNONYM_FILES) -> Dict[str, str]:
+    """Sinonimi dei file di training Rasa ("- synonym: X" seguito dagli esempi): variante -> X.
+
+    Basta leggere le righe (niente parser YAML: lookups.yml ha decine di migliaia di voci).
+    """
+    synonyms: Dict[str, str] = {}
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        canonical = None
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                block = _BLOCCO.match(line)
+                if block:
+                    canonical = block.group(2).strip('"\'') if block.group(1) == 'synonym' else None
+                    continue
+                example = _ESEMPIO.match(line) if canonical else None
+                if example:
+                    synonyms[example.group(1).strip('"\'')] = canonical
+    return synonyms
+
+
+class Vocabulary:
+    """Termini canonici con ricerca esatta, normalizzata e tollerante ai refusi.
+
+    `weights` (es. in quante ricette compare ogni termine) decide tra candidati
+    alla stessa distanza; senza pesi vince il termine che viene prima.
+    """
+
+    def __init__(self, terms: Iterable[str], weights: Optional[Sequence[float]] = None,
+                 synonyms: Optional[Dict[str, str]] = None, max_distance: int = MAX_EDIT_DISTANCE,
+                 prefix_length: int = PREFIX_LENGTH):
+        self.terms: List[str] = list(terms)
+        self.exact: Set[str] = set(self.terms)
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        weights = np.zeros(len(self.terms)) if weights is None else np.asarray(weights, dtype=np.float64)
+
+        # Forma normalizzata -> termine, dal più frequente: a parità di chiave
+        # (o di distanza, nella correzione) vince lui
+        order = sorted(range(len(self.terms)), key=lambda i: -weights[i])
+        self.normalized: Dict[str, str] = {}
+        for i in order:
+            self.normalized.setdefault(normalize_term(self.terms[i]), self.terms[i])
+        # Chiavi dei termini (non dei sinonimi) in ordine di frequenza: sono quelle che si correggono
+        self.keys: List[str] = list(self.normalized)
+        for variant, canonical in (synonyms or {}).items():
+            if canonical in self.exact:
+                self.normalized.setdefault(normalize_term(variant), canonical)
+
+        # Indice SymSpell: hash di ogni cancellazione, accanto all'id della chiave da cui viene
+        counts = np.zeros(len(self.keys), dtype=np.int64)
+
+        def delete_hashes():
+            for key_id, key in enumerate(self.keys):
+                variants = deletes(key[:prefix_length], allowed_distance(key, max_distance))
+                counts[key_id] = len(variants)
+                yield from (hash(v) for v in variants)
+
+        hash_array = np.fromiter(delete_hashes(), dtype=np.int64)
+        sort = np.argsort(hash_array, kind='stable')
+        self._delete_hashes = hash_array[sort]
+        self._delete_ids = np.repeat(np.arange(len(self.keys), dtype=np.int32), counts)[sort]
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self.exact
+
+    @property
+    def nbytes(self) -> int:
+        return self._delete_hashes.nbytes + self._delete_ids.nbytes
+
+    def correct(self, key: str) -> Optional[Match]:
+        """Termine più vicino a una chiave già normalizzata (None se nessuno è entro la distanza tollerata)."""
+        limit = allowed_distance(key, self.max_distance)
+        if limit == 0 or not len(self._delete_hashes):
+            return None
+        wanted = np.fromiter((hash(v) for v in deletes(key[:self.prefix_length], limit)), dtype=np.int64)
+        lo = np.searchsorted(self._delete_hashes, wanted, side='left')
+        hi = np.searchsorted(self._delete_hashes, wanted, side='right')
+        candidates = {int(i) for a, b in zip(lo.tolist(), hi.tolist()) if a < b
+                      for i in self._delete_ids[a:b].tolist()}
+
+        best: Optional[Tuple[int, int]] = None
+        for key_id in candidates:
+            distance = edit_distance(key, self.keys[key_id], limit)
+            if distance <= limit and (best is None or (distance, key_id) < best):
+                best = (distance, key_id)
+        if best is None:
+            return None
+        return self.normalized[self.keys[best[1]]], best[0]
+
+    def resolve(self, term: str) -> Optional[Match]:
+        """Termine canonico per `term`: esatto, normalizzato/sinonimo (distanza 0) o corretto."""
+        term = str(term).strip()
+        if term in self.exact:
+            return term, 0
+        lowered = term.lower()
+        if lowered in self.exact:
+            return lowered, 0
+        key = normalize_term(term)
+        if key in self.normalized:
+            return self.normalized[key], 0
+        return self.correct(key)
+
+    def resolve_many(self, terms: Iterable[str]) -> List[Optional[Match]]:
+        """Come resolve() per una lista di termini (ognuno risolto una volta sola)."""
+        resolved: Dict[str, Optional[Match]] = {}
+        result = []
+        for term in terms:
+            if term not in resolved:
+                resolved[term] = self.resolve(term)
+            result.append(resolved[term])
+        return result
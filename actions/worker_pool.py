@@ -0,0 +1,137 @@
+# Esecuzione delle action costose fuori dall'event loop.
+#
+# rasa_sdk serve le action da un web server asincrono: una run() sincrona e
+# lenta (ricerca svuota-frigo, fuzzy matching, nearest neighbour sui macro)
+# blocca tutte le altre conversazioni finché non termina. Le action pesanti
+# ereditano da PooledAction: la loro logica (run_query) gira su un pool di
+# thread con concorrenza limitata, coda limitata e timeout per
+# action, mentre quelle leggere (es. i reset dei form) restano inline.
+
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Text, Tuple
+
+from rasa_sdk import Action, Tracker  # type: ignore
+from rasa_sdk.executor import CollectingDispatcher  # type: ignore
+
+from .metrics import ACTION_ERRORS
+
+
+class PoolBusy(Exception):
+    """Troppe richieste in coda: la nuova richiesta viene rifiutata subito."""
+
+
+class QueryPool:
+    """Pool di worker con concorrenza e profondità di coda limitate.
+
+    Al massimo `max_workers` query girano insieme e altre `max_queue` possono
+    aspettare; oltre questo limite run() solleva PoolBusy invece di accodare
+    all'infinito.
+
+    Solo thread: le query scrivono QUERY_CACHE, RENDER_CACHE e metriche del
+    processo che serve la richiesta, e un processo figlio li terrebbe per sé
+    (oltre a caricare un altro catalogo). Per usare più core c'è il server
+    pre-fork (server.py).
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 32):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.in_flight = 0  # query in esecuzione o in coda
+        self.rejected = 0
+        self.timeouts = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Creato alla prima richiesta: importare il modulo non avvia thread
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='query')
+            return self._executor
+
+    def _release(self, _future: Future) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    async def run(self, fn, *args, timeout: Optional[float] = None):
+        """Esegue fn(*args) su un worker e ne attende il risultato senza bloccare l'event loop.
+
+        Se scade il timeout la richiesta smette di aspettare (asyncio.TimeoutError);
+        una query ancora in coda viene annullata, una già partita finisce in
+        background e continua a occupare il suo posto nel pool fino alla fine.
+        """
+        executor = self._get_executor()
+        with self._lock:
+            if self.in_flight >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise PoolBusy(f"{self.in_flight} query già in corso o in coda")
+            self.in_flight += 1
+
+        try:
+            future = executor.submit(fn, *args)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_query(action: "PooledAction", tracker: Tracker,
+               domain: Dict[Text, Any]) -> Tuple[List[Dict[Text, Any]], List[Dict[Text, Any]]]:
+    """Eseguito nel worker: usa un dispatcher privato e restituisce (eventi, messaggi)."""
+    dispatcher = CollectingDispatcher()
+    events = action.run_query(dispatcher, tracker, domain)
+    return events, dispatcher.messages
+
+
+class PooledAction(Action, ABC):
+    """Action la cui logica (run_query) gira sul `pool` invece che sull'event loop.
+
+    I messaggi vengono raccolti in un dispatcher privato e copiati in quello vero
+    solo se la query termina in tempo: una query scaduta non può più scrivere
+    nella risposta. Senza `pool` la query viene eseguita inline.
+    """
+
+    pool: Optional[QueryPool] = None
+    timeout: Optional[float] = None  # secondi; None = nessun limite
+
+    @abstractmethod
+    def run_query(self, dispatcher: CollectingDispatcher, tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+        """La logica sincrona dell'action (quella che prima stava in run)."""
+
+    async def run(self, dispatcher: CollectingDispatcher, tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+        if self.pool is None:
+            return self.run_query(dispatcher, tracker, domain)
+
+        try:
+            events, messages = await self.pool.run(_run_query, self, tracker, domain, timeout=self.timeout)
+        except PoolBusy as e:
+            ACTION_ERRORS.inc(self.name(), 'busy')
+            print(f"🚦 {self.name()} rifiutata: {e}")
+            dispatcher.utter_message(text="🚦 I'm handling a lot of requests right now. Please try again in a moment!")
+            return []
+        except asyncio.TimeoutError:
+            ACTION_ERRORS.inc(self.name(), 'timeout')
+            print(f"⏳ {self.name()} oltre il timeout di {self.timeout}s")
+            dispatcher.utter_message(text="⏳ Sorry, this search is taking too long. Please try again with fewer filters!")
+            return []
+
+        dispatcher.messages.extend(messages)
+        return events
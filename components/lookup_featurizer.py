@@ -0,0 +1,127 @@
+# Componente NLU che sostituisce il RegexFeaturizer per le lookup table.
+#
+# Stesse feature sparse (token x lookup, più la riga di frase con il massimo
+# per colonna) e stesso attributo "pattern" sui token, ma calcolate con
+# l'automa di LookupMatcher invece che con una regex per lookup. Si usa in
+# config.yml al posto del RegexFeaturizer:
+#
+#   - name: components.lookup_featurizer.LookupTableFeaturizer
+#     case_sensitive: true                         # come il default del RegexFeaturizer
+#     cache_dir: .rasa/cache/lookup_featurizer     # vuoto: nessuna cache tra un training e l'altro
+#
+# Sta fuori da actions/ perché rasa_sdk importa tutti i moduli di quel
+# pacchetto e sul server delle action Rasa non è installato.
+
+import logging
+import os
+from typing import Any, Dict, List, Optional, Text, Type
+
+import scipy.sparse  # type: ignore
+from rasa.engine.graph import ExecutionContext, GraphComponent
+from rasa.engine.recipes.default_recipe import DefaultV1Recipe
+from rasa.engine.storage.resource import Resource
+from rasa.engine.storage.storage import ModelStorage
+from rasa.nlu.constants import TOKENS_NAMES
+from rasa.nlu.featurizers.sparse_featurizer.sparse_featurizer import SparseFeaturizer
+from rasa.nlu.tokenizers.tokenizer import Tokenizer
+from rasa.shared.nlu.constants import ACTION_TEXT, RESPONSE, TEXT
+from rasa.shared.nlu.training_data.message import Message
+from rasa.shared.nlu.training_data.training_data import TrainingData
+
+from .lookup_matcher import Lookup, LookupMatcher
+
+logger = logging.getLogger(__name__)
+
+MATCHER_FILE = 'lookup_matcher.pkl'
+DEFAULT_CACHE_DIR = os.path.join('.rasa', 'cache', 'lookup_featurizer')
+ATTRIBUTES = (TEXT, RESPONSE, ACTION_TEXT)
+
+
+def read_lookup_tables(training_data: TrainingData) -> List[Lookup]:
+    """(nome, voci) di ogni lookup dei dati di training, in ordine di nome.
+
+    Le voci possono essere una lista o (formato vecchio) il percorso di un file con una voce per riga.
+    """
+    lookups: Dict[str, List[str]] = {}
+    for table in training_data.lookup_tables:
+        elements = table['elements']
+        if isinstance(elements, str):
+            with open(elements, encoding='utf-8') as f:
+                elements = [line.strip() for line in f if line.strip()]
+        lookups.setdefault(table['name'], []).extend(str(e) for e in elements)
+    return sorted(lookups.items())
+
+
+@DefaultV1Recipe.register(DefaultV1Recipe.ComponentType.MESSAGE_FEATURIZER, is_trainable=True)
+class LookupTableFeaturizer(SparseFeaturizer, GraphComponent):
+    """Feature delle lookup table con un automa di Aho-Corasick (vedi lookup_matcher.py)."""
+
+    @classmethod
+    def required_components(cls) -> List[Type]:
+        return [Tokenizer]
+
+    @staticmethod
+    def get_default_config() -> Dict[Text, Any]:
+        return {
+            **SparseFeaturizer.get_default_config(),
+            'case_sensitive': True,
+            'cache_dir': DEFAULT_CACHE_DIR,
+        }
+
+    def __init__(self, config: Dict[Text, Any], model_storage: ModelStorage, resource: Resource,
+                 execution_context: ExecutionContext, matcher: Optional[LookupMatcher] = None):
+        super().__init__(execution_context.node_name, config)
+        self._model_storage = model_storage
+        self._resource = resource
+        self.matcher = matcher
+
+    @classmethod
+    def create(cls, config: Dict[Text, Any], model_storage: ModelStorage, resource: Resource,
+               execution_context: ExecutionContext) -> "LookupTableFeaturizer":
+        return cls(config, model_storage, resource, execution_context)
+
+    @classmethod
+    def load(cls, config: Dict[Text, Any], model_storage: ModelStorage, resource: Resource,
+             execution_context: ExecutionContext, **kwargs: Any) -> "LookupTableFeaturizer":
+        matcher = None
+        try:
+            with model_storage.read_from(resource) as model_dir:
+                matcher = LookupMatcher.load(os.path.join(model_dir, MATCHER_FILE))
+        except ValueError:
+            pass
+        if matcher is None:
+            logger.warning(f"Automa delle lookup non trovato nel modello: {cls.__name__} non aggiunge feature.")
+        return cls(config, model_storage, resource, execution_context, matcher)
+
+    def train(self, training_data: TrainingData) -> Resource:
+        lookups = read_lookup_tables(training_data)
+        if lookups:
+            self.matcher = LookupMatcher.cached(lookups, self._config['case_sensitive'], self._config['cache_dir'])
+            with self._model_storage.write_to(self._resource) as model_dir:
+                self.matcher.save(os.path.join(model_dir, MATCHER_FILE))
+        return self._resource
+
+    def process_training_data(self, training_data: TrainingData) -> TrainingData:
+        for example in training_data.training_examples:
+            for attribute in ATTRIBUTES:
+                self._featurize(example, attribute)
+        return training_data
+
+    def process(self, messages: List[Message]) -> List[Message]:
+        for message in messages:
+            self._featurize(message, TEXT)
+        return messages
+
+    def _featurize(self, message: Message, attribute: Text) -> None:
+        tokens = message.get(TOKENS_NAMES[attribute], [])
+        if self.matcher is None or not len(self.matcher) or not tokens:
+            return
+        sequence = self.matcher.token_features(message.get(attribute), [(t.start, t.end) for t in tokens])
+        # Attributo "pattern" dei token come il RegexFeaturizer (lo legge il CRFEntityExtractor)
+        for token, row in zip(tokens, sequence):
+            patterns = token.get('pattern', default={})
+            patterns.update((name, bool(value)) for name, value in zip(self.matcher.names, row))
+            token.set('pattern', patterns)
+        sentence = sequence.max(axis=0, keepdims=True)
+        self.add_features_to_message(scipy.sparse.coo_matrix(sequence), scipy.sparse.coo_matrix(sentence),
+                                     attribute, message)
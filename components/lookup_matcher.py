@@ -0,0 +1,138 @@
+# Feature delle lookup table per l'NLU, senza espressioni regolari.
+#
+# Il RegexFeaturizer di Rasa trasforma ogni lookup in un'unica regex
+# `\b(voce1|voce2|...)\b` con migliaia di alternative (data/lookups.yml ne ha
+# circa 15k tra ingredienti e categorie): compilarla rallenta ogni training e
+# il motore la prova posizione per posizione su ogni messaggio. Qui le voci di
+# tutte le lookup stanno in un solo automa di Aho-Corasick sulle parole
+# (actions/extractor.py): un passaggio sul testo trova ogni voce, per quante
+# siano le voci e le lookup.
+#
+# Le feature sono quelle del RegexFeaturizer con use_word_boundaries: per ogni
+# token una colonna per lookup, 1 se il token si sovrappone a una voce trovata.
+# Anche la scelta tra voci sovrapposte è quella della regex: da sinistra, senza
+# sovrapposizioni e, a parità di inizio, la voce che nella lookup viene prima.
+# Testo e voci si spezzano in parole (sequenze di caratteri \w, delimitate da
+# \b come nella regex) e segni di punteggiatura, che contano come parole:
+# "white-rice" non trova "white rice". Le differenze dalla regex: gli spazi
+# valgono uno qualunque sia il loro numero e le voci che iniziano o finiscono
+# con un segno ("m&m'") si trovano anche dove \b non scatterebbe.
+#
+# L'automa compilato si salva in `cache_dir` con il nome dell'hash delle voci:
+# i training successivi con le stesse lookup lo ricaricano senza ricostruirlo.
+
+import hashlib
+import json
+import os
+import pickle
+import re
+import tempfile
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np  # type: ignore
+
+from actions.extractor import PhraseExtractor
+
+MATCHER_VERSION = 1  # cambia quando cambia il formato dell'automa: invalida la cache su disco
+_PAROLA = re.compile(r'\w+|[^\w\s]')  # parole e singoli segni di punteggiatura
+
+Lookup = Tuple[str, Sequence[str]]  # (nome della lookup, voci)
+
+
+def lookup_digest(lookups: Sequence[Lookup], case_sensitive: bool) -> str:
+    """Hash di voci e impostazioni: è la chiave dell'automa nella cache su disco."""
+    payload = json.dumps([MATCHER_VERSION, case_sensitive, [[name, list(elements)] for name, elements in lookups]],
+                         ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LookupMatcher:
+    """Un automa per tutte le lookup: voce (come sequenza di parole) -> lookup che la contengono."""
+
+    def __init__(self, lookups: Sequence[Lookup], case_sensitive: bool = True):
+        self.names: List[str] = [name for name, _ in lookups]
+        self.case_sensitive = case_sensitive
+        self.digest = lookup_digest(lookups, case_sensitive)
+
+        # La stessa voce può stare in più lookup: la forma canonica è la voce
+        # ricomposta e `_membership` dice in quali colonne accendere il token e
+        # con che priorità (posizione nella lookup, come l'ordine delle alternative nella regex)
+        membership: Dict[str, Dict[int, int]] = {}
+        for column, (_, elements) in enumerate(lookups):
+            for rank, element in enumerate(elements):
+                key = ' '.join(self._words(str(element)))
+                if key:
+                    membership.setdefault(key, {}).setdefault(column, rank)
+        self._membership: Dict[str, Tuple[Tuple[int, int], ...]] = {
+            key: tuple(columns.items()) for key, columns in membership.items()}
+        self._automaton = PhraseExtractor({key: key for key in membership}, tokenize=self._words, min_length=1)
+
+    def _words(self, text: str) -> List[str]:
+        return _PAROLA.findall(text if self.case_sensitive else text.lower())
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def cached(cls, lookups: Sequence[Lookup], case_sensitive: bool = True,
+               cache_dir: Optional[str] = None) -> "LookupMatcher":
+        """L'automa per queste lookup: dalla cache su disco se c'è, altrimenti costruito (e salvato)."""
+        if not cache_dir:
+            return cls(lookups, case_sensitive)
+        path = os.path.join(cache_dir, f"{lookup_digest(lookups, case_sensitive)}.pkl")
+        matcher = cls.load(path)
+        if matcher is None:
+            matcher = cls(lookups, case_sensitive)
+            try:
+                matcher.save(path)
+            except OSError:
+                pass  # cache non scrivibile: si ricostruisce al prossimo training
+        return matcher
+
+    def save(self, path: str) -> None:
+        """Scrittura atomica (file temporaneo + rename): un training interrotto non lascia cache rotte."""
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> Optional["LookupMatcher"]:
+        """L'automa salvato in `path` (None se manca, è illeggibile o è di un'altra versione)."""
+        try:
+            with open(path, 'rb') as f:
+                matcher = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+        return matcher if isinstance(matcher, cls) else None
+
+    def spans(self, text: str) -> List[Tuple[int, int, int]]:
+        """(inizio, fine, colonna) in caratteri delle voci trovate nel testo, scelte come re.finditer."""
+        found = list(_PAROLA.finditer(text))
+        words = [m.group() if self.case_sensitive else m.group().lower() for m in found]
+        candidates = sorted((column, first, rank, end)
+                            for first, end, key in self._automaton.matches(words)
+                            for column, rank in self._membership[key])
+        result: List[Tuple[int, int, int]] = []
+        last = (-1, 0)  # (colonna, parola dopo l'ultima voce scelta)
+        for column, first, _, end in candidates:
+            if (column, first) >= last:
+                result.append((found[first].start(), found[end - 1].end(), column))
+                last = (column, end)
+        return result
+
+    def token_features(self, text: str, tokens: Sequence[Tuple[int, int]]) -> np.ndarray:
+        """Matrice token x lookup (0/1): il token (inizio, fine) si sovrappone a una voce di quella lookup."""
+        features = np.zeros((len(tokens), len(self.names)), dtype=np.float32)
+        spans = self.spans(text)
+        for i, (start, end) in enumerate(tokens):
+            for match_start, match_end, column in spans:
+                if start < match_end and end > match_start:
+                    features[i, column] = 1.0
+        return features
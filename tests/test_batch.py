@@ -0,0 +1,42 @@
+import pandas as pd
+
+from actions.batch import run_batch
+from actions.loader import ingest_csv
+
+
+def _catalog(tmp_path):
+    path = tmp_path / 'recipes.csv'
+    pd.DataFrame({
+        'name': ['garlic bread', 'vegan salad', 'basil pasta'],
+        'id': [1, 2, 3],
+        'minutes': [10, 20, 30],
+        'tags': ["['easy']", "['vegan', 'easy']", "['easy']"],
+        'steps': ["['mix']", "['bake']", "['serve']"],
+        'ingredients': ["['salt']", "['garlic', 'salt']", "['basil']"],
+        'calories': [100.0, 200.0, 300.0],
+        'total_fat': [1.0, 2.0, 3.0],
+        'protein': [4.0, 5.0, 6.0],
+        'carbohydrates': [7.0, 8.0, 9.0],
+        'rating_medio': [4.0, 5.0, 3.0],
+        'num_voti': [1, 2, 3],
+    }).to_csv(path, index=False)
+    return ingest_csv(str(path))
+
+
+def test_unknown_terms_never_remove_the_filter(tmp_path):
+    catalog = _catalog(tmp_path)
+    results = run_batch(catalog, [
+        {'ingredients': ['xyzzy']},
+        {'ingredients': ['garlic'], 'tags': ['vegan', 'xyzzy']},
+        {'tags': ['xyzzy'], 'macros': {'calories': 150}},
+        {'ingredients': ['xyzzy'], 'macros': {'protein': 5}},
+    ])
+    for result in results:
+        assert (result['count'], result['recipe_ids']) == (0, [])
+        assert 'xyzzy' in result['unknown']
+
+
+def test_unknown_ingredients_next_to_known_ones_are_ignored(tmp_path):
+    catalog = _catalog(tmp_path)
+    [result] = run_batch(catalog, [{'ingredients': ['garlic', 'xyzzy'], 'tags': ['vegan']}])
+    assert (result['count'], result['recipe_ids'], result['unknown']) == (1, [2], ['xyzzy'])
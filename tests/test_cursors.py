@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from actions.cursors import KEY_BYTES, CursorStore, show_more_payload
+
+TELEGRAM_CALLBACK_DATA_BYTES = 64
+
+
+def test_payload_fits_telegram_callback_data():
+    store = CursorStore(max_bytes=64 * 1024)
+    keys = [
+        ('top',),
+        ('name', 'chocolate chip cookies with walnuts and extra dark chocolate'),
+        ('category', (), ('vegetarian', 'low-carb', 'main-dish', '30-minutes-or-less', 'easy')),
+        ('svuota_frigo', ('garlic', 'salt', 'olive oil', 'tomatoes', 'basil', 'parmesan cheese'),
+         ('vegan', 'quick'), 45),
+    ]
+    for key in keys:
+        for offset in (5, 95, 123456):
+            token = store.create(key, offset)
+            assert len(show_more_payload(token).encode('utf-8')) <= TELEGRAM_CALLBACK_DATA_BYTES
+            assert store.get(token) == (key, offset)
+
+
+def test_key_too_long_has_no_token():
+    store = CursorStore(max_bytes=64 * 1024)
+    assert store.create(('name', 'x' * KEY_BYTES), 5) is None
+
+
+def test_invalid_and_expired_tokens():
+    store = CursorStore(ttl=0.0, max_bytes=64 * 1024)
+    token = store.create(('top',), 5)
+    assert store.get(token) is None
+    for token in ('', 'abc', 'Xk3v9QaB.', 'Xk3v9QaB.x', 'Xk3v9QaB.²', '!!!!!!!!.5', 'Xk3v9QaB.5'):
+        assert store.get(token) is None
+
+
+def test_oldest_keys_are_overwritten_within_budget():
+    store = CursorStore(max_bytes=4 * 512)
+    tokens = [store.create(('name', f'recipe {i}'), 5) for i in range(6)]
+    assert len(store) == 4
+    assert store.get(tokens[0]) is None
+    assert store.get(tokens[-1]) == (('name', 'recipe 5'), 5)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="richiede fork()")
+def test_token_created_by_one_worker_resolves_in_another():
+    store = CursorStore(max_bytes=64 * 1024)
+    store.share(2)
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        store.attach(1)
+        os.write(write_fd, store.create(('ingredient', ('garlic', 'salt')), 10).encode('ascii'))
+        os._exit(0)
+    os.close(write_fd)
+    os.waitpid(pid, 0)
+    token = os.read(read_fd, 64).decode('ascii')
+    os.close(read_fd)
+    assert store.get(token) == (('ingredient', ('garlic', 'salt')), 10)
@@ -0,0 +1,18 @@
+from actions.extractor import PhraseExtractor
+
+TERMS = {t: t for t in ['garlic', 'salt', 'garlic salt', 'eggs', 'tomatoes', 'egg tomatoes', 'basil',
+                        'salt and pepper', 'olive oil']}
+
+
+def test_parse_does_not_cross_list_separators():
+    extractor = PhraseExtractor(TERMS)
+    assert extractor.parse("garlic, salt") == (['garlic', 'salt'], [])
+    assert extractor.parse("eggs, tomatos and basil") == (['eggs', 'tomatoes', 'basil'], [])
+    assert extractor.parse("garlic; salt\nbasil") == (['garlic', 'salt', 'basil'], [])
+
+
+def test_parse_keeps_terms_within_a_segment():
+    extractor = PhraseExtractor(TERMS)
+    assert extractor.parse("garlic salt") == (['garlic salt'], [])
+    assert extractor.parse("salt and pepper, olive oil") == (['salt and pepper', 'olive oil'], [])
+    assert extractor.parse("egg tomatoes, chiken") == (['egg tomatoes'], ['chiken'])
@@ -0,0 +1,30 @@
+import pandas as pd
+
+from actions.loader import ingest_csv
+
+
+def _write_csv(path, rating, votes):
+    pd.DataFrame({
+        'name': ['a', 'b', 'c'],
+        'id': [1, 2, 3],
+        'minutes': [10, 20, 30],
+        'tags': ["['easy']", "['vegan', 'easy']", "['easy']"],
+        'steps': ["['mix']", "['bake']", "['serve']"],
+        'ingredients': ["['salt']", "['garlic', 'salt']", "['basil']"],
+        'calories': [100.0, 200.0, 300.0],
+        'total_fat': [1.0, 2.0, 3.0],
+        'protein': [4.0, 5.0, 6.0],
+        'carbohydrates': [7.0, 8.0, 9.0],
+        'rating_medio': rating,
+        'num_voti': votes,
+    }).to_csv(path, index=False)
+
+
+def test_non_numeric_rating_and_votes_are_coerced_to_zero(tmp_path):
+    path = tmp_path / 'recipes.csv'
+    _write_csv(path, ['abc', '4.5', '3.0'], ['7', 'n/a', '2'])
+    catalog = ingest_csv(str(path), chunk_rows=2)
+    assert list(catalog.dataset.index) == [2, 3, 1]
+    assert catalog.dataset['rating_medio'].tolist() == [4.5, 3.0, 0.0]
+    assert catalog.dataset['num_voti'].tolist() == [0, 2, 7]
+    assert set(catalog.texts) == {'tags', 'steps', 'ingredients'}